@@ -0,0 +1,148 @@
+"""
+Annotated Image Store
+Holds analysed frames under an id and renders/encodes the annotated image only
+when a client actually requests it, caching each size/format variant
+"""
+
+import cv2
+import numpy as np
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from monitoring.metrics import stage_timer
+
+IMAGE_FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+    'png': ('.png', 'image/png', None)
+}
+
+class StoredImage:
+    """Source frame plus the renderer that draws its annotations onto it"""
+    
+    def __init__(self, frame: np.ndarray, render: Callable[[np.ndarray], np.ndarray]):
+        self.frame = frame
+        self.render = render
+        self.rendered = None
+        self.variants = {}
+        self.created_at = time.time()
+        # Serializes rendering and encoding, so concurrent first requests do the work once
+        self.lock = threading.Lock()
+    
+    @property
+    def nbytes(self) -> int:
+        # Read each field once: rendering may release the frame concurrently
+        frame, rendered = self.frame, self.rendered
+        total = frame.nbytes if frame is not None else 0
+        if rendered is not None:
+            total += rendered.nbytes
+        return total + sum(len(data) for data in list(self.variants.values()))
+
+class AnnotatedImageStore:
+    """
+    LRU store bounded by entry count, total bytes and age.
+    
+    Entries are immutable once created, so encoded variants can be served with
+    long-lived cache headers.
+    """
+    
+    def __init__(self, max_entries: int = 32, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: int = 900):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def put(self, frame: np.ndarray, render: Callable[[np.ndarray], np.ndarray]) -> str:
+        """
+        Register a frame for lazy annotation; nothing is drawn or encoded yet.
+        ``render(frame)`` must not capture the frame itself, or it outlives rendering.
+        """
+        image_id = uuid.uuid4().hex
+        with self._lock:
+            self._images[image_id] = StoredImage(frame, render)
+            self._evict()
+        return image_id
+    
+    def get_image(self, image_id: str, image_format: str = 'jpeg',
+                  max_width: Optional[int] = None, quality: int = 85) -> Optional[Tuple[bytes, str]]:
+        """Return (encoded bytes, mimetype) for a variant, rendering it on first use"""
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        
+        with self._lock:
+            entry = self._images.get(image_id)
+            if entry is None or self._expired(entry):
+                return None
+            self._images.move_to_end(image_id)
+        
+        _, mimetype, quality_flag = IMAGE_FORMATS[image_format]
+        key = (image_format, max_width or 0, quality if quality_flag else 0)
+        
+        data = entry.variants.get(key)
+        if data is None:
+            with entry.lock:
+                data = entry.variants.get(key)
+                if data is None:
+                    data = self._encode_variant(entry, image_format, max_width, quality)
+                    with self._lock:
+                        entry.variants[key] = data
+                        self._evict()
+        
+        return data, mimetype
+    
+    @staticmethod
+    def _encode_variant(entry: StoredImage, image_format: str,
+                        max_width: Optional[int], quality: int) -> bytes:
+        """Render the entry if needed and encode one variant; call with ``entry.lock`` held"""
+        extension, _, quality_flag = IMAGE_FORMATS[image_format]
+        if entry.rendered is None:
+            with stage_timer('annotated_image_store', 'annotation'):
+                entry.rendered = entry.render(entry.frame)
+            # Neither the source frame nor the renderer (and what it holds) is needed again
+            entry.frame = None
+            entry.render = None
+        
+        image = entry.rendered
+        height, width = image.shape[:2]
+        if max_width and max_width < width:
+            scaled_height = max(1, int(height * max_width / width))
+            image = cv2.resize(image, (max_width, scaled_height), interpolation=cv2.INTER_AREA)
+        
+        params = [quality_flag, int(quality)] if quality_flag else []
+        with stage_timer('annotated_image_store', 'encode'):
+            ok, buffer = cv2.imencode(extension, image, params)
+        if not ok:
+            raise ValueError(f"Could not encode image as {image_format}")
+        return buffer.tobytes()
+    
+    def _expired(self, entry: StoredImage) -> bool:
+        return time.time() - entry.created_at > self.ttl_seconds
+    
+    def _evict(self):
+        now = time.time()
+        for image_id in [i for i, e in self._images.items() if now - e.created_at > self.ttl_seconds]:
+            del self._images[image_id]
+        
+        while len(self._images) > self.max_entries:
+            self._images.popitem(last=False)
+        
+        total = sum(entry.nbytes for entry in self._images.values())
+        while total > self.max_bytes and len(self._images) > 1:
+            _, entry = self._images.popitem(last=False)
+            total -= entry.nbytes
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._images),
+                'bytes': sum(entry.nbytes for entry in self._images.values()),
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+# Global annotated image store instance
+annotated_image_store = AnnotatedImageStore()
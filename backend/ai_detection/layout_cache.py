@@ -0,0 +1,125 @@
+"""
+Parking Layout Cache
+Process-wide cache of parsed space layouts that re-stats the file on each
+lookup and reloads only when it changed, with atomic write-and-swap saves
+"""
+
+import os
+import json
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+from .space_layout import SpaceLayout
+
+LAYOUT_EXTENSIONS = ('.npz', '.json')
+
+class _CachedLayout:
+    __slots__ = ('signature', 'layout')
+    
+    def __init__(self, signature: Tuple, layout: SpaceLayout):
+        self.signature = signature
+        self.layout = layout
+
+def _signature(stat: os.stat_result) -> Tuple:
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def _parse_json(document) -> SpaceLayout:
+    if isinstance(document, dict):
+        return SpaceLayout.from_mapper_config(document)
+    return SpaceLayout.from_spaces(document)
+
+class LayoutCache:
+    """
+    Layouts keyed by file path, validated against (mtime, size, inode).
+    
+    JSON files may hold a mapper config document or a bare spot list; ``.npz``
+    files use SpaceLayout's compact binary format. Saves write a temporary file
+    in the same directory and ``os.replace`` it over the target, so readers
+    never observe a half-written layout.
+    """
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.reloads = 0
+    
+    @staticmethod
+    def find(stem: str) -> Optional[str]:
+        """Return the existing layout file for ``stem``, preferring the binary format"""
+        for extension in LAYOUT_EXTENSIONS:
+            if os.path.exists(stem + extension):
+                return stem + extension
+        return None
+    
+    def get(self, path: str) -> Optional[SpaceLayout]:
+        """Return the layout stored at ``path``, or None if the file does not exist"""
+        try:
+            signature = _signature(os.stat(path))
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.signature == signature:
+                self.hits += 1
+                return entry.layout
+        
+        layout = self._read(path)
+        with self._lock:
+            self._entries[path] = _CachedLayout(signature, layout)
+            self.reloads += 1
+        return layout
+    
+    def _read(self, path: str) -> SpaceLayout:
+        if path.endswith('.npz'):
+            return SpaceLayout.load_npz(path)
+        with open(path, 'r') as f:
+            return _parse_json(json.load(f))
+    
+    def save(self, path: str, layout: SpaceLayout, spot_list: bool = False) -> None:
+        """
+        Atomically replace ``path`` with ``layout``. JSON files get the mapper
+        config document, or the bare space list when ``spot_list`` is set.
+        """
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.layout-', suffix=os.path.splitext(path)[1])
+        try:
+            with os.fdopen(fd, 'wb' if path.endswith('.npz') else 'w') as f:
+                if path.endswith('.npz'):
+                    layout.save_npz(f)
+                else:
+                    document = layout.to_xywh_spaces() if spot_list else layout.to_mapper_config()
+                    json.dump(document, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        signature = _signature(os.stat(path))
+        with self._lock:
+            self._entries[path] = _CachedLayout(signature, layout)
+    
+    def invalidate(self, path: Optional[str] = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'cached_layouts': len(self._entries),
+                'hits': self.hits,
+                'reloads': self.reloads
+            }
+
+# Global layout cache instance
+layout_cache = LayoutCache()
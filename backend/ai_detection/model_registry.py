@@ -0,0 +1,198 @@
+"""
+Detection Model Registry
+Loads YOLO weights on first use and keeps one shared instance per weights file,
+so importing the API never pulls in ultralytics/torch and requests never reload a model
+"""
+import os
+import time
+import threading
+import logging
+import numpy as np
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Shape of the blank frame used for the warm-up inference
+WARMUP_FRAME_SHAPE = (640, 640, 3)
+
+def load_yolo_class():
+    """Import ultralytics on demand; raises ImportError when it is not installed"""
+    from ultralytics import YOLO
+    return YOLO
+
+_yolo_available = None
+
+def yolo_available() -> bool:
+    """True when ultralytics can be imported (imports it on first call; the answer is cached)"""
+    global _yolo_available
+    if _yolo_available is None:
+        try:
+            load_yolo_class()
+            _yolo_available = True
+        except ImportError:
+            _yolo_available = False
+    return _yolo_available
+
+class LoadedModel:
+    """A loaded YOLO model with its inference lock and timing stats"""
+    
+    def __init__(self, model_name: str, model, load_seconds: float):
+        self.model_name = model_name
+        self.model = model
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.warm_inference_ms = None
+        # Ultralytics predictors keep per-call state, so inference on a shared
+        # model is serialized
+        self.lock = threading.Lock()
+    
+    def predict(self, image, **kwargs):
+        with self.lock:
+            return self.model(image, **kwargs)
+    
+    def stats(self) -> Dict:
+        return {
+            'loaded': True,
+            'load_seconds': round(self.load_seconds, 3),
+            'warm_inference_ms': self.warm_inference_ms,
+            'loaded_at': self.loaded_at
+        }
+
+class ModelRegistry:
+    """
+    Process-wide cache of detection models.
+    
+    ``warm_up`` preloads the configured weights and runs one dummy inference so
+    the first real request does not pay for model load and lazy graph setup;
+    ``status`` reports readiness for health checks and autoscalers.
+    """
+    
+    def __init__(self, warmup_models: Optional[List[str]] = None):
+        self.warmup_models = list(warmup_models or [])
+        self._models = {}
+        self._processors = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._warmup_thread = None
+        self._warmup_started_at = None
+        self._warmup_finished_at = None
+    
+    def get_model(self, model_name: str) -> LoadedModel:
+        """Return the shared model for ``model_name``, loading it on first use"""
+        loaded = self._models.get(model_name)
+        if loaded is not None:
+            return loaded
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        
+        # Loads of different weights may overlap; the same weights load once
+        with load_lock:
+            loaded = self._models.get(model_name)
+            if loaded is not None:
+                return loaded
+            
+            started = time.perf_counter()
+            try:
+                model = load_yolo_class()(model_name)
+            except Exception as e:
+                self._errors[model_name] = str(e)
+                raise
+            loaded = LoadedModel(model_name, model, time.perf_counter() - started)
+            
+            with self._lock:
+                self._models[model_name] = loaded
+                self._errors.pop(model_name, None)
+            logger.info(f"Loaded model {model_name} in {loaded.load_seconds:.2f}s")
+            return loaded
+    
+    def register_model(self, model_name: str, model) -> LoadedModel:
+        """Serve ``model`` (anything callable like a YOLO model) under ``model_name``"""
+        loaded = LoadedModel(model_name, model, 0.0)
+        with self._lock:
+            self._models[model_name] = loaded
+            self._errors.pop(model_name, None)
+        return loaded
+    
+    def get_processor(self, model_name: str = 'yolov8s.pt', confidence_threshold: float = 0.35):
+        """Shared YOLOVideoProcessor for a model and confidence threshold"""
+        key = (model_name, confidence_threshold)
+        processor = self._processors.get(key)
+        if processor is None:
+            # Imported here: the processor module itself depends on this registry
+            from .yolo_video_processor import YOLOVideoProcessor
+            processor = YOLOVideoProcessor(model_name=model_name,
+                                           confidence_threshold=confidence_threshold)
+            with self._lock:
+                processor = self._processors.setdefault(key, processor)
+        return processor
+    
+    def warm_up(self, model_names: Optional[List[str]] = None) -> Dict:
+        """Load each model and time one inference on a blank frame"""
+        self._warmup_started_at = time.time()
+        frame = np.zeros(WARMUP_FRAME_SHAPE, dtype=np.uint8)
+        
+        for model_name in model_names or self.warmup_models:
+            try:
+                loaded = self.get_model(model_name)
+                started = time.perf_counter()
+                loaded.predict(frame, verbose=False)
+                loaded.warm_inference_ms = round((time.perf_counter() - started) * 1000, 1)
+                logger.info(f"Warmed up {model_name}: {loaded.warm_inference_ms}ms inference")
+            except Exception as e:
+                self._errors[model_name] = str(e)
+                logger.error(f"Warm-up of {model_name} failed: {e}")
+        
+        self._warmup_finished_at = time.time()
+        return self.status()
+    
+    def start_warm_up(self) -> bool:
+        """Run ``warm_up`` on a background thread so startup is not blocked"""
+        with self._lock:
+            if self._warmup_thread is not None or not self.warmup_models:
+                return False
+            self._warmup_thread = threading.Thread(target=self.warm_up, daemon=True,
+                                                   name='model-warmup')
+        self._warmup_thread.start()
+        return True
+    
+    def is_ready(self) -> bool:
+        """All configured models are loaded and have run their warm-up inference"""
+        return all(
+            name in self._models and self._models[name].warm_inference_ms is not None
+            for name in self.warmup_models
+        )
+    
+    def status(self) -> Dict:
+        models = {}
+        for model_name in set(self.warmup_models) | set(self._models) | set(self._errors):
+            loaded = self._models.get(model_name)
+            models[model_name] = loaded.stats() if loaded else {'loaded': False}
+            if model_name in self._errors:
+                models[model_name]['error'] = self._errors[model_name]
+        
+        if self.is_ready():
+            state = 'ready'
+        elif self._warmup_finished_at is not None:
+            state = 'failed'
+        elif self._warmup_started_at is not None:
+            state = 'warming'
+        else:
+            state = 'cold'
+        
+        return {
+            'ready': self.is_ready(),
+            'state': state,
+            'warmup_models': self.warmup_models,
+            'warmup_seconds': round(self._warmup_finished_at - self._warmup_started_at, 3)
+                              if self._warmup_finished_at and self._warmup_started_at else None,
+            'models': models
+        }
+
+# Global model registry instance; detection workers opt in to warm-up,
+# e.g. WARMUP_MODELS=yolov8s.pt, so API-only workers never load torch
+model_registry = ModelRegistry(
+    warmup_models=[name.strip() for name in os.getenv('WARMUP_MODELS', '').split(',')
+                   if name.strip()]
+)
@@ -0,0 +1,250 @@
+"""
+Parking Space Overlay Renderer
+Pre-renders space outlines and labels once per layout and state, keeps one
+cached premultiplied RGBA layer per layout and composes it onto frames with a
+single alpha blend. Only spaces whose state changed are redrawn between frames.
+"""
+
+import cv2
+import numpy as np
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+# (key, (x1, y1, x2, y2), label) or (key, bounds, label, polygon points)
+SpaceSpec = Tuple[Hashable, Tuple[int, int, int, int], str]
+
+class SpaceStyle:
+    """How a space in a given state is drawn: an outline plus one line of text"""
+    
+    def __init__(self, color: Tuple[int, int, int], thickness: int = 2,
+                 label: Union[None, str, Callable[[str], str]] = None,
+                 font_scale: float = 0.5, label_thickness: int = 1,
+                 label_offset: Tuple[int, int] = (5, 20),
+                 font: int = cv2.FONT_HERSHEY_SIMPLEX):
+        self.color = tuple(int(c) for c in color)
+        self.thickness = thickness
+        self.label = label
+        self.font_scale = font_scale
+        self.label_thickness = label_thickness
+        self.label_offset = label_offset
+        self.font = font
+    
+    def text_for(self, space_label: str) -> str:
+        if self.label is None:
+            return space_label
+        if callable(self.label):
+            return self.label(space_label)
+        return self.label
+
+class _Sprite:
+    """A pre-rendered space in one state, cropped to the pixels it touches"""
+    
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'premul', 'alpha')
+    
+    def __init__(self, x0, y0, premul, alpha):
+        self.x0, self.y0 = x0, y0
+        self.x1, self.y1 = x0 + alpha.shape[1], y0 + alpha.shape[0]
+        # Drawing onto a transparent canvas yields color premultiplied by coverage
+        self.premul = premul
+        self.alpha = alpha
+
+class _Layer:
+    """Premultiplied color plane plus alpha plane for every drawn space"""
+    
+    def __init__(self, height: int, width: int):
+        self.width = width
+        self.premul = np.zeros((height, width, 3), dtype=np.uint8)
+        self.alpha = np.zeros((height, width), dtype=np.uint8)
+        self._pixels = None
+    
+    def blit(self, sprite: _Sprite, clip: Tuple[int, int, int, int] = None):
+        """Composite ``sprite`` over the layer, optionally only inside ``clip``"""
+        x0, y0, x1, y1 = sprite.x0, sprite.y0, sprite.x1, sprite.y1
+        if clip is not None:
+            x0, y0 = max(x0, clip[0]), max(y0, clip[1])
+            x1, y1 = min(x1, clip[2]), min(y1, clip[3])
+            if x1 <= x0 or y1 <= y0:
+                return
+        region = (slice(y0, y1), slice(x0, x1))
+        local = (slice(y0 - sprite.y0, y1 - sprite.y0), slice(x0 - sprite.x0, x1 - sprite.x0))
+        alpha = sprite.alpha[local]
+        inverse = 255 - alpha.astype(np.uint16)
+        self.premul[region] = np.minimum(sprite.premul[local] + (self.premul[region] * inverse[..., None] + 127) // 255, 255)
+        self.alpha[region] = np.minimum(alpha + (self.alpha[region] * inverse + 127) // 255, 255)
+        self._pixels = None
+    
+    def clear(self, x0: int, y0: int, x1: int, y1: int):
+        self.premul[y0:y1, x0:x1] = 0
+        self.alpha[y0:y1, x0:x1] = 0
+        self._pixels = None
+    
+    def pixels(self):
+        """Flat indices, premultiplied colors and inverse alpha of all covered pixels"""
+        if self._pixels is None:
+            index = np.flatnonzero(self.alpha)
+            self._pixels = (
+                index,
+                self.premul.reshape(-1, 3)[index].astype(np.uint16),
+                255 - self.alpha.reshape(-1)[index].astype(np.uint16)
+            )
+        return self._pixels
+    
+    def blend_onto(self, frame: np.ndarray):
+        """Alpha-composite this layer over the frame in one vectorized step"""
+        index, premul, inverse = self.pixels()
+        if not len(index):
+            return
+        view = frame.reshape(-1, 3)
+        background = view[index].astype(np.uint16)
+        view[index] = np.minimum(premul + (background * inverse[:, None] + 127) // 255, 255).astype(np.uint8)
+
+class _LayoutOverlay:
+    """Cached sprites and the composed layer for one layout at one frame size"""
+    
+    def __init__(self, spaces: Sequence[SpaceSpec], frame_shape: Tuple[int, int],
+                 styles: Dict[str, SpaceStyle]):
+        self.height, self.width = frame_shape
+        self.styles = styles
+        self.keys = [space[0] for space in spaces]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.rects = [tuple(int(v) for v in space[1]) for space in spaces]
+        self.labels = [space[2] for space in spaces]
+        self.polygons = [
+            np.round(space[3]).astype(np.int32).reshape(-1, 1, 2) if len(space) > 3 and space[3] is not None else None
+            for space in spaces
+        ]
+        self.states = [None] * len(spaces)
+        self._sprites = {}
+        self._layer = _Layer(self.height, self.width)
+        # Extents of the sprite currently drawn for each space, for finding
+        # neighbours to repaint; empty boxes never overlap anything
+        self._extents = np.zeros((len(spaces), 4), dtype=np.int32)
+    
+    def _sprite(self, i: int, state: Optional[str]) -> Optional[_Sprite]:
+        if state is None:
+            return None
+        key = (i, state)
+        if key not in self._sprites:
+            self._sprites[key] = self._render_sprite(i, state)
+        return self._sprites[key]
+    
+    def _render_sprite(self, i: int, state: str) -> Optional[_Sprite]:
+        style = self.styles[state]
+        x1, y1, x2, y2 = self.rects[i]
+        text = style.text_for(self.labels[i])
+        
+        # Footprint of the outline and of the label, clipped to the frame
+        pad = style.thickness
+        fx0, fy0, fx1, fy1 = x1 - pad, y1 - pad, x2 + pad + 1, y2 + pad + 1
+        if text:
+            (text_w, text_h), baseline = cv2.getTextSize(text, style.font, style.font_scale, style.label_thickness)
+            tx, ty = x1 + style.label_offset[0], y1 + style.label_offset[1]
+            lpad = style.label_thickness
+            fx0, fy0 = min(fx0, tx - lpad), min(fy0, ty - text_h - lpad)
+            fx1, fy1 = max(fx1, tx + text_w + lpad + 1), max(fy1, ty + baseline + lpad + 1)
+        fx0, fy0 = max(0, fx0), max(0, fy0)
+        fx1, fy1 = min(self.width, fx1), min(self.height, fy1)
+        if fx1 <= fx0 or fy1 <= fy0:
+            return None
+        
+        # Outline and text are drawn as separate coverage masks; OpenCV does not
+        # blend a fourth channel, so antialiased text is composited here instead
+        shape = (fy1 - fy0, fx1 - fx0)
+        outline = np.zeros(shape, dtype=np.uint8)
+        if self.polygons[i] is None:
+            cv2.rectangle(outline, (x1 - fx0, y1 - fy0), (x2 - fx0, y2 - fy0), 255, style.thickness)
+        else:
+            cv2.polylines(outline, [self.polygons[i] - (fx0, fy0)], True, 255, style.thickness)
+        alpha = outline
+        if text:
+            glyphs = np.zeros(shape, dtype=np.uint8)
+            cv2.putText(glyphs, text, (tx - fx0, ty - fy0), style.font, style.font_scale,
+                        255, style.label_thickness)
+            coverage = glyphs.astype(np.uint16)
+            alpha = (coverage + (outline * (255 - coverage) + 127) // 255).astype(np.uint8)
+        
+        color = np.array(style.color, dtype=np.uint16)
+        premul = ((alpha[..., None] * color + 127) // 255).astype(np.uint8)
+        return _Sprite(fx0, fy0, premul, alpha)
+    
+    def _repaint(self, x0: int, y0: int, x1: int, y1: int):
+        """Clear a region and redraw every space touching it, in layout order"""
+        self._layer.clear(x0, y0, x1, y1)
+        extents = self._extents
+        touching = np.nonzero(
+            (extents[:, 0] < x1) & (extents[:, 2] > x0) &
+            (extents[:, 1] < y1) & (extents[:, 3] > y0)
+        )[0]
+        for j in touching:
+            self._layer.blit(self._sprite(j, self.states[j]), clip=(x0, y0, x1, y1))
+    
+    def update(self, states: List[Optional[str]]) -> int:
+        """Redraw spaces whose state changed; returns how many changed"""
+        changed = 0
+        for i, state in enumerate(states):
+            previous = self.states[i]
+            if state == previous:
+                continue
+            changed += 1
+            old_sprite = self._sprite(i, previous)
+            new_sprite = self._sprite(i, state)
+            self.states[i] = state
+            self._extents[i] = (new_sprite.x0, new_sprite.y0, new_sprite.x1, new_sprite.y1) if new_sprite else 0
+            
+            boxes = [(sp.x0, sp.y0, sp.x1, sp.y1) for sp in (old_sprite, new_sprite) if sp is not None]
+            if boxes:
+                self._repaint(min(b[0] for b in boxes), min(b[1] for b in boxes),
+                              max(b[2] for b in boxes), max(b[3] for b in boxes))
+        return changed
+    
+    def compose(self, frame: np.ndarray):
+        """Blend the cached layer onto the frame"""
+        target = frame if frame.flags['C_CONTIGUOUS'] else np.ascontiguousarray(frame)
+        self._layer.blend_onto(target)
+        if target is not frame:
+            frame[...] = target
+
+class SpaceOverlayRenderer:
+    """
+    Draws parking spaces onto frames from cached per-state layers.
+    
+    ``styles`` maps each state to its SpaceStyle; spaces are drawn in the order
+    given, so overlapping labels stack exactly as sequential drawing would.
+    A handful of layouts (keyed by ``layout_key`` and frame size) are cached.
+    """
+    
+    def __init__(self, styles: Dict[str, SpaceStyle], max_layouts: int = 8):
+        self.styles = OrderedDict(styles)
+        self.max_layouts = max_layouts
+        self._overlays = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def render(self, frame: np.ndarray, spaces: Sequence[SpaceSpec], states: Dict,
+               layout_key: Hashable = None, default_state: Optional[str] = None,
+               copy: bool = True) -> np.ndarray:
+        """Return ``frame`` with every space drawn in the style of its state"""
+        if layout_key is None:
+            layout_key = tuple(
+                (space[0], tuple(space[1]), space[2],
+                 np.asarray(space[3]).tobytes() if len(space) > 3 and space[3] is not None else None)
+                for space in spaces
+            )
+        cache_key = (layout_key, frame.shape[:2])
+        
+        output = frame.copy() if copy else frame
+        
+        with self._lock:
+            overlay = self._overlays.get(cache_key)
+            if overlay is None:
+                overlay = _LayoutOverlay(spaces, frame.shape[:2], self.styles)
+                self._overlays[cache_key] = overlay
+                while len(self._overlays) > self.max_layouts:
+                    self._overlays.popitem(last=False)
+            else:
+                self._overlays.move_to_end(cache_key)
+            
+            overlay.update([states.get(key, default_state) for key in overlay.keys])
+            overlay.compose(output)
+        
+        return output
@@ -2,7 +2,16 @@ import cv2
 import numpy as np
 import json
 import os
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, List, Tuple, Any, Optional, Union
+from .overlay_renderer import SpaceOverlayRenderer, SpaceStyle
+from .space_layout import SpaceLayout
+from .layout_cache import layout_cache
+from monitoring.metrics import stage_timer, timed_stage
+
+SPOT_OVERLAY = SpaceOverlayRenderer({
+    'free': SpaceStyle((0, 255, 0), label=lambda spot_id: f"{spot_id}: FREE", label_offset=(0, -10)),
+    'occupied': SpaceStyle((0, 0, 255), label=lambda spot_id: f"{spot_id}: OCCUPIED", label_offset=(0, -10))
+})
 
 class ParkingDetector:
     """
@@ -11,17 +20,23 @@ class ParkingDetector:
     
     def __init__(self):
         self.spot_definitions = {}
+        self._default_layout = None
         self.load_spot_definitions()
     
-    def load_spot_definitions(self, lot_id: str = 'default'):
-        """Load parking spot definitions from configuration"""
-        config_file = f'config/spots_{lot_id}.json'
-        if os.path.exists(config_file):
-            with open(config_file, 'r') as f:
-                self.spot_definitions[lot_id] = json.load(f)
-        else:
+    def load_spot_definitions(self, lot_id: str = 'default') -> SpaceLayout:
+        """Load parking spot definitions from configuration (JSON or npz, cached until changed)"""
+        config_file = layout_cache.find(f'config/spots_{lot_id}')
+        layout = layout_cache.get(config_file) if config_file else None
+        if layout is None:
             # Default spots for the sample image (we'll define these based on the parking lot image)
-            self.spot_definitions[lot_id] = self._get_default_spots()
+            layout = self._get_default_layout()
+        self.spot_definitions[lot_id] = layout
+        return layout
+    
+    def _get_default_layout(self) -> SpaceLayout:
+        if self._default_layout is None:
+            self._default_layout = SpaceLayout.from_xywh_spaces(self._get_default_spots())
+        return self._default_layout
     
     def _get_default_spots(self) -> List[Dict]:
         """
@@ -67,28 +82,38 @@ class ParkingDetector:
         
         return spots
     
-    def save_spot_definitions(self, lot_id: str, spots: List[Dict]):
-        """Save parking spot definitions to configuration file"""
-        os.makedirs('config', exist_ok=True)
-        config_file = f'config/spots_{lot_id}.json'
-        
-        with open(config_file, 'w') as f:
-            json.dump(spots, f, indent=2)
-        
-        self.spot_definitions[lot_id] = spots
+    def save_spot_definitions(self, lot_id: str, spots: Union[List[Dict], SpaceLayout],
+                              binary: bool = False):
+        """Save parking spot definitions to configuration file, swapped in atomically"""
+        layout = SpaceLayout.coerce(spots)
+        stem = f'config/spots_{lot_id}'
+        config_file = stem + ('.npz' if binary else '.json')
+        
+        layout_cache.save(config_file, layout, spot_list=True)
+        
+        # Only one format per lot, so the binary file never shadows a newer JSON one
+        stale_file = stem + ('.json' if binary else '.npz')
+        if os.path.exists(stale_file):
+            os.remove(stale_file)
+            layout_cache.invalidate(stale_file)
+        
+        self.spot_definitions[lot_id] = layout
     
-    def detect_parking_spaces(self, image_path: str, lot_id: str = 'default') -> Dict[str, Any]:
+    def detect_parking_spaces(self, image_path: str, lot_id: str = 'default',
+                              layout: Optional[SpaceLayout] = None) -> Dict[str, Any]:
         """
-        Main method to detect parking space occupancy
+        Main method to detect parking space occupancy; ``layout`` overrides the lot's spots
         """
         try:
             # Load the image
-            image = cv2.imread(image_path)
+            with stage_timer('parking_detector', 'decode'):
+                image = cv2.imread(image_path)
             if image is None:
                 raise ValueError(f"Could not load image from {image_path}")
             
-            # Get parking spot definitions
-            spots = self.spot_definitions.get(lot_id, self._get_default_spots())
+            # Get parking spot definitions; the layout cache stats the file, so edits
+            # to config/spots_*.json are picked up without reparsing unchanged ones
+            spots = layout if layout is not None else self.load_spot_definitions(lot_id)
             
             # Analyze each parking spot
             results = self._analyze_spots(image, spots)
@@ -119,10 +144,13 @@ class ParkingDetector:
                 'spots': []
             }
     
-    def _analyze_spots(self, image: np.ndarray, spots: List[Dict]) -> Dict[str, Any]:
+    @timed_stage('parking_detector', 'spot_analysis')
+    def _analyze_spots(self, image: np.ndarray, spots: Union[List[Dict], SpaceLayout]) -> Dict[str, Any]:
         """
         Analyze individual parking spots for occupancy
         """
+        spots = SpaceLayout.coerce(spots).to_xywh_spaces()
+        
         # Convert to different color spaces for analysis
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
@@ -285,6 +313,7 @@ class ParkingDetector:
             'detection_factors': factors
         }
     
+    @timed_stage('parking_detector', 'annotation')
     def create_annotated_image(self, image_path: str, detection_results: Dict, 
                              output_path: Optional[str] = None) -> str:
         """
@@ -292,18 +321,14 @@ class ParkingDetector:
         """
         image = cv2.imread(image_path)
         
+        # Red for occupied, Green for free; labels are pre-rendered per spot and state
+        states = {spot['id']: 'occupied' if spot['occupied'] else 'free' for spot in detection_results['spots']}
+        spots = []
         for spot in detection_results['spots']:
             x, y, w, h = spot['coordinates']
-            
-            # Choose color based on occupancy
-            color = (0, 0, 255) if spot['occupied'] else (0, 255, 0)  # Red for occupied, Green for free
-            
-            # Draw rectangle around parking spot
-            cv2.rectangle(image, (x, y), (x + w, y + h), color, 2)
-            
-            # Add spot ID and status
-            text = f"{spot['id']}: {'OCCUPIED' if spot['occupied'] else 'FREE'}"
-            cv2.putText(image, text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            spots.append((spot['id'], (x, y, x + w, y + h), str(spot['id'])))
+        
+        image = SPOT_OVERLAY.render(image, spots, states, copy=False)
         
         # Save annotated image
         if output_path is None:
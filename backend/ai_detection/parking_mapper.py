@@ -8,38 +8,71 @@ import numpy as np
 import json
 from typing import List, Dict, Tuple, Optional
 import os
+from .overlay_renderer import SpaceOverlayRenderer, SpaceStyle
+from .space_layout import SpaceLayout, xywh_to_xyxy
+from .layout_cache import layout_cache
+
+def _space_style(color):
+    return SpaceStyle(color, thickness=2, font_scale=0.4, label_thickness=1, label_offset=(5, 15))
+
+# Shared across mapper instances so cached layers survive between requests
+SPACE_OVERLAY = SpaceOverlayRenderer({
+    'none': _space_style((255, 255, 0)),
+    'unknown': _space_style((255, 0, 0)),
+    'available': _space_style((0, 255, 0)),
+    'occupied': _space_style((0, 0, 255))
+})
+
+def _space_label(space_id):
+    return str(space_id).replace('_', ' ')
 
 class ParkingMapper:
-    def __init__(self):
+    def __init__(self, layout: Optional[SpaceLayout] = None):
         self.parking_spaces = []
         self.video_width = 1280
         self.video_height = 720
+        self._layout = None
+        self._layout_source = None
+        if layout is not None:
+            self.layout = layout
+    
+    @property
+    def layout(self) -> SpaceLayout:
+        """Array view of ``parking_spaces``, rebuilt only when the list is replaced or grows"""
+        if (self._layout is None or self._layout_source is not self.parking_spaces
+                or len(self._layout) != len(self.parking_spaces)):
+            self._layout = SpaceLayout.from_xywh_spaces(self.parking_spaces, self.video_width, self.video_height)
+            self._layout_source = self.parking_spaces
+        return self._layout
+    
+    @layout.setter
+    def layout(self, layout: SpaceLayout):
+        self._layout = layout
+        self.parking_spaces = layout.to_xywh_spaces()
+        self._layout_source = self.parking_spaces
+        self.video_width = layout.width or self.video_width
+        self.video_height = layout.height or self.video_height
         
     def load_parking_spaces(self, config_file: str) -> bool:
-        """Load parking space coordinates from JSON file"""
+        """Load parking space coordinates from a JSON or npz layout file (cached until it changes)"""
         try:
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    self.parking_spaces = config.get('parking_spaces', [])
-                    self.video_width = config.get('video_width', 1280)
-                    self.video_height = config.get('video_height', 720)
+            layout = layout_cache.get(config_file)
+            if layout is not None:
+                self.video_width = layout.width or 1280
+                self.video_height = layout.height or 720
+                self.layout = layout
                 return True
         except Exception as e:
             print(f"Error loading parking spaces: {e}")
         return False
     
     def save_parking_spaces(self, config_file: str) -> bool:
-        """Save parking space coordinates to JSON file"""
+        """Save parking space coordinates to a JSON or npz layout file, replacing it atomically"""
         try:
-            config = {
-                'video_width': self.video_width,
-                'video_height': self.video_height,
-                'total_spaces': len(self.parking_spaces),
-                'parking_spaces': self.parking_spaces
-            }
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            layout = self.layout
+            if (layout.width, layout.height) != (self.video_width, self.video_height):
+                layout = SpaceLayout.from_xywh_spaces(self.parking_spaces, self.video_width, self.video_height)
+            layout_cache.save(config_file, layout)
             return True
         except Exception as e:
             print(f"Error saving parking spaces: {e}")
@@ -173,21 +206,28 @@ class ParkingMapper:
             
             # If significant overlap, mark space as occupied
             if overlap > 0.3:  # 30% overlap threshold
-                return {
-                    'space_id': space_id,
-                    'occupied': True,
-                    'confidence': min(1.0, car['confidence'] + overlap * 0.3),
-                    'detected_car': car['id'],
-                    'overlap_ratio': overlap
-                }
+                return self._space_occupancy(space_id, car, overlap)
         
         # No significant car overlap, space is available
+        return self._space_occupancy(space_id)
+    
+    @staticmethod
+    def _space_occupancy(space_id, car: Optional[Dict] = None, overlap: float = 0.0) -> Dict:
+        if car is None:
+            return {
+                'space_id': space_id,
+                'occupied': False,
+                'confidence': 0.8,  # High confidence for empty spaces
+                'detected_car': None,
+                'overlap_ratio': 0.0
+            }
+        
         return {
             'space_id': space_id,
-            'occupied': False,
-            'confidence': 0.8,  # High confidence for empty spaces
-            'detected_car': None,
-            'overlap_ratio': 0.0
+            'occupied': True,
+            'confidence': min(1.0, car['confidence'] + overlap * 0.3),
+            'detected_car': car['id'],
+            'overlap_ratio': overlap
         }
     
     def _calculate_space_overlap(self, space_coords: List[int], car_coords: List[int]) -> float:
@@ -218,18 +258,32 @@ class ParkingMapper:
         if not self.parking_spaces:
             return {'error': 'No parking spaces defined'}
         
+        layout = self.layout
         occupied_spaces = []
         available_spaces = []
         
-        for space in self.parking_spaces:
-            occupancy = self.check_space_occupancy(frame, space, detected_cars)
-            
-            if occupancy['occupied']:
-                occupied_spaces.append(occupancy)
+        # Coverage of every space by every car at once; a space takes the first
+        # car (in detection order) covering more than 30% of it. Polygon spaces
+        # are measured in pixels against the layout's label image
+        if detected_cars:
+            frame_shape = frame.shape[:2] if frame is not None else (self.video_height, self.video_width)
+            coverage = layout.coverage(xywh_to_xyxy([car['bbox'] for car in detected_cars]), frame_shape)
+            hits = coverage > 0.3
+            first_car = hits.argmax(axis=1)
+            is_occupied = hits.any(axis=1)
+        else:
+            is_occupied = np.zeros(len(layout), dtype=bool)
+        
+        for i, space_id in enumerate(layout.ids.tolist()):
+            if is_occupied[i]:
+                car_index = first_car[i]
+                occupied_spaces.append(self._space_occupancy(
+                    space_id, detected_cars[car_index], float(coverage[i, car_index])
+                ))
             else:
-                available_spaces.append(occupancy)
+                available_spaces.append(self._space_occupancy(space_id))
         
-        total_spaces = len(self.parking_spaces)
+        total_spaces = len(layout)
         occupied_count = len(occupied_spaces)
         available_count = len(available_spaces)
         occupancy_rate = occupied_count / total_spaces if total_spaces > 0 else 0
@@ -245,44 +299,18 @@ class ParkingMapper:
     
     def draw_parking_spaces(self, frame: np.ndarray, occupancy_data: Dict = None) -> np.ndarray:
         """Draw parking space boundaries on the frame"""
-        annotated_frame = frame.copy()
-        
-        for space in self.parking_spaces:
-            x, y, w, h = space['coordinates']
-            space_id = space['id']
-            
-            # Determine color based on occupancy
-            if occupancy_data:
-                space_status = None
-                for detail in occupancy_data.get('occupied_details', []):
-                    if detail['space_id'] == space_id:
-                        space_status = 'occupied'
-                        break
-                
-                if space_status is None:
-                    for detail in occupancy_data.get('available_details', []):
-                        if detail['space_id'] == space_id:
-                            space_status = 'available'
-                            break
-                
-                # Color coding: Red = occupied, Green = available, Blue = unknown
-                if space_status == 'occupied':
-                    color = (0, 0, 255)  # Red
-                elif space_status == 'available':
-                    color = (0, 255, 0)  # Green
-                else:
-                    color = (255, 0, 0)  # Blue
-            else:
-                color = (255, 255, 0)  # Yellow (no occupancy data)
-            
-            # Draw rectangle
-            cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), color, 2)
-            
-            # Add space label
-            cv2.putText(annotated_frame, space_id.replace('_', ' '), 
-                       (x + 5, y + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+        if occupancy_data:
+            # Color coding: Red = occupied, Green = available, Blue = unknown
+            states = {detail['space_id']: 'available' for detail in occupancy_data.get('available_details', [])}
+            states.update({detail['space_id']: 'occupied' for detail in occupancy_data.get('occupied_details', [])})
+            default_state = 'unknown'
+        else:
+            states = {}
+            default_state = 'none'  # Yellow (no occupancy data)
         
-        return annotated_frame
+        layout = self.layout
+        return SPACE_OVERLAY.render(frame, layout.overlay_spaces(_space_label), states,
+                                    layout_key=layout.key, default_state=default_state)
 
 def test_parking_mapper():
     """Test parking space mapping functionality"""
@@ -0,0 +1,355 @@
+"""
+Parking Space Layout
+Array-backed parking space geometry shared by all detectors, with loaders for
+the predefined bbox list, the mapper JSON config and legacy spot lists
+"""
+
+import cv2
+import json
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+def _object_array(values: Sequence) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+NPZ_FORMAT_VERSION = 1
+
+# Record fields the npz format stores as arrays rather than JSON extras
+_NPZ_FIELDS = ('id', 'row', 'bbox', 'coordinates', 'polygon')
+
+def _polygon_of(space: Dict) -> Optional[np.ndarray]:
+    polygon = space.get('polygon')
+    if polygon is None:
+        return None
+    polygon = np.asarray(polygon).reshape(-1, 2)
+    if not np.issubdtype(polygon.dtype, np.integer):
+        polygon = polygon.astype(np.float64)
+    if len(polygon) < 3:
+        raise ValueError(f"Polygon for space {space.get('id')} needs at least 3 points")
+    return polygon
+
+def _polygon_bbox(polygon: np.ndarray) -> List:
+    return polygon.min(axis=0).tolist() + polygon.max(axis=0).tolist()
+
+def xywh_to_xyxy(boxes) -> np.ndarray:
+    """Convert an (N, 4) array of x, y, width, height into corner coordinates"""
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+
+class SpaceLayout:
+    """
+    Immutable set of parking spaces stored column-wise.
+    
+    ``ids`` and ``rows`` are object arrays (ids may be ints or strings) and
+    ``boxes`` is an (N, 4) array of x1, y1, x2, y2 corners. Spaces may instead
+    carry a ``polygon`` (list of [x, y] points) for perspective views; their box
+    is the polygon's bounds and overlap is measured on a rasterized label image.
+    The dicts a layout was loaded from are kept so it serializes back to
+    exactly the same format.
+    """
+    
+    def __init__(self, ids: Sequence, boxes, rows: Optional[Sequence] = None,
+                 records: Optional[List[Dict]] = None,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 polygons: Optional[Sequence[Optional[np.ndarray]]] = None):
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        dtype = np.int32 if np.issubdtype(boxes.dtype, np.integer) else np.float64
+        self.boxes = np.ascontiguousarray(boxes, dtype=dtype)
+        self.ids = _object_array(ids)
+        self.rows = _object_array(rows if rows is not None else [None] * len(self.ids))
+        self.polygons = _object_array(polygons if polygons is not None else [None] * len(self.ids))
+        if not len(self.ids) == len(self.rows) == len(self.polygons) == len(self.boxes):
+            raise ValueError("Space ids, rows, polygons and boxes must have the same length")
+        self.has_polygons = any(polygon is not None for polygon in self.polygons)
+        
+        self.areas = ((self.boxes[:, 2] - self.boxes[:, 0]) *
+                      (self.boxes[:, 3] - self.boxes[:, 1])).astype(np.float64)
+        for array in (self.boxes, self.ids, self.rows, self.polygons, self.areas):
+            array.flags.writeable = False
+        
+        self.width = width
+        self.height = height
+        # Content-derived key, so reloading the same layout reuses render caches
+        self.key = ('layout', len(self.ids), hash(tuple(self.ids.tolist())), hash(self.boxes.tobytes()),
+                    hash(tuple(polygon.tobytes() for polygon in self.polygons if polygon is not None)))
+        
+        self._records = records
+        self._index = None
+        self._bbox_spaces = None
+        self._xywh_spaces = None
+        self._overlay_specs = {}
+        self._rasters = {}
+        self._raster_lock = threading.Lock()
+    
+    @classmethod
+    def from_bbox_spaces(cls, spaces: List[Dict]) -> 'SpaceLayout':
+        """Load ``[{'id': ..., 'bbox': [x1, y1, x2, y2]}]`` (PREDEFINED_PARKING_SPACES)"""
+        polygons = [_polygon_of(space) for space in spaces]
+        boxes = [space['bbox'] if polygon is None else _polygon_bbox(polygon)
+                 for space, polygon in zip(spaces, polygons)]
+        return cls([space['id'] for space in spaces], boxes,
+                   [space.get('row') for space in spaces], records=spaces, polygons=polygons)
+    
+    @classmethod
+    def from_xywh_spaces(cls, spaces: List[Dict], width: Optional[int] = None,
+                         height: Optional[int] = None) -> 'SpaceLayout':
+        """Load ``[{'id': ..., 'coordinates': [x, y, w, h], 'row': ...}]`` (mapper and spot lists)"""
+        polygons = [_polygon_of(space) for space in spaces]
+        boxes = [xywh_to_xyxy(space['coordinates'])[0].tolist() if polygon is None else _polygon_bbox(polygon)
+                 for space, polygon in zip(spaces, polygons)]
+        return cls([space['id'] for space in spaces], boxes,
+                   [space.get('row') for space in spaces], records=spaces,
+                   width=width, height=height, polygons=polygons)
+    
+    @classmethod
+    def from_mapper_config(cls, config: Dict) -> 'SpaceLayout':
+        """Load the ``parking_spaces_config.json`` document"""
+        return cls.from_xywh_spaces(config.get('parking_spaces', []),
+                                    config.get('video_width'), config.get('video_height'))
+    
+    @classmethod
+    def load_mapper_config(cls, config_file: str) -> 'SpaceLayout':
+        with open(config_file, 'r') as f:
+            return cls.from_mapper_config(json.load(f))
+    
+    @classmethod
+    def from_spaces(cls, spaces: List[Dict]) -> 'SpaceLayout':
+        """Load a space list in either format, detected from its first entry"""
+        if spaces and 'bbox' in spaces[0]:
+            return cls.from_bbox_spaces(spaces)
+        return cls.from_xywh_spaces(spaces)
+    
+    @classmethod
+    def coerce(cls, spaces: Union['SpaceLayout', List[Dict], None]) -> 'SpaceLayout':
+        """Accept a layout or any of the legacy space lists"""
+        if isinstance(spaces, SpaceLayout):
+            return spaces
+        return cls.from_spaces(spaces or [])
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def xywh(self) -> np.ndarray:
+        return np.concatenate([self.boxes[:, :2], self.boxes[:, 2:] - self.boxes[:, :2]], axis=1)
+    
+    def index_of(self, space_id) -> Optional[int]:
+        if self._index is None:
+            self._index = {space_id: i for i, space_id in enumerate(self.ids.tolist())}
+        return self._index.get(space_id)
+    
+    def intersections(self, boxes) -> np.ndarray:
+        """Intersection areas between every space and every xyxy box, shape (spaces, boxes)"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        spaces = self.boxes.astype(np.float64)
+        width = np.minimum(spaces[:, None, 2], boxes[None, :, 2]) - np.maximum(spaces[:, None, 0], boxes[None, :, 0])
+        height = np.minimum(spaces[:, None, 3], boxes[None, :, 3]) - np.maximum(spaces[:, None, 1], boxes[None, :, 1])
+        return np.clip(width, 0, None) * np.clip(height, 0, None)
+    
+    def iou(self, boxes, frame_shape: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Intersection over union with every xyxy box, shape (spaces, boxes).
+        Polygon layouts are measured in pixels when the frame shape is known.
+        """
+        if self.has_polygons and frame_shape is not None:
+            inter, space_areas, box_areas = self.raster_intersections(frame_shape, boxes)
+        else:
+            boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+            inter = self.intersections(boxes)
+            space_areas = self.areas
+            box_areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        union = space_areas[:, None] + box_areas[None, :] - inter
+        return np.divide(inter, union, out=np.zeros_like(inter), where=union != 0)
+    
+    def coverage(self, boxes, frame_shape: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Fraction of each space covered by every xyxy box, shape (spaces, boxes).
+        Polygon layouts are measured in pixels when the frame shape is known.
+        """
+        if self.has_polygons and frame_shape is not None:
+            inter, space_areas, _ = self.raster_intersections(frame_shape, boxes)
+        else:
+            inter = self.intersections(boxes)
+            space_areas = self.areas
+        areas = space_areas[:, None]
+        return np.divide(inter, areas, out=np.zeros_like(inter), where=areas > 0)
+    
+    def label_image(self, frame_shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rasterize the layout once per frame size into an image holding, per pixel,
+        the index + 1 of the space covering it (0 = no space); later spaces win
+        where spaces overlap. Returns the image and each space's pixel area.
+        
+        Rect spaces are filled as their corner polygon, so ``cv2.fillPoly``'s
+        inclusive edges apply to both kinds and a rect and the equal polygon
+        cover the same pixels.
+        """
+        height, width = int(frame_shape[0]), int(frame_shape[1])
+        with self._raster_lock:
+            raster = self._rasters.get((height, width))
+            if raster is None:
+                raster = self._rasterize(height, width)
+                if len(self._rasters) >= 4:
+                    self._rasters.pop(next(iter(self._rasters)))
+                self._rasters[(height, width)] = raster
+        return raster
+    
+    def _rasterize(self, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        labels = np.zeros((height, width), dtype=np.int32)
+        for i, (box, polygon) in enumerate(zip(self.boxes.tolist(), self.polygons)):
+            if polygon is None:
+                x1, y1, x2, y2 = box
+                if x2 <= x1 or y2 <= y1:
+                    continue
+                polygon = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+            cv2.fillPoly(labels, [np.round(polygon).astype(np.int32)], i + 1)
+        
+        areas = np.bincount(labels.ravel(), minlength=len(self) + 1)[1:].astype(np.float64)
+        labels = labels.astype(np.uint16) if len(self) < np.iinfo(np.uint16).max else labels
+        labels.flags.writeable = False
+        areas.flags.writeable = False
+        return labels, areas
+    
+    def raster_intersections(self, frame_shape: Tuple[int, int], boxes=None,
+                             masks: Optional[Sequence[np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Pixel intersections of every space with every car box (xyxy) and/or
+        boolean car mask, via one ``np.bincount`` per car over the label image.
+        Returns (intersections (spaces, cars), space pixel areas, car pixel areas).
+        """
+        labels, space_areas = self.label_image(frame_shape)
+        height, width = labels.shape
+        bins = len(self) + 1
+        columns = []
+        car_areas = []
+        
+        if boxes is not None:
+            for x1, y1, x2, y2 in np.asarray(boxes, dtype=np.float64).reshape(-1, 4):
+                x1, x2 = (int(np.clip(v, 0, width)) for v in (x1, x2))
+                y1, y2 = (int(np.clip(v, 0, height)) for v in (y1, y2))
+                region = labels[y1:y2, x1:x2]
+                columns.append(np.bincount(region.ravel(), minlength=bins)[1:])
+                car_areas.append(region.size)
+        
+        for mask in masks or []:
+            region = labels[mask]
+            columns.append(np.bincount(region, minlength=bins)[1:])
+            car_areas.append(region.size)
+        
+        if not columns:
+            return np.zeros((len(self), 0)), space_areas, np.zeros(0)
+        return np.stack(columns, axis=1).astype(np.float64), space_areas, np.asarray(car_areas, dtype=np.float64)
+    
+    def to_bbox_spaces(self) -> List[Dict]:
+        """Spaces as ``{'id', 'bbox', ...}`` dicts; built once and shared"""
+        if self._bbox_spaces is None:
+            if self._records is not None and all('bbox' in record for record in self._records):
+                self._bbox_spaces = self._records
+            else:
+                self._bbox_spaces = [
+                    dict(record, bbox=bbox) for record, bbox in zip(self._base_records(), self.boxes.tolist())
+                ]
+        return self._bbox_spaces
+    
+    def to_xywh_spaces(self) -> List[Dict]:
+        """Spaces as ``{'id', 'coordinates', ...}`` dicts; built once and shared"""
+        if self._xywh_spaces is None:
+            if self._records is not None and all('coordinates' in record for record in self._records):
+                self._xywh_spaces = self._records
+            else:
+                self._xywh_spaces = [
+                    dict(record, coordinates=coordinates)
+                    for record, coordinates in zip(self._base_records(), self.xywh.tolist())
+                ]
+        return self._xywh_spaces
+    
+    def to_mapper_config(self, width: Optional[int] = None, height: Optional[int] = None) -> Dict:
+        return {
+            'video_width': width or self.width or 1280,
+            'video_height': height or self.height or 720,
+            'total_spaces': len(self),
+            'parking_spaces': self.to_xywh_spaces()
+        }
+    
+    def save_npz(self, file) -> None:
+        """
+        Write the compact binary layout format: geometry as arrays, polygons as
+        one flat point array plus offsets, and non-geometry fields as JSON.
+        """
+        ids = self.ids.tolist()
+        polygon_sizes = [0 if polygon is None else len(polygon) for polygon in self.polygons]
+        polygons = [polygon for polygon in self.polygons if polygon is not None]
+        extras = [{key: value for key, value in record.items() if key not in _NPZ_FIELDS}
+                  for record in (self._records or [])]
+        
+        np.savez_compressed(
+            file,
+            format_version=np.array(NPZ_FORMAT_VERSION),
+            boxes=self.boxes,
+            ids=np.array([str(space_id) for space_id in ids]),
+            id_is_int=np.array([isinstance(space_id, int) for space_id in ids], dtype=bool),
+            polygon_offsets=np.concatenate([[0], np.cumsum(polygon_sizes)]).astype(np.int64),
+            polygon_points=np.concatenate(polygons).astype(np.float64) if polygons else np.zeros((0, 2)),
+            meta=np.array(json.dumps({
+                'width': self.width,
+                'height': self.height,
+                'rows': self.rows.tolist(),
+                'extras': extras if any(extras) else None
+            }))
+        )
+    
+    @classmethod
+    def load_npz(cls, file) -> 'SpaceLayout':
+        with np.load(file, allow_pickle=False) as data:
+            if int(data['format_version']) != NPZ_FORMAT_VERSION:
+                raise ValueError(f"Unsupported layout format version: {int(data['format_version'])}")
+            boxes = data['boxes']
+            ids = [int(space_id) if is_int else str(space_id)
+                   for space_id, is_int in zip(data['ids'].tolist(), data['id_is_int'].tolist())]
+            offsets = data['polygon_offsets']
+            points = data['polygon_points']
+            meta = json.loads(str(data['meta']))
+        
+        polygons = []
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            polygon = points[start:end] if end > start else None
+            if polygon is not None and np.all(polygon == np.round(polygon)):
+                polygon = polygon.astype(np.int64)
+            polygons.append(polygon)
+        
+        records = None
+        if meta.get('extras'):
+            records = []
+            for space_id, row, polygon, box, extra in zip(ids, meta['rows'], polygons, boxes.tolist(), meta['extras']):
+                record = dict(extra, id=space_id, coordinates=[box[0], box[1], box[2] - box[0], box[3] - box[1]])
+                if row is not None:
+                    record['row'] = row
+                if polygon is not None:
+                    record['polygon'] = polygon.tolist()
+                records.append(record)
+        
+        return cls(ids, boxes, meta.get('rows'), records=records,
+                   width=meta.get('width'), height=meta.get('height'), polygons=polygons)
+    
+    def _base_records(self) -> List[Dict]:
+        if self._records is not None:
+            return [{key: value for key, value in record.items() if key not in ('bbox', 'coordinates')}
+                    for record in self._records]
+        records = [{'id': space_id} if row is None else {'id': space_id, 'row': row}
+                   for space_id, row in zip(self.ids.tolist(), self.rows.tolist())]
+        for record, polygon in zip(records, self.polygons):
+            if polygon is not None:
+                record['polygon'] = polygon.tolist()
+        return records
+    
+    def overlay_spaces(self, label: Callable = str) -> List:
+        """``(id, box, label, polygon)`` tuples for SpaceOverlayRenderer, cached per label function"""
+        specs = self._overlay_specs.get(label)
+        if specs is None:
+            specs = [(space_id, tuple(box), label(space_id), polygon)
+                     for space_id, box, polygon in zip(self.ids.tolist(), self.boxes.tolist(), self.polygons)]
+            self._overlay_specs[label] = specs
+        return specs
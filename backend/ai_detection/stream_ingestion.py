@@ -0,0 +1,283 @@
+"""
+Live Stream Ingestion Module
+Reads frames from a camera URL or a local video file on a background thread and
+keeps only the newest decoded frame, so slow analysis never builds a backlog
+"""
+
+import cv2
+import numpy as np
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+
+class LatestFrameStream:
+    """
+    Frame source with latest-frame-wins backpressure.
+    
+    A reader thread decodes frames as fast as the source produces them and
+    overwrites a single-slot buffer. Consumers always receive the most recent
+    frame; any frame that was overwritten before being read is counted as dropped.
+    """
+    
+    def __init__(self, source: str, realtime: Optional[bool] = None,
+                 reconnect_delay: float = 2.0):
+        self.source = source
+        # Local files are paced to their native fps so they behave like a camera
+        self.realtime = realtime if realtime is not None else not self._is_url(source)
+        self.reconnect_delay = reconnect_delay
+        
+        self.cap = None
+        self.fps = 0.0
+        self.width = 0
+        self.height = 0
+        
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._lock)
+        self._frame = None
+        self._frame_id = 0
+        self._frame_timestamp = 0.0
+        self._consumed_id = 0
+        self._running = False
+        self._thread = None
+        
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.frames_consumed = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.started_at = None
+    
+    @staticmethod
+    def _is_url(source: str) -> bool:
+        return '://' in str(source)
+    
+    def _open(self) -> bool:
+        """Open the capture and read basic stream properties"""
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            self.last_error = f"Could not open stream: {self.source}"
+            return False
+        
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.last_error = None
+        return True
+    
+    def start(self) -> Dict:
+        """Open the source and start the background reader thread"""
+        if self._running:
+            return self.stats()
+        
+        if not self._open():
+            return {'error': self.last_error}
+        
+        self._running = True
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._reader_loop, daemon=True,
+                                        name=f'stream-reader-{self.source}')
+        self._thread.start()
+        
+        return {
+            'success': True,
+            'source': self.source,
+            'fps': self.fps,
+            'width': self.width,
+            'height': self.height,
+            'realtime': self.realtime
+        }
+    
+    def _reader_loop(self):
+        frame_interval = 1.0 / self.fps if self.realtime and self.fps > 0 else 0.0
+        next_frame_at = time.monotonic()
+        
+        try:
+            while self._running:
+                ret, frame = self.cap.read() if self.cap else (False, None)
+                
+                if not ret or frame is None:
+                    if not self._is_url(self.source):
+                        # Local files loop back to the start like a continuous feed
+                        if self.cap and self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                            continue
+                    self._reconnect()
+                    next_frame_at = time.monotonic()
+                    continue
+                
+                self._publish(frame)
+                
+                if frame_interval:
+                    next_frame_at += frame_interval
+                    delay = next_frame_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        # Fell behind the source clock; resync instead of bursting
+                        next_frame_at = time.monotonic()
+        finally:
+            # The reader owns the capture while it runs, so a stop() that timed
+            # out waiting for a blocked read() leaves the release to it
+            self._release_capture()
+    
+    def _release_capture(self):
+        cap, self.cap = self.cap, None
+        if cap:
+            cap.release()
+    
+    def _publish(self, frame: np.ndarray):
+        with self._frame_ready:
+            if self._frame is not None and self._consumed_id < self._frame_id:
+                self.frames_dropped += 1
+            self._frame = frame
+            self._frame_id += 1
+            self._frame_timestamp = time.time()
+            self.frames_decoded += 1
+            self._frame_ready.notify_all()
+    
+    def _reconnect(self):
+        self._release_capture()
+        
+        while self._running:
+            time.sleep(self.reconnect_delay)
+            if not self._running:
+                return
+            self.reconnects += 1
+            if self._open():
+                return
+    
+    def read(self, timeout: float = 5.0, newer_than: int = 0) -> Tuple[bool, Optional[np.ndarray], Dict]:
+        """
+        Return the newest frame. Blocks until a frame with an id greater than
+        ``newer_than`` is available or the timeout expires.
+        """
+        deadline = time.monotonic() + timeout
+        with self._frame_ready:
+            while self._frame is None or self._frame_id <= newer_than:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return False, None, {'frame_id': self._frame_id}
+                self._frame_ready.wait(remaining)
+            
+            frame = self._frame
+            frame_id = self._frame_id
+            timestamp = self._frame_timestamp
+            if self._consumed_id < frame_id:
+                self._consumed_id = frame_id
+                self.frames_consumed += 1
+        
+        return True, frame, {
+            'frame_id': frame_id,
+            'captured_at': timestamp,
+            'age_seconds': round(time.time() - timestamp, 3)
+        }
+    
+    def stats(self) -> Dict:
+        """Ingestion counters for monitoring backpressure"""
+        with self._lock:
+            return {
+                'source': self.source,
+                'running': self._running,
+                'realtime': self.realtime,
+                'fps': self.fps,
+                'width': self.width,
+                'height': self.height,
+                'frames_decoded': self.frames_decoded,
+                'frames_consumed': self.frames_consumed,
+                'frames_dropped': self.frames_dropped,
+                'reconnects': self.reconnects,
+                'latest_frame_id': self._frame_id,
+                'latest_frame_age': round(time.time() - self._frame_timestamp, 3) if self._frame is not None else None,
+                'last_error': self.last_error,
+                'uptime': round(time.time() - self.started_at, 1) if self.started_at else 0
+            }
+    
+    def stop(self):
+        """Stop the reader thread and release the capture"""
+        self._running = False
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.reconnect_delay + 1.0)
+        if self._thread is None or not self._thread.is_alive():
+            self._release_capture()
+        self._frame = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class StreamRegistry:
+    """Process-wide registry of open live streams keyed by stream id"""
+    
+    def __init__(self, max_streams: int = 8):
+        self.max_streams = max_streams
+        self._streams = {}
+        # Ids reserved by opens still connecting to their source
+        self._opening = set()
+        self._lock = threading.Lock()
+    
+    def open(self, source: str, stream_id: Optional[str] = None,
+             realtime: Optional[bool] = None) -> Dict:
+        stream_id = stream_id or str(uuid.uuid4())
+        with self._lock:
+            if stream_id in self._streams or stream_id in self._opening:
+                return {'error': f'Stream already open: {stream_id}'}
+            if len(self._streams) + len(self._opening) >= self.max_streams:
+                return {'error': f'Maximum of {self.max_streams} open streams reached'}
+            self._opening.add(stream_id)
+        
+        # Connecting to a network source can take seconds; the registry stays
+        # available to other requests meanwhile
+        try:
+            stream = LatestFrameStream(source, realtime=realtime)
+            result = stream.start()
+        except Exception:
+            with self._lock:
+                self._opening.discard(stream_id)
+            raise
+        
+        with self._lock:
+            self._opening.discard(stream_id)
+            if result.get('success'):
+                self._streams[stream_id] = stream
+        if not result.get('success'):
+            return result
+        
+        result['stream_id'] = stream_id
+        return result
+    
+    def get(self, stream_id: str) -> Optional[LatestFrameStream]:
+        with self._lock:
+            return self._streams.get(stream_id)
+    
+    def close(self, stream_id: str) -> bool:
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is None:
+            return False
+        stream.stop()
+        return True
+    
+    def list_streams(self) -> Dict:
+        with self._lock:
+            streams = dict(self._streams)
+        return {stream_id: stream.stats() for stream_id, stream in streams.items()}
+    
+    def close_all(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.stop()
+
+
+# Global stream registry instance
+stream_registry = StreamRegistry()
@@ -10,13 +10,9 @@ from typing import List, Dict, Tuple, Optional
 import json
 from datetime import datetime
 
-# Import YOLO for object detection
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    print("YOLO not available. Install ultralytics: pip install ultralytics")
-    YOLO_AVAILABLE = False
+# YOLO (ultralytics) is imported on first detection, not at module load
+from .model_registry import model_registry, yolo_available
+from monitoring.metrics import timed_stage
 
 class VideoProcessor:
     def __init__(self):
@@ -57,6 +53,7 @@ class VideoProcessor:
         except Exception as e:
             return {"error": f"Error loading video: {str(e)}"}
     
+    @timed_stage('video_processor', 'decode')
     def extract_frame(self, frame_number: int = 0) -> Tuple[bool, np.ndarray]:
         """Extract a specific frame from the video"""
         if not self.cap:
@@ -107,24 +104,26 @@ class VideoProcessor:
         
         return motion_mask
     
+    @timed_stage('video_processor', 'detect_yolo')
     def detect_cars_yolo(self, frame: np.ndarray, model_path: str = 'yolov8n.pt') -> List[Dict]:
         """Enhanced car detection using YOLO object detection"""
         detected_cars = []
         
-        if not YOLO_AVAILABLE:
-            print("YOLO not available, falling back to basic detection")
+        if not yolo_available():
+            print("YOLO not available. Install ultralytics: pip install ultralytics")
+            print("Falling back to basic detection")
             return self.detect_cars_basic(frame)
         
         try:
-            # Load YOLO model (auto-downloads on first use)
-            model = YOLO(model_path)
+            # Shared YOLO model (auto-downloads and loads on first use)
+            model = model_registry.get_model(model_path)
             
             # Vehicle classes in COCO dataset: car=2, motorcycle=3, bus=5, truck=7
             vehicle_classes = [2, 3, 5, 7]
             class_names = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
             
             # Run inference
-            results = model(frame, verbose=False)
+            results = model.predict(frame, verbose=False)
             
             for result in results:
                 if result.boxes is not None:
@@ -156,6 +155,7 @@ class VideoProcessor:
         
         return detected_cars
     
+    @timed_stage('video_processor', 'detect_mog2')
     def detect_cars_mog2(self, frame: np.ndarray, bg_subtractor: Optional[cv2.BackgroundSubtractorMOG2] = None) -> Tuple[List[Dict], cv2.BackgroundSubtractorMOG2]:
         """Enhanced car detection using MOG2 background subtraction"""
         detected_cars = []
@@ -218,6 +218,7 @@ class VideoProcessor:
         
         return detected_cars, bg_subtractor
     
+    @timed_stage('video_processor', 'detect_hybrid')
     def detect_cars_hybrid(self, frame: np.ndarray, bg_subtractor: Optional[cv2.BackgroundSubtractorMOG2] = None) -> Tuple[List[Dict], cv2.BackgroundSubtractorMOG2]:
         """Hybrid detection combining YOLO and MOG2 for maximum accuracy"""
         
@@ -274,6 +275,7 @@ class VideoProcessor:
         
         return intersection / union if union > 0 else 0.0
     
+    @timed_stage('video_processor', 'detect_advanced')
     def detect_cars_advanced(self, frame: np.ndarray) -> List[Dict]:
         """Advanced car detection using multiple OpenCV techniques for stationary cars"""
         detected_cars = []
@@ -1,18 +1,33 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import os
+from .model_registry import model_registry
+from .overlay_renderer import SpaceOverlayRenderer, SpaceStyle
+from .space_layout import SpaceLayout
+from monitoring.metrics import stage_timer
+
+# Free, occupied and partially free space styles; spaces are drawn in layout order
+SPACE_OVERLAY = SpaceOverlayRenderer({
+    'free': SpaceStyle((255, 0, 0), label="FREE", label_thickness=2),
+    'occupied': SpaceStyle((0, 0, 255), label="OCCUPIED", label_thickness=2),
+    'partially_free': SpaceStyle((0, 255, 255), label="PARTIAL", label_thickness=2)
+})
+
+def _no_label(space_id):
+    return ''
 
 class YOLOParkingDetector:
     def __init__(self, model_name='yolov8s.pt', confidence_threshold=0.35):
         self.confidence_threshold = confidence_threshold
-        self.model = YOLO(model_name)
+        # Shared across detectors; ultralytics is imported on the first load
+        self.loaded_model = model_registry.get_model(model_name)
+        self.model = self.loaded_model.model
         
         self.car_classes = ['car', 'truck', 'bus', 'motorcycle']
         self.coco_car_indices = [2, 7, 5, 3]
         
     def detect_cars(self, image):
-        results = self.model(image, conf=self.confidence_threshold, verbose=False)
+        results = self.loaded_model.predict(image, conf=self.confidence_threshold, verbose=False)
         
         detected_cars = []
         for result in results:
@@ -38,77 +53,51 @@ class YOLOParkingDetector:
         if image is None:
             raise ValueError(f"Could not load image from {image_path}")
         
-        detected_cars = self.detect_cars(image)
+        return self.analyze_frame(image, parking_spaces)
+    
+    def analyze_frame(self, image, parking_spaces):
+        layout = SpaceLayout.coerce(parking_spaces)
+        with stage_timer('yolo_detector', 'inference'):
+            detected_cars = self.detect_cars(image)
         
         occupied_spaces = []
         free_spaces = []
         partially_free_spaces = []
+        buckets = {'occupied': occupied_spaces, 'free': free_spaces, 'partially_free': partially_free_spaces}
         
-        for space in parking_spaces:
-            space_bbox = space['bbox']
-            overlap_ratio = self._calculate_max_overlap_with_cars(space_bbox, detected_cars)
-            
-            space_with_status = space.copy()
-            
-            if overlap_ratio > 0.6:
-                space_with_status['status'] = 'occupied'
-                occupied_spaces.append(space_with_status)
-            elif overlap_ratio > 0.2:
-                space_with_status['status'] = 'partially_free'
-                partially_free_spaces.append(space_with_status)
-            else:
-                space_with_status['status'] = 'free'
-                free_spaces.append(space_with_status)
+        with stage_timer('yolo_detector', 'overlap'):
+            overlap_ratios = self._calculate_max_overlap_with_cars(layout, detected_cars, image.shape[:2])
+        statuses = np.where(overlap_ratios > 0.6, 'occupied',
+                            np.where(overlap_ratios > 0.2, 'partially_free', 'free'))
+        
+        for space, status in zip(layout.to_bbox_spaces(), statuses.tolist()):
+            buckets[status].append(dict(space, status=status))
         
         return {
             'detected_cars': detected_cars,
             'occupied_spaces': occupied_spaces,
             'free_spaces': free_spaces,
             'partially_free_spaces': partially_free_spaces,
-            'total_spaces': len(parking_spaces),
-            'occupancy_rate': len(occupied_spaces) / len(parking_spaces) if parking_spaces else 0
+            'total_spaces': len(layout),
+            'occupancy_rate': len(occupied_spaces) / len(layout) if len(layout) else 0
         }
     
-    def _calculate_max_overlap_with_cars(self, space_bbox, detected_cars):
-        max_overlap = 0
-        
-        for car in detected_cars:
-            car_bbox = car['bbox']
-            overlap = self._calculate_iou(space_bbox, car_bbox)
-            max_overlap = max(max_overlap, overlap)
+    def _calculate_max_overlap_with_cars(self, layout, detected_cars, frame_shape=None):
+        """Best IoU of each space against any detected car, as one array"""
+        if not detected_cars or not len(layout):
+            return np.zeros(len(layout))
         
-        return max_overlap
+        # Polygon spaces are scored in pixels against the layout's label image
+        return layout.iou([car['bbox'] for car in detected_cars], frame_shape).max(axis=1)
     
-    def _calculate_iou(self, bbox1, bbox2):
-        x1_min, y1_min, x1_max, y1_max = bbox1
-        x2_min, y2_min, x2_max, y2_max = bbox2
-        
-        inter_x_min = max(x1_min, x2_min)
-        inter_y_min = max(y1_min, y2_min)
-        inter_x_max = min(x1_max, x2_max)
-        inter_y_max = min(y1_max, y2_max)
-        
-        if inter_x_max < inter_x_min or inter_y_max < inter_y_min:
-            return 0.0
-        
-        inter_area = (inter_x_max - inter_x_min) * (inter_y_max - inter_y_min)
-        
-        bbox1_area = (x1_max - x1_min) * (y1_max - y1_min)
-        bbox2_area = (x2_max - x2_min) * (y2_max - y2_min)
-        
-        union_area = bbox1_area + bbox2_area - inter_area
-        
-        if union_area == 0:
-            return 0.0
-        
-        iou = inter_area / union_area
-        return iou
-    
-    def annotate_image(self, image_path, analysis_results, output_path=None):
+    def annotate_image(self, image_path, analysis_results, output_path=None, layout=None):
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError(f"Could not load image from {image_path}")
         
+        return self.annotate_frame(image, analysis_results, output_path, layout)
+    
+    def annotate_frame(self, image, analysis_results, output_path=None, layout=None):
         annotated = image.copy()
         
         for car in analysis_results['detected_cars']:
@@ -123,20 +112,22 @@ class YOLOParkingDetector:
             cv2.rectangle(annotated, (x1, y1 - label_size[1] - 5), (x1 + label_size[0], y1), (0, 255, 255), -1)
             cv2.putText(annotated, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
         
-        for space in analysis_results['free_spaces']:
-            x1, y1, x2, y2 = space['bbox']
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), (255, 0, 0), 2)
-            cv2.putText(annotated, "FREE", (x1 + 5, y1 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-        
-        for space in analysis_results['occupied_spaces']:
-            x1, y1, x2, y2 = space['bbox']
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 2)
-            cv2.putText(annotated, "OCCUPIED", (x1 + 5, y1 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-        
-        for space in analysis_results['partially_free_spaces']:
-            x1, y1, x2, y2 = space['bbox']
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 255), 2)
-            cv2.putText(annotated, "PARTIAL", (x1 + 5, y1 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+        states = {}
+        for status in ('free_spaces', 'occupied_spaces', 'partially_free_spaces'):
+            for space in analysis_results[status]:
+                states[space['id']] = space['status']
+        
+        if layout is None:
+            # Sorted by id so the layout (and its overlay cache key) does not
+            # change when spaces move between the status lists
+            layout = SpaceLayout.from_bbox_spaces(sorted(
+                analysis_results['free_spaces'] + analysis_results['occupied_spaces'] +
+                analysis_results['partially_free_spaces'],
+                key=lambda space: str(space['id'])
+            ))
+        
+        SPACE_OVERLAY.render(annotated, layout.overlay_spaces(_no_label), states,
+                             layout_key=layout.key, copy=False)
         
         stats_text = [
             f"Total Spaces: {analysis_results['total_spaces']}",
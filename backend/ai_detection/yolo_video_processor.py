@@ -1,39 +1,53 @@
 import cv2
 import numpy as np
 import base64
+import functools
 from typing import Dict
 from .yolo_detector import YOLOParkingDetector
 from .parking_spaces_config import PREDEFINED_PARKING_SPACES
+from .space_layout import SpaceLayout
+from .annotated_image_store import annotated_image_store
+from monitoring.metrics import stage_timer
+
+# Annotation modes: skip drawing entirely, store for the binary image endpoint,
+# or embed a base64 JPEG in the response (legacy)
+ANNOTATE_NONE = 'none'
+ANNOTATE_URL = 'url'
+ANNOTATE_BASE64 = 'base64'
 
 class YOLOVideoProcessor:
     def __init__(self, model_name='yolov8s.pt', confidence_threshold=0.35):
         self.detector = YOLOParkingDetector(model_name, confidence_threshold)
         self.parking_spaces = PREDEFINED_PARKING_SPACES
+        self.layout = SpaceLayout.from_bbox_spaces(PREDEFINED_PARKING_SPACES)
     
-    def analyze_video_frame(self, video_path: str, frame_number: int = 0) -> Dict:
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            raise ValueError(f"Could not open video file: {video_path}")
+    def analyze_video_frame(self, video_path: str, frame_number: int = 0,
+                            annotate: str = ANNOTATE_NONE) -> Dict:
+        frame = self.read_frame(video_path, frame_number)
         
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-        ret, frame = cap.read()
-        cap.release()
+        return self.analyze_frame(frame, annotate)
+    
+    @staticmethod
+    def read_frame(video_path: str, frame_number: int = 0) -> np.ndarray:
+        with stage_timer('yolo_processor', 'decode'):
+            cap = cv2.VideoCapture(video_path)
+            
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video file: {video_path}")
+            
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            ret, frame = cap.read()
+            cap.release()
         
         if not ret:
             raise ValueError(f"Could not read frame {frame_number} from video")
         
-        temp_image_path = '/tmp/temp_frame.jpg'
-        cv2.imwrite(temp_image_path, frame)
-        
-        analysis_results = self.detector.analyze_parking_lot(temp_image_path, self.parking_spaces)
-        
-        annotated_image = self.detector.annotate_image(temp_image_path, analysis_results)
-        
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        annotated_base64 = base64.b64encode(buffer).decode('utf-8')
+        return frame
+    
+    def analyze_frame(self, frame: np.ndarray, annotate: str = ANNOTATE_NONE) -> Dict:
+        analysis_results = self.detector.analyze_frame(frame, self.layout)
         
-        return {
+        response = {
             'success': True,
             'car_count': len(analysis_results['detected_cars']),
             'parking_analysis': {
@@ -42,7 +56,6 @@ class YOLOVideoProcessor:
                 'occupied_spaces': len(analysis_results['occupied_spaces']),
                 'occupancy_rate': analysis_results['occupancy_rate']
             },
-            'annotated_image_base64': annotated_base64,
             'detection_method': 'YOLOv8 with COCO pretrained weights',
             'free_spaces': len(analysis_results['free_spaces']),
             'occupied_spaces': len(analysis_results['occupied_spaces']),
@@ -51,16 +64,18 @@ class YOLOVideoProcessor:
             'occupied_space_list': [s['id'] for s in analysis_results['occupied_spaces']],
             'partially_free_space_list': [s['id'] for s in analysis_results['partially_free_spaces']]
         }
-    
-    def analyze_image(self, image_path: str) -> Dict:
-        analysis_results = self.detector.analyze_parking_lot(image_path, self.parking_spaces)
         
-        annotated_image = self.detector.annotate_image(image_path, analysis_results)
+        response.update(self._annotation_fields(frame, analysis_results, annotate, 'annotated_image_base64'))
+        return response
+    
+    def analyze_image(self, image_path: str, annotate: str = ANNOTATE_NONE) -> Dict:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not load image from {image_path}")
         
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        annotated_base64 = base64.b64encode(buffer).decode('utf-8')
+        analysis_results = self.detector.analyze_frame(image, self.layout)
         
-        return {
+        response = {
             'success': True,
             'total_spaces': analysis_results['total_spaces'],
             'free_spaces': len(analysis_results['free_spaces']),
@@ -68,9 +83,36 @@ class YOLOVideoProcessor:
             'partially_free_spaces': len(analysis_results['partially_free_spaces']),
             'cars_detected': len(analysis_results['detected_cars']),
             'occupancy_rate': analysis_results['occupancy_rate'],
-            'annotated_image': annotated_base64,
             'detection_method': 'YOLO with COCO pretrained weights',
             'free_space_list': [s['id'] for s in analysis_results['free_spaces']],
             'occupied_space_list': [s['id'] for s in analysis_results['occupied_spaces']],
             'partially_free_space_list': [s['id'] for s in analysis_results['partially_free_spaces']]
         }
+        
+        response.update(self._annotation_fields(image, analysis_results, annotate, 'annotated_image'))
+        return response
+    
+    def _render_annotations(self, frame: np.ndarray, analysis_results: Dict) -> np.ndarray:
+        return self.detector.annotate_frame(frame, analysis_results, layout=self.layout)
+    
+    def _annotation_fields(self, frame: np.ndarray, analysis_results: Dict,
+                           annotate: str, base64_key: str) -> Dict:
+        """Annotation output for the requested mode; data-only requests draw nothing"""
+        if annotate == ANNOTATE_URL:
+            image_id = annotated_image_store.put(
+                frame, functools.partial(self._render_annotations, analysis_results=analysis_results)
+            )
+            return {
+                'annotated_image_id': image_id,
+                'annotated_image_url': f'/api/parking/annotated/{image_id}'
+            }
+        
+        if annotate == ANNOTATE_BASE64:
+            with stage_timer('yolo_processor', 'annotation'):
+                annotated_image = self.detector.annotate_frame(frame, analysis_results, layout=self.layout)
+            with stage_timer('yolo_processor', 'encode'):
+                _, buffer = cv2.imencode('.jpg', annotated_image)
+                encoded = base64.b64encode(buffer).decode('utf-8')
+            return {base64_key: encoded}
+        
+        return {}
@@ -0,0 +1,51 @@
+"""
+Realtime Event API Routes
+Server-Sent Events stream of lot occupancy updates and space transitions
+"""
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import queue
+from realtime.occupancy_broadcaster import occupancy_broadcaster
+
+events_bp = Blueprint('events', __name__)
+
+KEEPALIVE_SECONDS = 15
+
+@events_bp.route('/api/parking/events', methods=['GET'])
+def stream_parking_events():
+    """Push occupancy changes to the client instead of having it poll /api/parking/lots"""
+    lot_id = request.args.get('lot_id')
+    subscription = occupancy_broadcaster.subscribe(lot_id)
+    
+    def generate():
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield b'retry: 3000\n\n'
+            while True:
+                try:
+                    yield subscription.queue.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield b': keepalive\n\n'
+        finally:
+            occupancy_broadcaster.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@events_bp.route('/api/parking/events/stats', methods=['GET'])
+def get_event_stats():
+    """Number of connected event stream clients"""
+    try:
+        return jsonify({
+            'success': True,
+            'subscribers': occupancy_broadcaster.subscriber_count()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'Error getting event stats: {str(e)}'}), 500
@@ -0,0 +1,102 @@
+"""
+Background Job API Routes
+Submit long-running analyses, poll their progress and fetch results
+"""
+
+from flask import Blueprint, request, jsonify
+from jobs.job_queue import job_queue, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED
+from api.parking_analysis_routes import (
+    resolve_video_path, submit_video_analysis_job, ANNOTATION_MODES, ANNOTATE_NONE
+)
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/api/jobs/analyze-video', methods=['POST'])
+def submit_analyze_video_job():
+    """Queue a parking analysis of a video frame; returns a job id immediately"""
+    try:
+        data = request.get_json() or {}
+        video_filename = data.get('video_filename', 'parking_video.mp4')
+        frame_number = data.get('frame_number', 100)
+        
+        annotate = data.get('annotate', ANNOTATE_NONE)
+        if annotate not in ANNOTATION_MODES:
+            return jsonify({'error': f'Invalid annotate mode: {annotate}'}), 400
+        
+        video_path, error_response = resolve_video_path(video_filename)
+        if error_response:
+            return error_response
+        
+        return submit_video_analysis_job(video_path, frame_number, annotate)
+    
+    except Exception as e:
+        return jsonify({'error': f'Error submitting job: {str(e)}'}), 500
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List known jobs and queue statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'jobs': job_queue.list_jobs(),
+            'queue': job_queue.stats()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'Error listing jobs: {str(e)}'}), 500
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll job status and progress; includes the result once completed"""
+    try:
+        job = job_queue.get(job_id)
+        
+        if job is None:
+            return jsonify({'error': f'Job not found: {job_id}'}), 404
+        
+        return jsonify(dict(job.to_dict(include_result=True), success=True))
+    
+    except Exception as e:
+        return jsonify({'error': f'Error getting job status: {str(e)}'}), 500
+
+@jobs_bp.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Fetch the result of a finished job"""
+    try:
+        job = job_queue.get(job_id)
+        
+        if job is None:
+            return jsonify({'error': f'Job not found: {job_id}'}), 404
+        
+        status = job.to_dict()
+        
+        if job.status == JOB_COMPLETED:
+            return jsonify(job.result)
+        if job.status == JOB_FAILED:
+            return jsonify(dict(status, error=f'Analysis failed: {job.error}')), 500
+        if job.status == JOB_CANCELLED:
+            return jsonify(dict(status, error='Job was cancelled')), 410
+        
+        # Still queued or running
+        return jsonify(status), 202
+    
+    except Exception as e:
+        return jsonify({'error': f'Error getting job result: {str(e)}'}), 500
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+@jobs_bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        job = job_queue.get(job_id)
+        
+        if job is None:
+            return jsonify({'error': f'Job not found: {job_id}'}), 404
+        
+        if not job.cancel():
+            return jsonify(dict(job.to_dict(), error='Job already finished')), 409
+        
+        return jsonify(dict(job.to_dict(), success=True))
+    
+    except Exception as e:
+        return jsonify({'error': f'Error cancelling job: {str(e)}'}), 500
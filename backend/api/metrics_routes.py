@@ -0,0 +1,29 @@
+"""
+Metrics API Routes
+Prometheus scrape endpoint plus per-request latency accounting for every route
+"""
+
+import time
+from flask import Blueprint, Response, request, g
+from monitoring.metrics import metrics_registry, observe_request
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@metrics_bp.after_app_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Route templates, not raw paths, keep label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, endpoint, response.status_code,
+                        time.perf_counter() - started)
+    return response
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
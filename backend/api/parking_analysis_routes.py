@@ -3,16 +3,174 @@ Advanced Parking Analysis API Routes
 Combines video processing, car detection, and parking space mapping
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 import os
+import asyncio
 import cv2
 import base64
-from ai_detection.yolo_video_processor import YOLOVideoProcessor
+import zlib
+from ai_detection.yolo_video_processor import ANNOTATE_NONE, ANNOTATE_URL, ANNOTATE_BASE64
+from ai_detection.model_registry import model_registry
+from ai_detection.annotated_image_store import annotated_image_store, IMAGE_FORMATS
+from ai_detection.stream_ingestion import stream_registry
 from database.parking_database import parking_db
+from database.async_parking_database import async_parking_db, async_runner
+from jobs.job_queue import job_queue, QueueFullError
+from realtime.occupancy_broadcaster import occupancy_broadcaster, space_states_from_results
+from realtime.occupancy_snapshots import occupancy_snapshots
+from ai_detection.parking_mapper import ParkingMapper
+from ai_detection.layout_cache import layout_cache
+from monitoring.metrics import stage_timer
 import json
 
 parking_analysis_bp = Blueprint('parking_analysis', __name__)
 
+ANNOTATION_MODES = (ANNOTATE_NONE, ANNOTATE_URL, ANNOTATE_BASE64)
+
+# Longest a request may block waiting for a stream frame, in seconds
+MAX_STREAM_READ_TIMEOUT = 10.0
+
+# Saved as .json by default or .npz for very large layouts; one of them exists at a time
+PARKING_SPACES_CONFIG = 'uploads/parking_spaces_config'
+
+def record_analysis(results, frame_number, analysis_duration=0.0):
+    """Persist an analysis result against the Sheridan parking lot"""
+    try:
+        with stage_timer('pipeline', 'record'):
+            async_runner.run(record_analysis_async(results, frame_number, analysis_duration))
+    
+    except Exception as db_error:
+        print(f"Database operation failed: {db_error}")
+
+async def record_analysis_async(results, frame_number, analysis_duration=0.0):
+    """Persist an analysis on the async database layer, issuing independent writes concurrently"""
+    lot_name = "Sheridan College Parking Lot"
+    lot_location = "Sheridan College, Brampton, ON"
+    
+    lot = await async_parking_db.get_or_create_parking_lot(
+        name=lot_name,
+        location=lot_location,
+        total_spaces=results['parking_analysis']['total_spaces'],
+        coordinates={'lat': 43.65598098010094, 'lng': -79.73852435397006}
+    )
+    lot_id = lot['lot_id']
+    
+    analysis_log_data = {
+        'total_spaces': results['parking_analysis']['total_spaces'],
+        'occupied_spaces': results['parking_analysis']['occupied_spaces'],
+        'available_spaces': results['parking_analysis']['available_spaces'],
+        'detection_data': {
+            'method': 'YOLOv8 with COCO pretrained weights',
+            'confidence': 0.35,
+            'car_count': results['car_count'],
+            'analysis_duration': round(analysis_duration, 4),
+            'frame_analyzed': frame_number
+        }
+    }
+    
+    space_states = space_states_from_results(results)
+    
+    log_result, _ = await asyncio.gather(
+        async_parking_db.log_availability_analysis(lot_id, analysis_log_data),
+        async_parking_db.sync_spot_occupancy(lot_id, space_states, confidence=0.35)
+    )
+    print(f"Logged availability analysis: {log_result.get('log_id', 'unknown')}")
+    
+    lot_stats = lot_stats_from_status(await async_parking_db.get_lot_status(lot_id), {})
+    version, transitions = occupancy_snapshots.apply(lot_id, space_states, lot_stats)
+    occupancy_broadcaster.publish_analysis(lot_id, lot_stats, transitions, version)
+
+def lot_stats_from_status(status, lot):
+    """Build the stats block served for a lot from its lot_status entry"""
+    if status:
+        return {
+            'total_spaces': status.get('total_spaces', lot.get('total_spaces', 0)),
+            'occupied_spaces': status.get('occupied_spaces', 0),
+            'available_spaces': status.get('available_spaces', 0),
+            'occupancy_rate': status.get('occupancy_rate', 0),
+            'cars_detected': status.get('cars_detected', 0),
+            'last_updated': status['last_updated'].isoformat() if status.get('last_updated') else None
+        }
+    
+    return {
+        'total_spaces': lot.get('total_spaces', 0),
+        'occupied_spaces': 0,
+        'available_spaces': lot.get('total_spaces', 0),
+        'occupancy_rate': 0,
+        'cars_detected': 0,
+        'last_updated': None
+    }
+
+def not_modified(etag):
+    """304 response when the client's cached copy (If-None-Match) is still current"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return None
+
+def with_etag(response, etag):
+    """Attach an ETag and require clients to revalidate before reuse"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def resolve_video_path(video_filename):
+    """Validate an uploaded video name; returns (path, None) or (None, error response)"""
+    video_filename = os.path.basename(video_filename)
+    if not video_filename.endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
+        return None, (jsonify({'error': 'Invalid video file type'}), 400)
+    
+    video_path = os.path.join('uploads', video_filename)
+    
+    if not os.path.exists(video_path):
+        return None, (jsonify({'error': f'Video file not found: {video_filename}'}), 404)
+    
+    return video_path, None
+
+def run_video_analysis_job(job):
+    """Job handler: full video frame analysis with progress checkpoints"""
+    video_path = job.params['video_path']
+    frame_number = job.params.get('frame_number', 100)
+    annotate = job.params.get('annotate', ANNOTATE_NONE)
+    
+    job.update_progress(0.05, 'loading_model')
+    processor = model_registry.get_processor('yolov8s.pt', 0.35)
+    
+    job.update_progress(0.3, 'decoding_frame')
+    with stage_timer('pipeline', 'analysis') as timer:
+        frame = processor.read_frame(video_path, frame_number)
+        
+        job.update_progress(0.4, 'detecting')
+        results = processor.analyze_frame(frame, annotate)
+    
+    job.update_progress(0.9, 'saving')
+    record_analysis(results, frame_number, timer.seconds)
+    
+    return results
+
+job_queue.register('analyze_video', run_video_analysis_job)
+
+def submit_video_analysis_job(video_path, frame_number, annotate=ANNOTATE_NONE):
+    """Queue a video analysis and return 202 with polling URLs"""
+    try:
+        job = job_queue.submit('analyze_video', {
+            'video_path': video_path,
+            'frame_number': frame_number,
+            'annotate': annotate
+        })
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.job_id}',
+        'result_url': f'/api/jobs/{job.job_id}/result'
+    }), 202
+
 @parking_analysis_bp.route('/api/parking/analyze-video', methods=['POST'])
 def analyze_parking_video():
     """Complete parking analysis using YOLO detector with COCO pretrained weights"""
@@ -21,82 +179,145 @@ def analyze_parking_video():
         video_filename = data.get('video_filename', 'parking_video.mp4')
         frame_number = data.get('frame_number', 100)
         
-        video_filename = os.path.basename(video_filename)
-        if not video_filename.endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
-            return jsonify({'error': 'Invalid video file type'}), 400
+        annotate = data.get('annotate', ANNOTATE_NONE)
+        if annotate not in ANNOTATION_MODES:
+            return jsonify({'error': f'Invalid annotate mode: {annotate}'}), 400
         
-        video_path = os.path.join('uploads', video_filename)
+        video_path, error_response = resolve_video_path(video_filename)
+        if error_response:
+            return error_response
         
-        if not os.path.exists(video_path):
-            return jsonify({'error': f'Video file not found: {video_filename}'}), 404
+        if data.get('async'):
+            return submit_video_analysis_job(video_path, frame_number, annotate)
         
-        processor = YOLOVideoProcessor(model_name='yolov8s.pt', confidence_threshold=0.35)
+        processor = model_registry.get_processor('yolov8s.pt', 0.35)
         
-        results = processor.analyze_video_frame(video_path, frame_number)
+        with stage_timer('pipeline', 'analysis') as timer:
+            results = processor.analyze_video_frame(video_path, frame_number, annotate)
         
-        try:
-            lot_name = "Sheridan College Parking Lot"
-            lot_location = "Sheridan College, Brampton, ON"
-            
-            existing_lots = parking_db.get_all_parking_lots()
-            lot_id = None
-            
-            for lot in existing_lots:
-                if lot['name'] == lot_name:
-                    lot_id = lot['lot_id']
-                    break
-            
-            if not lot_id:
-                lot_data = parking_db.create_parking_lot(
-                    name=lot_name,
-                    location=lot_location,
-                    total_spaces=results['parking_analysis']['total_spaces'],
-                    coordinates={'lat': 43.65598098010094, 'lng': -79.73852435397006}
-                )
-                lot_id = lot_data['lot_id']
-                print(f"Created new parking lot: {lot_id}")
-            
-            analysis_log_data = {
-                'total_spaces': results['parking_analysis']['total_spaces'],
-                'occupied_spaces': results['parking_analysis']['occupied_spaces'],
-                'available_spaces': results['parking_analysis']['available_spaces'],
-                'detection_data': {
-                    'method': 'YOLOv8 with COCO pretrained weights',
-                    'confidence': 0.35,
-                    'car_count': results['car_count'],
-                    'analysis_duration': 0,
-                    'frame_analyzed': frame_number
-                }
-            }
-            
-            log_result = parking_db.log_availability_analysis(lot_id, analysis_log_data)
-            print(f"Logged availability analysis: {log_result.get('log_id', 'unknown')}")
-            
-        except Exception as db_error:
-            print(f"Database operation failed: {db_error}")
+        record_analysis(results, frame_number, timer.seconds)
         
         return jsonify(results)
         
     except Exception as e:
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+@parking_analysis_bp.route('/api/parking/analyze-stream', methods=['POST'])
+def analyze_parking_stream():
+    """Run parking analysis on the newest frame of an open live stream"""
+    try:
+        data = request.get_json() or {}
+        stream_id = data.get('stream_id')
+        annotate = data.get('annotate', ANNOTATE_NONE)
+        if annotate not in ANNOTATION_MODES:
+            return jsonify({'error': f'Invalid annotate mode: {annotate}'}), 400
+        
+        try:
+            timeout = min(MAX_STREAM_READ_TIMEOUT, max(0.0, float(data.get('timeout', 5.0))))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'timeout must be a number of seconds'}), 400
+        
+        stream = stream_registry.get(stream_id) if stream_id else None
+        if stream is None:
+            return jsonify({'error': f'Stream not found: {stream_id}'}), 404
+        
+        ret, frame, frame_info = stream.read(timeout=timeout)
+        if not ret:
+            return jsonify({'error': 'No frame available from stream', 'stream': stream.stats()}), 503
+        
+        processor = model_registry.get_processor('yolov8s.pt', 0.35)
+        
+        with stage_timer('pipeline', 'analysis') as timer:
+            results = processor.analyze_frame(frame, annotate)
+        results['stream'] = dict(frame_info, stream_id=stream_id,
+                                 frames_dropped=stream.frames_dropped)
+        
+        record_analysis(results, frame_info['frame_id'], timer.seconds)
+        
+        return jsonify(results)
+    
+    except Exception as e:
+        return jsonify({'error': f'Stream analysis failed: {str(e)}'}), 500
+
+@parking_analysis_bp.route('/api/parking/annotated/<image_id>', methods=['GET'])
+def get_annotated_image(image_id):
+    """Serve an annotated analysis image; supports ?format=jpeg|webp|png&width=<px>&quality=<1-100>"""
+    try:
+        image_format = request.args.get('format', 'jpeg').lower()
+        if image_format == 'jpg':
+            image_format = 'jpeg'
+        if image_format not in IMAGE_FORMATS:
+            return jsonify({'error': f'Unsupported image format: {image_format}'}), 400
+        
+        max_width = request.args.get('width', type=int)
+        if max_width is not None and max_width <= 0:
+            return jsonify({'error': 'width must be a positive integer'}), 400
+        quality = min(100, max(1, request.args.get('quality', 85, type=int)))
+        
+        etag = f'{image_id}-{image_format}-{max_width or 0}-{quality}'
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        image = annotated_image_store.get_image(image_id, image_format, max_width, quality)
+        if image is None:
+            return jsonify({'error': f'Annotated image not found or expired: {image_id}'}), 404
+        
+        data, mimetype = image
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(etag)
+        # Image ids are never reused, so the content behind a URL never changes
+        response.headers['Cache-Control'] = f'private, max-age={annotated_image_store.ttl_seconds}, immutable'
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': f'Error rendering annotated image: {str(e)}'}), 500
+
 @parking_analysis_bp.route('/api/parking/spaces', methods=['GET'])
 def get_parking_spaces():
-    """Get parking space configuration"""
+    """Get parking space configuration, or with ?since=<version> only the spaces that changed"""
     try:
-        mapper = ParkingMapper()
-        config_path = 'uploads/parking_spaces_config.json'
+        config_path = layout_cache.find(PARKING_SPACES_CONFIG)
+        lot_id = request.args.get('lot_id')
+        since = request.args.get('since', type=int)
         
-        if mapper.load_parking_spaces(config_path):
-            return jsonify({
+        if config_path is None:
+            return jsonify({'error': 'No parking configuration found'}), 404
+        
+        config_stat = os.stat(config_path)
+        etag = occupancy_snapshots.etag(
+            'spaces', config_stat.st_mtime_ns, config_stat.st_size,
+            lot_id or '', since if since is not None else ''
+        )
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        if lot_id and since is not None:
+            delta = occupancy_snapshots.delta(lot_id, since)
+            return with_etag(jsonify(dict(delta, success=True)), etag)
+        
+        # Parsed once and reused until the file changes
+        layout = layout_cache.get(config_path)
+        
+        if layout is not None:
+            response = {
                 'success': True,
-                'total_spaces': len(mapper.parking_spaces),
+                'total_spaces': len(layout),
                 'video_dimensions': {
-                    'width': mapper.video_width,
-                    'height': mapper.video_height
+                    'width': layout.width or 1280,
+                    'height': layout.height or 720
                 },
-                'parking_spaces': mapper.parking_spaces
-            })
+                'parking_spaces': layout.to_xywh_spaces()
+            }
+            if lot_id:
+                snapshot = occupancy_snapshots.get(lot_id)
+                response['occupancy'] = {
+                    'version': snapshot.version if snapshot else 0,
+                    'space_states': snapshot.space_states() if snapshot else {}
+                }
+            return with_etag(jsonify(response), etag)
         else:
             return jsonify({'error': 'No parking configuration found'}), 404
             
@@ -110,12 +331,20 @@ def create_parking_spaces():
         data = request.get_json()
         width = data.get('width', 1280)
         height = data.get('height', 720)
+        layout_format = data.get('format', 'json')
+        if layout_format not in ('json', 'npz'):
+            return jsonify({'error': f'Invalid layout format: {layout_format}'}), 400
         
         mapper = ParkingMapper()
         spaces = mapper.define_parking_spaces_manual(width, height)
         
-        config_path = 'uploads/parking_spaces_config.json'
+        config_path = f'{PARKING_SPACES_CONFIG}.{layout_format}'
         if mapper.save_parking_spaces(config_path):
+            # Drop the other format so readers never pick up a stale layout
+            for stale_path in (f'{PARKING_SPACES_CONFIG}.json', f'{PARKING_SPACES_CONFIG}.npz'):
+                if stale_path != config_path and os.path.exists(stale_path):
+                    os.remove(stale_path)
+                    layout_cache.invalidate(stale_path)
             return jsonify({
                 'success': True,
                 'total_spaces': len(spaces),
@@ -142,31 +371,21 @@ def get_parking_lots_with_stats():
     """Get all parking lots with their latest detection statistics"""
     try:
         lots = parking_db.get_all_parking_lots()
+        lot_ids = [lot['lot_id'] for lot in lots]
+        statuses = parking_db.get_lot_statuses(lot_ids)
+        
+        # Statuses refresh from the shared collection, so writes by other workers
+        # (and new lots) must change the tag as well as this process's snapshots
+        etag = occupancy_snapshots.etag('lots', parking_db.lot_status_version(),
+                                        zlib.crc32(','.join(sorted(lot_ids)).encode()))
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
         lots_with_stats = []
         for lot in lots:
-            recent_logs = parking_db.get_recent_availability(lot['lot_id'], hours=24)
-            
-            latest_stats = None
-            if recent_logs and len(recent_logs) > 0:
-                latest_log = recent_logs[0]
-                latest_stats = {
-                    'total_spaces': latest_log.get('total_spaces', lot.get('total_spaces', 0)),
-                    'occupied_spaces': latest_log.get('occupied_spaces', 0),
-                    'available_spaces': latest_log.get('available_spaces', 0),
-                    'occupancy_rate': latest_log.get('occupancy_rate', 0),
-                    'cars_detected': latest_log.get('detection_data', {}).get('car_count', 0),
-                    'last_updated': latest_log.get('timestamp', '').isoformat() if latest_log.get('timestamp') else None
-                }
-            else:
-                latest_stats = {
-                    'total_spaces': lot.get('total_spaces', 0),
-                    'occupied_spaces': 0,
-                    'available_spaces': lot.get('total_spaces', 0),
-                    'occupancy_rate': 0,
-                    'cars_detected': 0,
-                    'last_updated': None
-                }
+            latest_stats = lot_stats_from_status(statuses.get(lot['lot_id']), lot)
+            latest_stats['version'] = occupancy_snapshots.version(lot['lot_id'])
             
             lot_data = {
                 'lot_id': lot['lot_id'],
@@ -177,10 +396,10 @@ def get_parking_lots_with_stats():
             }
             lots_with_stats.append(lot_data)
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'parking_lots': lots_with_stats
-        })
+        }), etag)
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch parking lots: {str(e)}'}), 500
\ No newline at end of file
@@ -137,8 +137,9 @@ def define_parking_spots():
         lot_id = data.get('lot_id', 'default')
         spots = data['spots']
         
-        # Save spot definitions (in production, this would go to a database)
-        detector.save_spot_definitions(lot_id, spots)
+        # Save spot definitions (in production, this would go to a database);
+        # large layouts can be stored in the compact binary format
+        detector.save_spot_definitions(lot_id, spots, binary=data.get('format') == 'npz')
         
         return jsonify({
             'success': True,
@@ -9,6 +9,7 @@ import cv2
 from werkzeug.utils import secure_filename
 from ai_detection.video_processor import VideoProcessor
 from ai_detection.parking_detector import ParkingDetector
+from ai_detection.stream_ingestion import stream_registry
 import json
 
 video_bp = Blueprint('video', __name__)
@@ -224,4 +225,78 @@ def upload_video():
             return jsonify({'error': 'Invalid file type. Allowed: mp4, avi, mov, mkv, flv'}), 400
             
     except Exception as e:
-        return jsonify({'error': f'Error uploading video: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Error uploading video: {str(e)}'}), 500
+
+@video_bp.route('/api/video/stream/open', methods=['POST'])
+def open_stream():
+    """Open a live stream (camera URL or uploaded video played in real time)"""
+    try:
+        data = request.get_json() or {}
+        source = data.get('source')
+        
+        if not source:
+            return jsonify({'error': 'No stream source provided'}), 400
+        
+        if '://' not in source:
+            # Local sources are restricted to uploaded videos
+            source = os.path.basename(source)
+            if not allowed_file(source):
+                return jsonify({'error': 'Invalid video file type'}), 400
+            source = os.path.join(UPLOAD_FOLDER, source)
+            if not os.path.exists(source):
+                return jsonify({'error': f'Video file not found: {os.path.basename(source)}'}), 404
+        
+        result = stream_registry.open(source, data.get('stream_id'), data.get('realtime'))
+        
+        if not result.get('success'):
+            return jsonify(result), 400
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({'error': f'Error opening stream: {str(e)}'}), 500
+
+@video_bp.route('/api/video/stream/status', methods=['GET'])
+def list_streams():
+    """Get ingestion statistics for all open streams"""
+    try:
+        return jsonify({
+            'success': True,
+            'streams': stream_registry.list_streams()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'Error listing streams: {str(e)}'}), 500
+
+@video_bp.route('/api/video/stream/<stream_id>/status', methods=['GET'])
+def get_stream_status(stream_id):
+    """Get ingestion statistics (decoded, consumed and dropped frames) for a stream"""
+    try:
+        stream = stream_registry.get(stream_id)
+        
+        if stream is None:
+            return jsonify({'error': f'Stream not found: {stream_id}'}), 404
+        
+        return jsonify({
+            'success': True,
+            'stream_id': stream_id,
+            'stats': stream.stats()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'Error getting stream status: {str(e)}'}), 500
+
+@video_bp.route('/api/video/stream/<stream_id>/close', methods=['POST'])
+def close_stream(stream_id):
+    """Stop a live stream and release its capture"""
+    try:
+        if not stream_registry.close(stream_id):
+            return jsonify({'error': f'Stream not found: {stream_id}'}), 404
+        
+        return jsonify({
+            'success': True,
+            'stream_id': stream_id
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'Error closing stream: {str(e)}'}), 500
\ No newline at end of file
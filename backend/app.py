@@ -7,6 +7,13 @@ from dotenv import load_dotenv
 from api.parking_routes import parking_bp
 from api.video_routes import video_bp
 from api.parking_analysis_routes import parking_analysis_bp
+from api.job_routes import jobs_bp
+from api.event_routes import events_bp
+from api.metrics_routes import metrics_bp
+from database.parking_database import parking_db
+from database.mongodb_config import mongodb_manager
+from ai_detection.model_registry import model_registry
+from monitoring.profiler import install_profiler
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +35,15 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 app.register_blueprint(parking_bp, url_prefix='/api')
 app.register_blueprint(video_bp)
 app.register_blueprint(parking_analysis_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(events_bp)
+app.register_blueprint(metrics_bp)
+
+# Per-request profiling on X-Profile / ?profile=1; a no-op unless PROFILING_ENABLED is set
+install_profiler(app)
+
+# Preload detection models in the background when WARMUP_MODELS lists any (detection workers)
+model_registry.start_warm_up()
 
 @app.route('/')
 def health_check():
@@ -41,7 +57,11 @@ def health_check():
 def api_health():
     return jsonify({
         'status': 'healthy',
-        'ai_detection': 'ready',
+        'ready': model_registry.is_ready(),
+        'ai_detection': model_registry.status(),
+        'database': mongodb_manager.status(),
+        'write_behind': parking_db.write_behind_stats(),
+        'in_memory_store': mongodb_manager.in_memory_stats(),
         'endpoints': [
             '/api/detect-parking',
             '/api/parking-status',
@@ -51,11 +71,27 @@ def api_health():
             '/api/video/detect-cars',
             '/api/video/test',
             '/api/parking/analyze-video',
+            '/api/parking/analyze-stream',
+            '/api/parking/annotated/<image_id>',
+            '/api/video/stream/open',
+            '/api/video/stream/status',
             '/api/parking/spaces',
-            '/api/parking/spaces/create'
+            '/api/parking/spaces/create',
+            '/api/jobs/analyze-video',
+            '/api/jobs/<job_id>',
+            '/api/jobs/<job_id>/result',
+            '/api/parking/events',
+            '/api/ready',
+            '/metrics'
         ]
     })
 
+@app.route('/api/ready')
+def api_ready():
+    """Readiness probe: 503 until the configured models are loaded and warmed up"""
+    models = model_registry.status()
+    return jsonify({'ready': models['ready'], 'ai_detection': models}), 200 if models['ready'] else 503
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1 @@
+# Benchmarks package for Sheridan Spot Smart
\ No newline at end of file
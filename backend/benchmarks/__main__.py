@@ -0,0 +1,77 @@
+"""
+Benchmark Command Line
+Run from backend/:
+    
+    python -m benchmarks                         # run all, compare with baseline.json
+    python -m benchmarks -k overlap              # only cases whose name contains "overlap"
+    python -m benchmarks --save-baseline         # record the current numbers as the baseline
+
+Exits with status 1 when any case regressed beyond the threshold.
+
+The committed baseline.json was recorded on a single-CPU build machine; run
+--save-baseline on the CI host first, or the regression gate compares against
+unrelated hardware
+"""
+import argparse
+import sys
+from .runner import (
+    DEFAULT_BASELINE, STATUS_REGRESSION, compare, load_report, run_benchmarks, save_report
+)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Detection and occupancy hot-path benchmarks')
+    parser.add_argument('-k', '--filter', help='only run cases whose name contains this string')
+    parser.add_argument('-o', '--output', default='benchmarks/results/latest.json',
+                        help='where to write the JSON results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to the baseline file instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown of the fastest sample that counts as a regression')
+    parser.add_argument('--repeat', type=int, default=7, help='timed samples per case')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='minimum seconds per sample; sets the loop count')
+    args = parser.parse_args(argv)
+    
+    report = run_benchmarks(args.filter, args.repeat, args.min_time)
+    
+    if args.save_baseline:
+        save_report(report, args.baseline)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    
+    baseline = load_report(args.baseline)
+    if baseline is not None:
+        report['baseline'] = {
+            'path': args.baseline,
+            'created_at': baseline.get('created_at'),
+            'environment': baseline.get('environment'),
+            'threshold': args.threshold
+        }
+        report['comparison'] = compare(report, baseline, args.threshold)
+    
+    save_report(report, args.output)
+    print(f"\nResults written to {args.output}")
+    
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    
+    if baseline.get('environment') != report['environment']:
+        print("Note: baseline was recorded in a different environment; ratios are indicative only")
+    
+    print(f"\n{'case':<40} {'baseline':>10} {'current':>10} {'ratio':>7}  status")
+    for item in report['comparison']:
+        baseline_ms = f"{item['baseline_ms']:.3f}" if item['baseline_ms'] is not None else '-'
+        ratio = f"{item['ratio']:.2f}" if item['ratio'] is not None else '-'
+        print(f"{item['name']:<40} {baseline_ms:>10} {item['min_ms']:>10.3f} {ratio:>7}  {item['status']}")
+    
+    regressions = [item['name'] for item in report['comparison'] if item['status'] == STATUS_REGRESSION]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Benchmark Cases
+Hot paths of detection, spot analysis, overlap scoring, annotation and image
+encoding. Each case is a setup function returning the zero-argument callable
+that gets timed; everything the setup does is excluded from the measurement
+"""
+import base64
+import cv2
+import numpy as np
+from typing import Callable, Dict, List
+from ai_detection.video_processor import VideoProcessor
+from ai_detection.parking_detector import ParkingDetector, SPOT_OVERLAY
+from ai_detection.yolo_detector import YOLOParkingDetector
+from ai_detection.parking_spaces_config import PREDEFINED_PARKING_SPACES
+from ai_detection.space_layout import SpaceLayout, xywh_to_xyxy
+from . import fixtures
+
+class Benchmark:
+    """A named case; ``setup()`` returns the callable to time"""
+    
+    def __init__(self, name: str, setup: Callable[[], Callable[[], object]], description: str = ''):
+        self.name = name
+        self.setup = setup
+        self.description = description
+
+BENCHMARKS: List[Benchmark] = []
+
+def benchmark(name: str):
+    """Register a setup function as benchmark ``name``"""
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, setup, (setup.__doc__ or '').strip()))
+        return setup
+    return decorator
+
+class FixtureDetector(YOLOParkingDetector):
+    """YOLOParkingDetector with fixed detections, so overlap and annotation run without a model"""
+    
+    def __init__(self, detected_cars: List[Dict], confidence_threshold: float = 0.35):
+        self.confidence_threshold = confidence_threshold
+        self.detected_cars = detected_cars
+    
+    def detect_cars(self, image):
+        return self.detected_cars
+
+def fixture_cars(frame: np.ndarray, layout: SpaceLayout, minimum: int = 12) -> List[Dict]:
+    """Cars found by the OpenCV detector, topped up with offset copies of spaces"""
+    cars = [{'bbox': xywh_to_xyxy([car['bbox']])[0].astype(int).tolist(),
+             'confidence': float(car['confidence']), 'class': 'car'}
+            for car in VideoProcessor().detect_cars_advanced(frame)]
+    
+    # Deterministic partial overlaps so every status bucket is exercised
+    for x1, y1, x2, y2 in layout.boxes[:max(0, minimum - len(cars))].tolist():
+        shift = (x2 - x1) // 3
+        cars.append({'bbox': [int(x1 + shift), int(y1), int(x2 + shift), int(y2)],
+                     'confidence': 0.8, 'class': 'car'})
+    return cars
+
+def _analysis_fixture():
+    frame = fixtures.video_frame(fixtures.DAY_CLIP, size=fixtures.ANALYSIS_SIZE)
+    layout = SpaceLayout.from_bbox_spaces(PREDEFINED_PARKING_SPACES)
+    detector = FixtureDetector(fixture_cars(frame, layout))
+    return frame, layout, detector
+
+# ============ DETECTION ============
+
+@benchmark('detection.detect_cars_advanced.day')
+def bench_detect_cars_advanced_day():
+    """VideoProcessor.detect_cars_advanced on a 480x360 daytime frame"""
+    processor = VideoProcessor()
+    frame = fixtures.video_frame(fixtures.DAY_CLIP)
+    return lambda: processor.detect_cars_advanced(frame)
+
+@benchmark('detection.detect_cars_advanced.night')
+def bench_detect_cars_advanced_night():
+    """VideoProcessor.detect_cars_advanced on a 720x1280 night frame"""
+    processor = VideoProcessor()
+    frame = fixtures.video_frame(fixtures.NIGHT_CLIP)
+    return lambda: processor.detect_cars_advanced(frame)
+
+@benchmark('detection.detect_cars_mog2')
+def bench_detect_cars_mog2():
+    """VideoProcessor.detect_cars_mog2, one frame per call against a primed background model"""
+    processor = VideoProcessor()
+    frames = fixtures.video_frames(fixtures.DAY_CLIP)
+    
+    _, subtractor = processor.detect_cars_mog2(frames[0])
+    for frame in frames[1:]:
+        _, subtractor = processor.detect_cars_mog2(frame, subtractor)
+    
+    state = {'index': 0}
+    def run():
+        state['index'] = (state['index'] + 1) % len(frames)
+        return processor.detect_cars_mog2(frames[state['index']], subtractor)
+    return run
+
+# ============ SPOT ANALYSIS ============
+
+@benchmark('spots.analyze_spots')
+def bench_analyze_spots():
+    """ParkingDetector._analyze_spots over the default 614x408 lot layout"""
+    detector = ParkingDetector()
+    image = fixtures.still()
+    layout = detector._get_default_layout()
+    return lambda: detector._analyze_spots(image, layout)
+
+@benchmark('spots.yolo_analyze_frame')
+def bench_yolo_analyze_frame():
+    """YOLOParkingDetector.analyze_frame without inference: overlap scoring and bucketing"""
+    frame, layout, detector = _analysis_fixture()
+    return lambda: detector.analyze_frame(frame, layout)
+
+# ============ OVERLAP / IOU ============
+
+@benchmark('overlap.layout_iou')
+def bench_layout_iou():
+    """Best IoU per space against every detected car (SpaceLayout.iou)"""
+    frame, layout, detector = _analysis_fixture()
+    return lambda: detector._calculate_max_overlap_with_cars(layout, detector.detected_cars, frame.shape[:2])
+
+@benchmark('overlap.pairwise_overlap')
+def bench_pairwise_overlap():
+    """VideoProcessor._calculate_overlap over every pair of detections (duplicate filtering)"""
+    processor = VideoProcessor()
+    _, _, detector = _analysis_fixture()
+    boxes = [[x1, y1, x2 - x1, y2 - y1] for x1, y1, x2, y2 in (car['bbox'] for car in detector.detected_cars)]
+    
+    def run():
+        return [processor._calculate_overlap(a, b) for i, a in enumerate(boxes) for b in boxes[i + 1:]]
+    return run
+
+# ============ ANNOTATION ============
+
+@benchmark('annotation.yolo_annotate_frame')
+def bench_yolo_annotate_frame():
+    """YOLOParkingDetector.annotate_frame on a 1280x720 frame (cached overlay layers)"""
+    frame, layout, detector = _analysis_fixture()
+    results = detector.analyze_frame(frame, layout)
+    return lambda: detector.annotate_frame(frame, results, layout=layout)
+
+@benchmark('annotation.spot_overlay')
+def bench_spot_overlay():
+    """ParkingDetector spot overlay, as drawn by create_annotated_image"""
+    detector = ParkingDetector()
+    image = fixtures.still()
+    results = detector._analyze_spots(image, detector._get_default_layout())
+    
+    states = {spot['id']: 'occupied' if spot['occupied'] else 'free' for spot in results['spots']}
+    spots = []
+    for spot in results['spots']:
+        x, y, w, h = spot['coordinates']
+        spots.append((spot['id'], (x, y, x + w, y + h), str(spot['id'])))
+    
+    return lambda: SPOT_OVERLAY.render(image, spots, states)
+
+# ============ ENCODING ============
+
+def _annotated_fixture():
+    frame, layout, detector = _analysis_fixture()
+    return detector.annotate_frame(frame, detector.analyze_frame(frame, layout), layout=layout)
+
+@benchmark('encode.jpeg')
+def bench_encode_jpeg():
+    """cv2.imencode of an annotated 1280x720 frame as JPEG at quality 85"""
+    image = _annotated_fixture()
+    params = [cv2.IMWRITE_JPEG_QUALITY, 85]
+    return lambda: cv2.imencode('.jpg', image, params)
+
+@benchmark('encode.base64_jpeg')
+def bench_encode_base64_jpeg():
+    """Legacy annotate=base64 response body: default-quality JPEG then base64"""
+    image = _annotated_fixture()
+    
+    def run():
+        _, buffer = cv2.imencode('.jpg', image)
+        return base64.b64encode(buffer).decode('utf-8')
+    return run
@@ -0,0 +1,365 @@
+"""
+HTTP Load Test
+Replays a weighted mix of API requests at a fixed concurrency and reports
+throughput, latency percentiles and error rates. By default the Flask app is
+started in-process on the in-memory store with a stub detector, so results
+measure the service itself; pass --target to load an existing deployment.
+Run from backend/:
+    
+    python -m benchmarks.load_test --duration 30 --concurrency 8
+    python -m benchmarks.load_test --mix analyze-video=1,lots=4 --detector-latency-ms 40
+    python -m benchmarks.load_test --target http://staging:8000 --requests 2000
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from . import fixtures
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fixture copies placed in the in-process server's uploads folder
+CLIP_NAME = 'loadtest_clip.mp4'
+STILL_NAME = 'loadtest_lot.png'
+
+STUB_MODEL = 'yolov8s.pt'
+
+class Scenario:
+    """One kind of request in the mix"""
+    
+    def __init__(self, name: str, method: str, path: str, body=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+    
+    def request(self, rng: random.Random) -> Tuple[str, str, Optional[bytes]]:
+        body = self.body(rng) if callable(self.body) else self.body
+        return self.method, self.path, json.dumps(body).encode() if body is not None else None
+
+SCENARIOS = {
+    'analyze-video': Scenario(
+        'analyze-video', 'POST', '/api/parking/analyze-video',
+        lambda rng: {'video_filename': CLIP_NAME, 'frame_number': rng.randrange(0, 300, 15)}
+    ),
+    'detect-parking': Scenario(
+        'detect-parking', 'POST', '/api/detect-parking', {'image_path': STILL_NAME}
+    ),
+    'lots': Scenario('lots', 'GET', '/api/parking/lots')
+}
+
+DEFAULT_MIX = 'analyze-video=1,detect-parking=1,lots=8'
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+# ============ STUB DETECTOR ============
+
+class _Tensor(np.ndarray):
+    """ndarray with the .cpu()/.numpy() calls the detector makes on torch tensors"""
+    
+    def cpu(self):
+        return self
+    
+    def numpy(self):
+        return np.asarray(self)
+
+def _tensor(values) -> _Tensor:
+    return np.asarray(values).view(_Tensor)
+
+class _StubBox:
+    def __init__(self, xyxy, confidence: float, class_id: int):
+        self.xyxy = _tensor([xyxy])
+        self.conf = _tensor([confidence])
+        self.cls = _tensor([class_id])
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+class StubYOLO:
+    """
+    Stand-in for an ultralytics model: returns a fixed set of car boxes
+    (partly overlapping the predefined spaces) after an optional delay that
+    simulates inference time.
+    """
+    
+    names = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+    
+    def __init__(self, latency_ms: float = 0.0, cars: int = 14):
+        from ai_detection.parking_spaces_config import PREDEFINED_PARKING_SPACES
+        self.latency = latency_ms / 1000.0
+        self.boxes = []
+        for space in PREDEFINED_PARKING_SPACES[:cars]:
+            x1, y1, x2, y2 = space['bbox']
+            shift = (x2 - x1) // 3 * (len(self.boxes) % 3)
+            self.boxes.append(([x1 + shift, y1, x2 + shift, y2], 0.8))
+    
+    def __call__(self, image, conf: float = 0.25, verbose: bool = False):
+        if self.latency:
+            time.sleep(self.latency)
+        return [_StubResult([_StubBox(xyxy, confidence, 2) for xyxy, confidence in self.boxes
+                             if confidence >= conf])]
+
+# ============ IN-PROCESS SERVER ============
+
+def start_local_server(detector_latency_ms: float):
+    """
+    Import and serve the app from a scratch directory holding the fixtures,
+    with MongoDB pointed at a closed port so the in-memory store is used.
+    Returns (base url, server, work dir).
+    """
+    work_dir = tempfile.mkdtemp(prefix='loadtest-')
+    uploads = os.path.join(work_dir, 'uploads')
+    os.makedirs(uploads)
+    shutil.copyfile(fixtures.asset_path(fixtures.DAY_CLIP), os.path.join(uploads, CLIP_NAME))
+    shutil.copyfile(fixtures.asset_path(fixtures.LOT_STILL), os.path.join(uploads, STILL_NAME))
+    
+    os.environ.update({
+        'MONGODB_URI': 'mongodb://127.0.0.1:9/',
+        'MONGODB_TIMEOUT_MS': '100',
+        'MONGODB_RETRY_MIN': '3600',
+        'MONGODB_RETRY_MAX': '3600',
+        'WARMUP_MODELS': STUB_MODEL
+    })
+    os.environ.pop('IN_MEMORY_DATA_DIR', None)
+    os.environ.pop('PROFILING_ENABLED', None)
+    
+    os.chdir(work_dir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    
+    # Registered before the app starts its warm-up, so ultralytics is never imported
+    from ai_detection.model_registry import model_registry
+    model_registry.register_model(STUB_MODEL, StubYOLO(detector_latency_ms))
+    
+    # The closed MongoDB port is expected; request logs would swamp the report
+    logging.getLogger('database.mongodb_config').setLevel(logging.CRITICAL)
+    
+    from werkzeug.serving import make_server
+    from app import app
+    
+    # After the import, which configures logging
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name='loadtest-server').start()
+    return f'http://127.0.0.1:{server.server_port}', server, work_dir
+
+# ============ LOAD GENERATOR ============
+
+class LoadResult:
+    """Latencies and outcomes collected by the workers"""
+    
+    def __init__(self):
+        self.samples = {name: [] for name in SCENARIOS}
+        self.statuses = {name: {} for name in SCENARIOS}
+        self.errors = {name: 0 for name in SCENARIOS}
+        self._lock = threading.Lock()
+    
+    def record(self, scenario: str, seconds: float, status):
+        with self._lock:
+            self.samples[scenario].append(seconds)
+            self.statuses[scenario][str(status)] = self.statuses[scenario].get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[scenario] += 1
+
+def _send(host: str, port: int, method: str, path: str, body: Optional[bytes],
+          timeout: float) -> int:
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def run_load(base_url: str, weights: Dict[str, float], concurrency: int,
+             duration: Optional[float], total_requests: Optional[int],
+             timeout: float = 60.0, seed: int = 0) -> Tuple[LoadResult, float]:
+    """Closed-loop load: each worker sends its next request as soon as the last returns"""
+    target = urlsplit(base_url)
+    host, port = target.hostname, target.port or 80
+    names = list(weights)
+    cumulative = np.cumsum([weights[name] for name in names]).tolist()
+    
+    result = LoadResult()
+    issued = {'count': 0}
+    issued_lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    
+    def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if total_requests is not None:
+                with issued_lock:
+                    if issued['count'] >= total_requests:
+                        return
+                    issued['count'] += 1
+            
+            scenario = SCENARIOS[rng.choices(names, cum_weights=cumulative)[0]]
+            method, path, body = scenario.request(rng)
+            request_started = time.perf_counter()
+            try:
+                status = _send(host, port, method, path, body, timeout)
+            except Exception as e:
+                status = type(e).__name__
+            result.record(scenario.name, time.perf_counter() - request_started, status)
+    
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True, name=f'loadtest-worker-{i}')
+               for i in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    
+    return result, time.perf_counter() - started
+
+# ============ REPORT ============
+
+def _latency_stats(samples: List[float]) -> Dict:
+    if not samples:
+        return {'p50_ms': None, 'p90_ms': None, 'p99_ms': None, 'mean_ms': None, 'max_ms': None}
+    latencies = np.asarray(samples) * 1000
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        'p50_ms': round(float(p50), 3),
+        'p90_ms': round(float(p90), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'max_ms': round(float(latencies.max()), 3)
+    }
+
+def build_report(result: LoadResult, elapsed: float, config: Dict) -> Dict:
+    scenarios = {}
+    for name, samples in result.samples.items():
+        if not samples:
+            continue
+        scenarios[name] = dict(
+            requests=len(samples),
+            errors=result.errors[name],
+            error_rate=round(result.errors[name] / len(samples), 4),
+            throughput_rps=round(len(samples) / elapsed, 2),
+            statuses=result.statuses[name],
+            **_latency_stats(samples)
+        )
+    
+    all_samples = [seconds for samples in result.samples.values() for seconds in samples]
+    total_errors = sum(result.errors.values())
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'config': config,
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': dict(
+            requests=len(all_samples),
+            errors=total_errors,
+            error_rate=round(total_errors / len(all_samples), 4) if all_samples else 0.0,
+            throughput_rps=round(len(all_samples) / elapsed, 2) if elapsed else 0.0,
+            **_latency_stats(all_samples)
+        ),
+        'scenarios': scenarios
+    }
+
+def print_report(report: Dict):
+    header = f"{'scenario':<16} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['scenarios'].items()) + [('overall', report['overall'])]
+    for name, stats in rows:
+        print(f"{name:<16} {stats['requests']:>7} {stats['throughput_rps']:>8.1f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p90_ms']:>9.2f} {stats['p99_ms']:>9.2f} "
+              f"{stats['max_ms']:>9.2f} {stats['error_rate'] * 100:>6.2f}%")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.load_test',
+                                     description='HTTP load test with latency percentiles')
+    parser.add_argument('--target', help='base URL of a running server; default starts one in-process')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'weighted scenarios, e.g. {DEFAULT_MIX} (choices: {", ".join(SCENARIOS)})')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('-d', '--duration', type=float, default=None, help='seconds to run')
+    parser.add_argument('-n', '--requests', type=int, default=None, help='total requests to send')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout in seconds')
+    parser.add_argument('--detector-latency-ms', type=float, default=0.0,
+                        help='simulated inference time of the stub detector (in-process only)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the request sequence')
+    parser.add_argument('-o', '--output', default='benchmarks/results/load_test.json',
+                        help='where to write the JSON report')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='exit with status 1 above this overall error rate')
+    args = parser.parse_args(argv)
+    
+    if args.duration is None and args.requests is None:
+        args.duration = 10.0
+    weights = parse_mix(args.mix)
+    output = os.path.abspath(args.output)
+    
+    work_dir = None
+    server = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        base_url, server, work_dir = start_local_server(args.detector_latency_ms)
+    
+    config = {
+        'target': args.target or 'in-process (in-memory store, stub detector)',
+        'mix': weights,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'requests': args.requests,
+        'detector_latency_ms': None if args.target else args.detector_latency_ms,
+        'seed': args.seed
+    }
+    
+    print(f"Load testing {base_url} with {args.concurrency} clients, mix {args.mix}")
+    try:
+        # The in-process app prints per request; keep the console for the report
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull if server is not None else sys.stdout):
+            result, elapsed = run_load(base_url, weights, args.concurrency, args.duration,
+                                       args.requests, args.timeout, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if work_dir is not None:
+            os.chdir(BACKEND_DIR)
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    report = build_report(result, elapsed, config)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    
+    print()
+    print_report(report)
+    print(f"\nReport written to {output}")
+    
+    return 1 if report['overall']['error_rate'] > args.max_error_rate else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
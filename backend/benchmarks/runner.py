@@ -0,0 +1,135 @@
+"""
+Benchmark Runner
+Times registered cases with calibrated loops, writes results as JSON and
+compares each case's fastest sample against a stored baseline to flag regressions
+"""
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+import cv2
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+from .cases import BENCHMARKS, Benchmark
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+STATUS_OK = 'ok'
+STATUS_REGRESSION = 'regression'
+STATUS_IMPROVEMENT = 'improvement'
+STATUS_NEW = 'new'
+
+def environment() -> Dict:
+    """What the numbers depend on; baselines from another environment are only indicative"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads()
+    }
+
+def _calibrate(func, min_sample_time: float) -> int:
+    """Smallest power-of-ten loop count whose run takes at least ``min_sample_time``"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= min_sample_time or loops >= 10 ** 6:
+            return loops
+        loops *= 10
+
+def time_benchmark(case: Benchmark, repeat: int = 7, min_sample_time: float = 0.05) -> Dict:
+    """Per-call timings (milliseconds) over ``repeat`` samples of a calibrated loop"""
+    func = case.setup()
+    func()  # warm caches (overlay layers, lazy allocations) before measuring
+    loops = _calibrate(func, min_sample_time)
+    
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - started) / loops * 1000)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    
+    return {
+        'name': case.name,
+        'description': case.description,
+        'loops': loops,
+        'repeat': repeat,
+        'min_ms': round(min(samples), 6),
+        'median_ms': round(statistics.median(samples), 6),
+        'mean_ms': round(statistics.fmean(samples), 6),
+        'stdev_ms': round(statistics.stdev(samples), 6) if len(samples) > 1 else 0.0,
+        'max_ms': round(max(samples), 6)
+    }
+
+def run_benchmarks(pattern: Optional[str] = None, repeat: int = 7,
+                   min_sample_time: float = 0.05, progress=print) -> Dict:
+    cases = [case for case in BENCHMARKS if not pattern or pattern in case.name]
+    results = []
+    for case in cases:
+        result = time_benchmark(case, repeat, min_sample_time)
+        results.append(result)
+        if progress:
+            progress(f"{case.name:<40} {result['median_ms']:>10.3f} ms  "
+                     f"(min {result['min_ms']:.3f}, stdev {result['stdev_ms']:.3f}, {result['loops']} loops)")
+    
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'environment': environment(),
+        'results': results
+    }
+
+def compare(report: Dict, baseline: Dict, threshold: float = 0.2) -> List[Dict]:
+    """
+    Compare the fastest sample against the baseline's; the minimum is far less
+    sensitive to scheduler noise than the mean. A case is a regression when it
+    is slower than the baseline by more than ``threshold`` (0.2 = 20%).
+    """
+    baseline_results = {result['name']: result for result in baseline.get('results', [])}
+    comparisons = []
+    for result in report['results']:
+        reference = baseline_results.get(result['name'])
+        if reference is None or not reference.get('min_ms'):
+            comparisons.append({'name': result['name'], 'status': STATUS_NEW,
+                                'min_ms': result['min_ms'], 'baseline_ms': None, 'ratio': None})
+            continue
+        
+        ratio = result['min_ms'] / reference['min_ms']
+        if ratio > 1 + threshold:
+            status = STATUS_REGRESSION
+        elif ratio < 1 - threshold:
+            status = STATUS_IMPROVEMENT
+        else:
+            status = STATUS_OK
+        comparisons.append({'name': result['name'], 'status': status,
+                            'min_ms': result['min_ms'], 'baseline_ms': reference['min_ms'],
+                            'ratio': round(ratio, 3)})
+    return comparisons
+
+def load_report(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_report(report: Dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
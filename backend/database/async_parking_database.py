@@ -0,0 +1,278 @@
+"""
+Async Database Operations
+Non-blocking counterpart of ParkingDatabase on motor (or the in-memory store),
+plus a background event loop that sync code can submit database work to
+"""
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Awaitable, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .mongodb_config import mongodb_manager
+from .models import ParkingLotModel
+from .parking_database import parking_db
+from .occupancy_rollups import OccupancyRollups, rollup_collection_name
+
+logger = logging.getLogger(__name__)
+
+class AsyncInMemoryCursor:
+    """Awaitable cursor over in-memory results, shaped like motor's AsyncIOMotorCursor"""
+    
+    def __init__(self, result):
+        self._result = result
+    
+    def sort(self, field, direction=-1):
+        self._result.sort(field, direction)
+        return self
+    
+    def limit(self, count):
+        self._result.limit(count)
+        return self
+    
+    async def to_list(self, length=None):
+        data = list(self._result)
+        return data[:length] if length else data
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in self._result:
+            yield document
+
+class AsyncInMemoryCollection:
+    """
+    Coroutine interface over an InMemoryCollection. Operations are
+    in-process and short, so they run inline on the event loop.
+    """
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    async def insert_one(self, document):
+        return self.collection.insert_one(document)
+    
+    async def insert_many(self, documents, ordered=True):
+        return self.collection.insert_many(documents, ordered=ordered)
+    
+    def find(self, query=None):
+        return AsyncInMemoryCursor(self.collection.find(query))
+    
+    async def find_one(self, query):
+        return self.collection.find_one(query)
+    
+    async def count_documents(self, query):
+        return self.collection.count_documents(query)
+    
+    async def update_one(self, query, update, upsert=False):
+        return self.collection.update_one(query, update, upsert=upsert)
+    
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False):
+        return self.collection.find_one_and_update(query, update, upsert=upsert, return_document=return_document)
+    
+    async def delete_many(self, query):
+        return self.collection.delete_many(query)
+    
+    async def bulk_write(self, requests, ordered=True):
+        return self.collection.bulk_write(requests, ordered=ordered)
+    
+    def aggregate(self, pipeline):
+        return AsyncInMemoryCursor(self.collection.aggregate(pipeline))
+
+class AsyncLoopRunner:
+    """
+    An asyncio event loop on a daemon thread. Sync code (Flask handlers, job
+    workers) submits coroutines to it and can await many at once with
+    ``asyncio.gather`` instead of blocking on each database call in turn.
+    """
+    
+    def __init__(self, name: str = 'async-db-loop'):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name=self.name)
+                self._thread.start()
+            return self._loop
+    
+    def submit(self, coroutine: Awaitable) -> Future:
+        """Schedule a coroutine; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+    
+    def run(self, coroutine: Awaitable, timeout: Optional[float] = 30.0):
+        """Run a coroutine on the loop thread and wait for its result"""
+        return self.submit(coroutine).result(timeout)
+    
+    def stop(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5.0)
+            loop.close()
+
+class AsyncParkingDatabase:
+    """
+    Async parking database operations.
+    
+    Backed by motor when MongoDB is connected and by the shared in-memory
+    collections otherwise. In-process state (lot registry, write-behind
+    log buffer, lot status cache, spot diff engine) is shared with the sync
+    ``ParkingDatabase``; operations built on it run in worker threads.
+    The motor client binds to the loop it is first used on, so use one loop
+    per instance (normally ``async_runner``).
+    """
+    
+    def __init__(self, sync_db, manager):
+        self.sync_db = sync_db
+        self.manager = manager
+        self._client = None
+        self._collections = {}
+    
+    def get_collection(self, collection_name):
+        """Collection for the manager's current backend, which can change at runtime"""
+        connected = self.manager.db is not None
+        key = (connected, collection_name)
+        collection = self._collections.get(key)
+        if collection is not None:
+            return collection
+        
+        if connected:
+            if self._client is None:
+                self._client = AsyncIOMotorClient(self.manager.connection_string,
+                                                  serverSelectionTimeoutMS=self.manager.timeout_ms)
+            collection = self._client[self.manager.database_name][collection_name]
+        else:
+            collection = AsyncInMemoryCollection(self.manager._in_memory_collection(collection_name))
+        
+        self._collections[key] = collection
+        return collection
+    
+    # ============ PARKING LOTS OPERATIONS ============
+    
+    async def get_parking_lot(self, lot_id: str) -> Optional[Dict]:
+        """Get parking lot by ID"""
+        try:
+            lot = self.sync_db._lots_by_id.get(lot_id)
+            if lot is not None:
+                return lot
+            lot = await self.get_collection('parking_lots').find_one({'lot_id': lot_id})
+            return self.sync_db._cache_lot(lot) if lot else None
+        except Exception as e:
+            logger.error(f"Error getting parking lot: {e}")
+            return None
+    
+    async def get_all_parking_lots(self) -> List[Dict]:
+        """Get all parking lots"""
+        try:
+            lots = await self.get_collection('parking_lots').find({'status': 'active'}).to_list(None)
+            for lot in lots:
+                self.sync_db._cache_lot(lot)
+            return lots
+        except Exception as e:
+            logger.error(f"Error getting all parking lots: {e}")
+            return []
+    
+    async def get_or_create_parking_lot(self, name: str, location: str, total_spaces: int,
+                                        coordinates: Dict = None) -> Dict:
+        """Resolve a lot by name from the registry, creating it atomically on first use"""
+        lot = self.sync_db._lots_by_name.get(name)
+        if lot is not None:
+            return lot
+        
+        lot_data = ParkingLotModel.create_lot(name, location, total_spaces, coordinates)
+        lots = self.get_collection('parking_lots')
+        try:
+            lot = await lots.find_one_and_update(
+                {'name': name},
+                {'$setOnInsert': lot_data},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            lot = await lots.find_one({'name': name})
+        
+        if lot['lot_id'] == lot_data['lot_id']:
+            logger.info(f"Created parking lot: {lot['lot_id']}")
+        return self.sync_db._cache_lot(lot)
+    
+    # ============ PARKING SPOTS OPERATIONS ============
+    
+    async def get_lot_spots(self, lot_id: str) -> List[Dict]:
+        """Get all parking spots for a specific lot"""
+        try:
+            return await self.get_collection('parking_spots').find(
+                {'lot_id': lot_id, 'status': 'active'}).to_list(None)
+        except Exception as e:
+            logger.error(f"Error getting lot spots: {e}")
+            return []
+    
+    async def get_available_spots(self, lot_id: str) -> List[Dict]:
+        """Get available (unoccupied) spots for a lot"""
+        try:
+            return await self.get_collection('parking_spots').find({
+                'lot_id': lot_id,
+                'is_occupied': False,
+                'status': 'active'
+            }).to_list(None)
+        except Exception as e:
+            logger.error(f"Error getting available spots: {e}")
+            return []
+    
+    async def sync_spot_occupancy(self, lot_id: str, space_states: Dict,
+                                  confidence: float = 0.95) -> Dict:
+        """Persist per-space states through the shared diff engine, off the loop thread"""
+        return await asyncio.to_thread(self.sync_db.sync_spot_occupancy, lot_id, space_states, confidence)
+    
+    # ============ AVAILABILITY LOGS OPERATIONS ============
+    
+    async def log_availability_analysis(self, lot_id: str, analysis_data: Dict) -> Dict:
+        """Queue an availability log; only touches in-process buffers"""
+        return self.sync_db.log_availability_analysis(lot_id, analysis_data)
+    
+    async def get_recent_availability(self, lot_id: str, hours: int = 24) -> List[Dict]:
+        """Get recent availability logs for a lot"""
+        try:
+            await asyncio.to_thread(self.sync_db.availability_log_writer.flush)
+            since = datetime.utcnow() - timedelta(hours=hours)
+            return await self.get_collection('availability_logs').find({
+                'lot_id': lot_id,
+                'timestamp': {'$gte': since}
+            }).sort('timestamp', -1).to_list(None)
+        except Exception as e:
+            logger.error(f"Error getting recent availability: {e}")
+            return []
+    
+    async def get_occupancy_stats(self, lot_id: str, days: int = 7) -> Dict:
+        """Get occupancy statistics for a lot from the rollups"""
+        try:
+            await asyncio.to_thread(self.sync_db.availability_log_writer.flush)
+            since = datetime.utcnow() - timedelta(days=days)
+            granularity = OccupancyRollups.choose_granularity(since)
+            result = await self.get_collection(rollup_collection_name(granularity)).aggregate(
+                OccupancyRollups.stats_pipeline(lot_id, since, granularity)).to_list(None)
+            return OccupancyRollups.stats_from_result(result, granularity)
+        except Exception as e:
+            logger.error(f"Error getting occupancy stats: {e}")
+            return {}
+    
+    async def get_lot_statuses(self, lot_ids: List[str]) -> Dict[str, Dict]:
+        """Latest status per lot; the cache refresh may query, so it runs off the loop thread"""
+        return await asyncio.to_thread(self.sync_db.get_lot_statuses, lot_ids)
+    
+    async def get_lot_status(self, lot_id: str) -> Optional[Dict]:
+        return (await self.get_lot_statuses([lot_id])).get(lot_id)
+
+# Global async database instances
+async_runner = AsyncLoopRunner()
+async_parking_db = AsyncParkingDatabase(parking_db, mongodb_manager)
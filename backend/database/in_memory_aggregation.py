@@ -0,0 +1,138 @@
+"""
+In-Memory Aggregation
+Evaluates MongoDB aggregation pipelines ($match, $group, $sort, $limit) for
+the in-memory fallback, computing $group accumulators on NumPy columns
+"""
+import numbers
+import numpy as np
+from typing import Callable, Dict, List
+
+GROUP_ACCUMULATORS = ('$sum', '$avg', '$min', '$max')
+
+def run_pipeline(documents: List[Dict], stages: List[Dict], matches: Callable[[Dict, Dict], bool]) -> List[Dict]:
+    """Apply pipeline stages in order; ``matches(doc, query)`` evaluates $match filters"""
+    for stage in stages:
+        (operator, spec), = stage.items()
+        if operator == '$match':
+            documents = [doc for doc in documents if matches(doc, spec)]
+        elif operator == '$group':
+            documents = group_documents(documents, spec)
+        elif operator == '$sort':
+            documents = sort_documents(documents, spec)
+        elif operator == '$limit':
+            documents = documents[:int(spec)]
+        else:
+            raise NotImplementedError(f"Unsupported aggregation stage: {operator}")
+    return documents
+
+def _field_of(expression):
+    """'$field' -> 'field'; anything else is a constant"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        return expression[1:]
+    return None
+
+def _is_number(value) -> bool:
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+def _group_codes(documents: List[Dict], id_spec):
+    """Group key per document as integer codes, plus the _id of each group in first-seen order"""
+    if isinstance(id_spec, dict):
+        fields = {name: _field_of(expression) for name, expression in id_spec.items()}
+        keys = [tuple(doc.get(field) if field else id_spec[name] for name, field in fields.items())
+                for doc in documents]
+        make_id = lambda key: dict(zip(fields, key))
+    else:
+        field = _field_of(id_spec)
+        keys = [doc.get(field) for doc in documents] if field else [id_spec] * len(documents)
+        make_id = lambda key: key
+    
+    index = {}
+    codes = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.intp, count=len(keys))
+    return codes, [make_id(key) for key in index]
+
+def _column(documents: List[Dict], expression):
+    """Project an accumulator expression to a float column (NaN where missing or non-numeric)"""
+    field = _field_of(expression)
+    if field is None:
+        values = [expression] * len(documents)
+    else:
+        values = [doc.get(field) for doc in documents]
+    numeric = np.fromiter((value if _is_number(value) else np.nan for value in values),
+                          dtype=np.float64, count=len(values))
+    integral = all(isinstance(value, numbers.Integral) for value in values if _is_number(value))
+    return values, numeric, integral
+
+def _reduce(codes: np.ndarray, column: np.ndarray, valid: np.ndarray, ufunc, group_count: int) -> List:
+    """Per-group ufunc reduction over valid entries; None for groups without any"""
+    result = [None] * group_count
+    if not valid.any():
+        return result
+    group_codes = codes[valid]
+    values = column[valid]
+    order = np.argsort(group_codes, kind='stable')
+    group_codes = group_codes[order]
+    values = values[order]
+    starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]])
+    for code, value in zip(group_codes[starts].tolist(), ufunc.reduceat(values, starts).tolist()):
+        result[code] = value
+    return result
+
+def _reduce_objects(codes: np.ndarray, values: List, reducer, group_count: int) -> List:
+    """$min/$max over non-numeric values (dates, strings), ignoring nulls"""
+    result = [None] * group_count
+    for code, value in zip(codes.tolist(), values):
+        if value is not None:
+            result[code] = value if result[code] is None else reducer(result[code], value)
+    return result
+
+def group_documents(documents: List[Dict], spec: Dict) -> List[Dict]:
+    """Evaluate a $group stage: one factorization of the _id, then vectorized accumulators"""
+    codes, group_ids = _group_codes(documents, spec.get('_id'))
+    group_count = len(group_ids)
+    groups = [{'_id': group_id} for group_id in group_ids]
+    
+    for name, accumulator in spec.items():
+        if name == '_id':
+            continue
+        (operator, expression), = accumulator.items()
+        if operator not in GROUP_ACCUMULATORS:
+            raise NotImplementedError(f"Unsupported $group accumulator: {operator}")
+        
+        values, column, integral = _column(documents, expression)
+        valid = ~np.isnan(column)
+        
+        if operator in ('$sum', '$avg'):
+            totals = np.bincount(codes, weights=np.where(valid, column, 0.0), minlength=group_count)
+            if operator == '$sum':
+                results = [int(total) if integral else total for total in totals.tolist()]
+            else:
+                counts = np.bincount(codes, weights=valid, minlength=group_count)
+                results = [total / count if count else None
+                           for total, count in zip(totals.tolist(), counts.tolist())]
+        elif valid.sum() == sum(value is not None for value in values):
+            # Every non-null value is numeric
+            ufunc = np.minimum if operator == '$min' else np.maximum
+            results = _reduce(codes, column, valid, ufunc, group_count)
+            if integral:
+                results = [int(value) if value is not None else None for value in results]
+        else:
+            results = _reduce_objects(codes, values, min if operator == '$min' else max, group_count)
+        
+        for group, value in zip(groups, results):
+            group[name] = value
+    
+    return groups
+
+def _sort_key(field: str):
+    def key(doc):
+        value = doc.get(field)
+        return (value is not None, value if value is not None else 0)
+    return key
+
+def sort_documents(documents: List[Dict], spec: Dict) -> List[Dict]:
+    """Evaluate a $sort stage; nulls sort first in ascending order, as in MongoDB"""
+    documents = list(documents)
+    # Stable sorts applied from the least to the most significant key
+    for field, direction in reversed(list(spec.items())):
+        documents.sort(key=_sort_key(field), reverse=(direction == -1))
+    return documents
@@ -0,0 +1,325 @@
+"""
+In-Memory Store Persistence
+Append-only segment log plus periodic compacted snapshots, so the in-memory
+fallback survives restarts without a database service
+"""
+import os
+import re
+import mmap
+import time
+import zlib
+import struct
+import threading
+import logging
+from typing import Callable, Dict, Iterator, Optional, Tuple
+import bson
+from bson.errors import InvalidDocument
+
+logger = logging.getLogger(__name__)
+
+OP_PUT = 1
+OP_DELETE = 2
+
+SEGMENT_MAGIC = b'SSLOG001'
+SNAPSHOT_MAGIC = b'SSSNP001'
+
+# Frame: body length, crc32(body); body: doc id, op, collection name length
+FRAME = struct.Struct('<II')
+RECORD = struct.Struct('<QBH')
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})\.log$')
+SNAPSHOT_PATTERN = re.compile(r'^snapshot-(\d{8})\.snap$')
+
+def encode_record(op: int, collection_name: str, doc_id: int, document: Optional[Dict] = None) -> bytes:
+    """
+    Frame one log record. Documents are stored as BSON, so they come back the
+    way MongoDB would return them: datetimes truncated to milliseconds and
+    timezone-aware ones converted to naive UTC.
+    """
+    name = collection_name.encode('utf-8')
+    body = RECORD.pack(doc_id, op, len(name)) + name + (bson.encode(document) if op == OP_PUT else b'')
+    return FRAME.pack(len(body), zlib.crc32(body)) + body
+
+def iter_records(path: str, magic: bytes) -> Iterator[Tuple[int, str, int, Optional[Dict], int]]:
+    """
+    Yield (op, collection, doc_id, document, end_offset) from a memory-mapped
+    file, stopping at the first torn or corrupt record
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(magic):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(magic)] != magic:
+                raise ValueError(f"Not a store file: {path}")
+            view = memoryview(data)
+            offset = len(magic)
+            try:
+                while offset + FRAME.size <= size:
+                    length, crc = FRAME.unpack_from(data, offset)
+                    start = offset + FRAME.size
+                    end = start + length
+                    if end > size or zlib.crc32(view[start:end]) != crc:
+                        break
+                    doc_id, op, name_length = RECORD.unpack_from(data, start)
+                    name_start = start + RECORD.size
+                    name = bytes(view[name_start:name_start + name_length]).decode('utf-8')
+                    document = bson.decode(view[name_start + name_length:end]) if op == OP_PUT else None
+                    offset = end
+                    yield op, name, doc_id, document, offset
+            finally:
+                view.release()
+
+class SegmentLogPersistence:
+    """
+    Durability for the in-memory collections.
+    
+    Every insert, update and delete is appended to the active segment as a
+    full-document put or a delete keyed by the collection's internal document
+    id, so replaying records is idempotent. Segments rotate at
+    ``segment_bytes``; once ``snapshot_bytes`` have been logged since the last
+    snapshot, a background thread writes a compacted snapshot and deletes the
+    segments it covers. Recovery maps the newest snapshot and the segments
+    after it, so restart time is bounded by snapshot size plus
+    ``snapshot_bytes`` of log.
+    """
+    
+    def __init__(self, data_dir: str, segment_bytes: int = 16 * 1024 * 1024,
+                 snapshot_bytes: int = 64 * 1024 * 1024, fsync_interval: float = 1.0):
+        self.data_dir = data_dir
+        self.segment_bytes = segment_bytes
+        self.snapshot_bytes = snapshot_bytes
+        self.fsync_interval = fsync_interval
+        self.collections = {}
+        
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_seq = 0
+        self._segment_size = 0
+        self._bytes_since_snapshot = 0
+        self._last_fsync = time.monotonic()
+        self._snapshot_requested = threading.Event()
+        self._snapshot_thread = None
+        self._closed = False
+        
+        self.records_written = 0
+        self.snapshots_written = 0
+        self.last_recovery = {}
+    
+    def _path(self, kind: str, seq: int) -> str:
+        extension = 'log' if kind == 'segment' else 'snap'
+        return os.path.join(self.data_dir, f'{kind}-{seq:08d}.{extension}')
+    
+    def _list(self, pattern) -> Dict[int, str]:
+        files = {}
+        for name in os.listdir(self.data_dir):
+            match = pattern.match(name)
+            if match:
+                files[int(match.group(1))] = os.path.join(self.data_dir, name)
+        return files
+    
+    # ---- recovery ----
+    
+    def recover(self, get_collection: Callable[[str], object]) -> Dict:
+        """Rebuild collections from the newest snapshot plus later segments, then open a new segment"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        started = time.perf_counter()
+        snapshots = self._list(SNAPSHOT_PATTERN)
+        segments = self._list(SEGMENT_PATTERN)
+        
+        snapshot_seq = max(snapshots) if snapshots else 0
+        counts = {'snapshot_records': 0, 'log_records': 0}
+        
+        if snapshots:
+            counts['snapshot_records'] = self._replay(snapshots[snapshot_seq], SNAPSHOT_MAGIC, get_collection)
+        for seq in sorted(seq for seq in segments if seq >= snapshot_seq):
+            counts['log_records'] += self._replay(segments[seq], SEGMENT_MAGIC, get_collection, truncate=True)
+            if os.path.getsize(segments[seq]) <= len(SEGMENT_MAGIC):
+                os.remove(segments.pop(seq))
+        
+        self._remove_covered(snapshot_seq)
+        with self._lock:
+            self._open_segment(max(list(segments) + [snapshot_seq]) + 1)
+            self._bytes_since_snapshot = sum(os.path.getsize(path) for seq, path in segments.items()
+                                             if seq >= snapshot_seq and os.path.exists(path))
+        
+        self.last_recovery = dict(counts, snapshot=snapshot_seq or None,
+                                  seconds=round(time.perf_counter() - started, 3))
+        logger.info(f"Recovered in-memory store from {self.data_dir}: {self.last_recovery}")
+        return self.last_recovery
+    
+    def _replay(self, path: str, magic: bytes, get_collection, truncate: bool = False) -> int:
+        count = 0
+        end = len(magic)
+        for op, name, doc_id, document, end in iter_records(path, magic):
+            collection = get_collection(name)
+            if op == OP_PUT:
+                collection._restore(doc_id, document)
+            else:
+                collection._discard(doc_id)
+            count += 1
+        
+        if truncate and end < os.path.getsize(path):
+            # Torn write from a crash: drop the partial tail
+            logger.warning(f"Truncating {path} at offset {end} (torn or corrupt record)")
+            with open(path, 'r+b') as f:
+                f.truncate(max(end, len(magic)))
+        return count
+    
+    # ---- logging ----
+    
+    def attach(self, collection):
+        """Journal a collection's writes from now on"""
+        self.collections[collection.collection_name] = collection
+        collection.journal = self
+    
+    def log_put(self, collection_name: str, doc_id: int, document: Dict):
+        try:
+            record = encode_record(OP_PUT, collection_name, doc_id, document)
+        except InvalidDocument as e:
+            logger.error(f"Cannot persist document in {collection_name}: {e}")
+            return
+        self._append(record)
+    
+    def log_delete(self, collection_name: str, doc_id: int):
+        self._append(encode_record(OP_DELETE, collection_name, doc_id))
+    
+    def _append(self, record: bytes):
+        with self._lock:
+            if self._segment is None:
+                return
+            self._segment.write(record)
+            self._segment.flush()
+            self._segment_size += len(record)
+            self._bytes_since_snapshot += len(record)
+            self.records_written += 1
+            
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._segment.fileno())
+                self._last_fsync = time.monotonic()
+            if self._segment_size >= self.segment_bytes:
+                self._open_segment(self._segment_seq + 1)
+            if self._bytes_since_snapshot >= self.snapshot_bytes:
+                self._request_snapshot()
+    
+    def _open_segment(self, seq: int):
+        if self._segment is not None:
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._segment.close()
+        self._segment = open(self._path('segment', seq), 'ab')
+        if self._segment.tell() == 0:
+            self._segment.write(SEGMENT_MAGIC)
+        self._segment_seq = seq
+        self._segment_size = self._segment.tell()
+    
+    # ---- snapshots ----
+    
+    def _request_snapshot(self):
+        self._snapshot_requested.set()
+        if self._snapshot_thread is None or not self._snapshot_thread.is_alive():
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, daemon=True,
+                                                     name='in-memory-snapshot')
+            self._snapshot_thread.start()
+    
+    def _snapshot_loop(self):
+        while self._snapshot_requested.wait(timeout=5.0):
+            self._snapshot_requested.clear()
+            if self._closed:
+                return
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"In-memory snapshot failed: {e}")
+    
+    def snapshot(self) -> Dict:
+        """
+        Write a compacted snapshot covering every segment before a fresh one.
+        
+        Collections are copied after the rotation, so the snapshot may also
+        contain writes that are in the new segment; replay is idempotent.
+        """
+        with self._lock:
+            if self._segment is None:
+                return {}
+            self._open_segment(self._segment_seq + 1)
+            seq = self._segment_seq
+            self._bytes_since_snapshot = 0
+        
+        path = self._path('snapshot', seq)
+        temp_path = path + '.tmp'
+        records = 0
+        with open(temp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            for name, collection in list(self.collections.items()):
+                for doc_id, document in collection._items():
+                    try:
+                        f.write(encode_record(OP_PUT, name, doc_id, document))
+                        records += 1
+                    except InvalidDocument as e:
+                        logger.error(f"Cannot persist document in {name}: {e}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        
+        self._remove_covered(seq)
+        self.snapshots_written += 1
+        logger.info(f"Wrote in-memory snapshot {seq} ({records} documents)")
+        return {'snapshot': seq, 'documents': records}
+    
+    def _remove_covered(self, snapshot_seq: int):
+        """Delete segments and older snapshots that the given snapshot supersedes"""
+        if not snapshot_seq:
+            return
+        for seq, path in self._list(SEGMENT_PATTERN).items():
+            if seq < snapshot_seq:
+                os.remove(path)
+        for seq, path in self._list(SNAPSHOT_PATTERN).items():
+            if seq < snapshot_seq:
+                os.remove(path)
+    
+    def close(self):
+        """Stop the snapshot thread, compact anything logged since the last snapshot and close"""
+        self._closed = True
+        self._snapshot_requested.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        
+        with self._lock:
+            pending = self._segment is not None and self._bytes_since_snapshot > 0
+        if pending:
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"Final in-memory snapshot failed: {e}")
+        
+        with self._lock:
+            if self._segment is not None:
+                self._segment.flush()
+                os.fsync(self._segment.fileno())
+                self._segment.close()
+                self._segment = None
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'data_dir': self.data_dir,
+                'active_segment': self._segment_seq,
+                'segment_bytes': self._segment_size,
+                'bytes_since_snapshot': self._bytes_since_snapshot,
+                'records_written': self.records_written,
+                'snapshots_written': self.snapshots_written,
+                'last_recovery': self.last_recovery
+            }
+
+def create_persistence() -> Optional[SegmentLogPersistence]:
+    """Persistence configured from the environment; None unless IN_MEMORY_DATA_DIR is set"""
+    data_dir = os.getenv('IN_MEMORY_DATA_DIR')
+    if not data_dir:
+        return None
+    return SegmentLogPersistence(
+        data_dir,
+        segment_bytes=int(os.getenv('IN_MEMORY_SEGMENT_BYTES', 16 * 1024 * 1024)),
+        snapshot_bytes=int(os.getenv('IN_MEMORY_SNAPSHOT_BYTES', 64 * 1024 * 1024)),
+        fsync_interval=float(os.getenv('IN_MEMORY_FSYNC_INTERVAL', 1.0))
+    )
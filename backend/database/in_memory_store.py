@@ -0,0 +1,548 @@
+"""
+In-Memory Document Store
+MongoDB-compatible fallback collections with hash and sorted secondary
+indexes, used when no MongoDB server is reachable
+"""
+import bisect
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database.in_memory_aggregation import run_pipeline
+
+# Fields indexed in sort order so range queries scan instead of filtering;
+# every other indexed field gets a hash index
+SORTED_FIELDS = ('timestamp', 'bucket')
+
+RANGE_OPERATORS = ('$gte', '$gt', '$lte', '$lt')
+
+def _result(**fields):
+    return type('obj', (object,), fields)()
+
+class _HashIndex:
+    """Equality index: tuple of field values -> insertion-ordered set of document ids"""
+    
+    def __init__(self, fields: Tuple[str, ...], unique: bool = False):
+        self.fields = fields
+        self.unique = unique
+        self._buckets = {}
+    
+    def key(self, doc: Dict) -> Tuple:
+        return tuple(doc.get(field) for field in self.fields)
+    
+    def check(self, doc: Dict, doc_id: Optional[int] = None):
+        """Raise DuplicateKeyError if ``doc`` would violate this unique index"""
+        if not self.unique:
+            return
+        key = self.key(doc)
+        if None in key:
+            return  # missing values are not constrained (sparse semantics)
+        bucket = self._buckets.get(key)
+        if bucket and any(other != doc_id for other in bucket):
+            raise DuplicateKeyError(f"E11000 duplicate key error index: {'_'.join(self.fields)} dup key: {key}")
+    
+    def add(self, doc_id: int, doc: Dict):
+        self._buckets.setdefault(self.key(doc), {})[doc_id] = None
+    
+    def remove(self, doc_id: int, doc: Dict):
+        key = self.key(doc)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(doc_id, None)
+            if not bucket:
+                del self._buckets[key]
+    
+    def lookup(self, key: Tuple) -> Dict:
+        return self._buckets.get(key, {})
+
+class _SortedRun:
+    """
+    Keys kept in ascending order alongside their document ids.
+    
+    Appends in key order (the common case for timestamps) are O(1); removing
+    the smallest key only advances ``head``, so oldest-first eviction is O(1)
+    amortized. Other removals and out-of-order inserts shift the lists.
+    """
+    
+    __slots__ = ('keys', 'ids', 'head')
+    
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+        self.head = 0
+    
+    def __len__(self) -> int:
+        return len(self.keys) - self.head
+    
+    def add(self, key, doc_id: int):
+        if len(self.keys) == self.head or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.ids.append(doc_id)
+        else:
+            position = bisect.bisect_right(self.keys, key, self.head)
+            self.keys.insert(position, key)
+            self.ids.insert(position, doc_id)
+    
+    def remove(self, key, doc_id: int):
+        if self.head < len(self.ids) and self.ids[self.head] == doc_id:
+            self.head += 1
+            if self.head >= 1024 and self.head * 2 >= len(self.keys):
+                del self.keys[:self.head]
+                del self.ids[:self.head]
+                self.head = 0
+            return
+        
+        position = bisect.bisect_left(self.keys, key, self.head)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.ids[position] == doc_id:
+                del self.keys[position]
+                del self.ids[position]
+                return
+            position += 1
+    
+    def scan(self, bounds: Dict) -> List[int]:
+        """Document ids whose key satisfies the $gte/$gt/$lte/$lt bounds, ascending"""
+        start, end = self.head, len(self.keys)
+        if '$gte' in bounds:
+            start = bisect.bisect_left(self.keys, bounds['$gte'], start, end)
+        if '$gt' in bounds:
+            start = max(start, bisect.bisect_right(self.keys, bounds['$gt'], start, end))
+        if '$lte' in bounds:
+            end = bisect.bisect_right(self.keys, bounds['$lte'], start, end)
+        if '$lt' in bounds:
+            end = min(end, bisect.bisect_left(self.keys, bounds['$lt'], start, end))
+        return self.ids[start:end]
+
+class _SortedIndex:
+    """
+    Range index on the last field, grouped by equality on the leading fields,
+    e.g. (lot_id, timestamp) keeps one time-ordered run per lot
+    """
+    
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = fields
+        self.group_fields = fields[:-1]
+        self.sort_field = fields[-1]
+        self.usable = True
+        self._runs = {}
+    
+    def _group(self, doc: Dict) -> Tuple:
+        return tuple(doc.get(field) for field in self.group_fields)
+    
+    def add(self, doc_id: int, doc: Dict):
+        key = doc.get(self.sort_field)
+        if key is None or not self.usable:
+            return
+        try:
+            self._runs.setdefault(self._group(doc), _SortedRun()).add(key, doc_id)
+        except TypeError:
+            # Keys of mixed types cannot be ordered; stop using this index
+            self.usable = False
+            self._runs.clear()
+    
+    def remove(self, doc_id: int, doc: Dict):
+        key = doc.get(self.sort_field)
+        if key is None or not self.usable:
+            return
+        group = self._group(doc)
+        run = self._runs.get(group)
+        if run is not None:
+            run.remove(key, doc_id)
+            if not len(run):
+                del self._runs[group]
+    
+    def scan(self, group: Tuple, bounds: Dict) -> List[int]:
+        run = self._runs.get(group)
+        return run.scan(bounds) if run is not None else []
+
+class RetentionPolicy:
+    """Bounds a collection by the age of ``field`` (``ttl`` seconds) and/or a document count"""
+    
+    def __init__(self, ttl: Optional[float] = None, max_documents: Optional[int] = None,
+                 field: str = 'timestamp'):
+        self.ttl = ttl
+        self.max_documents = max_documents
+        self.field = field
+    
+    def to_dict(self) -> Dict:
+        return {'ttl': self.ttl, 'max_documents': self.max_documents, 'field': self.field}
+
+class InMemoryCollection:
+    """
+    In-memory collection fallback for when MongoDB is unavailable.
+    
+    Documents are stored by an internal id. ``indexes`` takes the same
+    ``(keys, unique)`` declarations as MongoDB; queries use the most selective
+    usable index and fall back to a full scan, then apply the full filter.
+    
+    With a ``retention`` policy, documents are evicted oldest-first from an
+    arrival deque (insertion order, which is time order for append-only
+    logs) on every insert and read, through the same path as deletes, so
+    indexes and the journal stay consistent.
+    """
+    
+    def __init__(self, collection_name: str, indexes: Sequence = (),
+                 retention: Optional[RetentionPolicy] = None):
+        self.collection_name = collection_name
+        self.retention = retention
+        # (retention field value, document id) in insertion order
+        self._arrivals = deque()
+        self.evicted = 0
+        self._documents = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+        # Optional persistence that records every write (see in_memory_persistence)
+        self.journal = None
+        self._hash_indexes = []
+        self._sorted_indexes = []
+        
+        for keys, unique in indexes:
+            fields = tuple(field for field, _ in keys)
+            if fields[-1] in SORTED_FIELDS:
+                self._sorted_indexes.append(_SortedIndex(fields))
+                if unique:
+                    self._hash_indexes.append(_HashIndex(fields, unique=True))
+            else:
+                self._hash_indexes.append(_HashIndex(fields, unique))
+    
+    # ---- index maintenance ----
+    
+    def _add(self, document: Dict) -> int:
+        for index in self._hash_indexes:
+            index.check(document)
+        doc_id = self._next_id
+        self._link(doc_id, document)
+        if self.journal is not None:
+            self.journal.log_put(self.collection_name, doc_id, document)
+        if self.retention is not None:
+            self._enforce_retention()
+        return doc_id
+    
+    def _remove(self, doc_id: int) -> Dict:
+        document = self._unlink(doc_id)
+        if self.journal is not None:
+            self.journal.log_delete(self.collection_name, doc_id)
+        return document
+    
+    def _link(self, doc_id: int, document: Dict):
+        self._documents[doc_id] = document
+        self._next_id = max(self._next_id, doc_id + 1)
+        if self.retention is not None:
+            self._arrivals.append((document.get(self.retention.field), doc_id))
+        for index in self._hash_indexes:
+            index.add(doc_id, document)
+        for index in self._sorted_indexes:
+            index.add(doc_id, document)
+    
+    def _unlink(self, doc_id: int) -> Dict:
+        document = self._documents.pop(doc_id)
+        for index in self._hash_indexes:
+            index.remove(doc_id, document)
+        for index in self._sorted_indexes:
+            index.remove(doc_id, document)
+        return document
+    
+    def _replace(self, doc_id: int, updated: Dict):
+        """Apply an updated copy of a document, keeping every index consistent"""
+        document = self._documents[doc_id]
+        for index in self._hash_indexes:
+            index.check(updated, doc_id)
+        for index in self._hash_indexes + self._sorted_indexes:
+            index.remove(doc_id, document)
+        document.update(updated)
+        for index in self._hash_indexes + self._sorted_indexes:
+            index.add(doc_id, document)
+        if self.journal is not None:
+            self.journal.log_put(self.collection_name, doc_id, document)
+    
+    def _enforce_retention(self):
+        """Evict from the front of the arrival deque; O(1) amortized per document"""
+        policy = self.retention
+        documents = self._documents
+        arrivals = self._arrivals
+        
+        if policy.max_documents is not None:
+            while len(documents) > policy.max_documents and arrivals:
+                _, doc_id = arrivals.popleft()
+                if doc_id in documents:
+                    self._remove(doc_id)
+                    self.evicted += 1
+        
+        if policy.ttl is not None:
+            cutoff = datetime.utcnow() - timedelta(seconds=policy.ttl)
+            while arrivals:
+                value, doc_id = arrivals[0]
+                if doc_id not in documents:
+                    arrivals.popleft()  # already deleted
+                    continue
+                # Documents without the field only leave through max_documents
+                if value is None or value >= cutoff:
+                    break
+                arrivals.popleft()
+                self._remove(doc_id)
+                self.evicted += 1
+        
+        # Entries for documents deleted elsewhere are normally dropped as they
+        # reach the front; rebuild if they pile up behind a long-lived head
+        if len(arrivals) > 2 * len(documents) + 1024:
+            self._arrivals = deque(entry for entry in arrivals if entry[1] in documents)
+    
+    # ---- persistence replay (not journaled, no constraint checks) ----
+    
+    def _restore(self, doc_id: int, document: Dict):
+        with self._lock:
+            if doc_id in self._documents:
+                self._unlink(doc_id)
+            self._link(doc_id, document)
+    
+    def _discard(self, doc_id: int):
+        with self._lock:
+            if doc_id in self._documents:
+                self._unlink(doc_id)
+    
+    def _items(self) -> List[Tuple[int, Dict]]:
+        """Point-in-time copy of (document id, document) pairs for snapshots"""
+        with self._lock:
+            return [(doc_id, dict(document)) for doc_id, document in self._documents.items()]
+    
+    # ---- query planning ----
+    
+    def _find_ids(self, query: Optional[Dict]) -> Tuple[List[int], Optional[str]]:
+        """Matching document ids, and the field they are already sorted by (if any)"""
+        if self.retention is not None and self.retention.ttl is not None:
+            self._enforce_retention()
+        if not query:
+            return list(self._documents), None
+        
+        candidates, ordered_by = self._plan(query)
+        if candidates is None:
+            candidates = self._documents
+        documents = self._documents
+        return [doc_id for doc_id in candidates if self._matches_query(documents[doc_id], query)], ordered_by
+    
+    def _plan(self, query: Dict):
+        equals = {key: value for key, value in query.items() if not isinstance(value, dict)}
+        ranges = {key: value for key, value in query.items()
+                  if isinstance(value, dict) and any(op in value for op in RANGE_OPERATORS)}
+        
+        # A range scan within an equality group also yields sorted results; the
+        # index matching the most equality fields scans the narrowest run, e.g.
+        # (lot_id, timestamp) rather than every lot's (timestamp)
+        best_sorted = None
+        for index in self._sorted_indexes:
+            if (index.usable and index.sort_field in ranges and
+                    all(field in equals for field in index.group_fields)):
+                if best_sorted is None or len(index.group_fields) > len(best_sorted.group_fields):
+                    best_sorted = index
+        if best_sorted is not None:
+            group = tuple(equals[field] for field in best_sorted.group_fields)
+            return best_sorted.scan(group, ranges[best_sorted.sort_field]), best_sorted.sort_field
+        
+        best = None
+        for index in self._hash_indexes:
+            try:
+                if all(field in equals for field in index.fields):
+                    bucket = index.lookup(tuple(equals[field] for field in index.fields))
+                elif len(index.fields) == 1 and set(query.get(index.fields[0]) or ()) == {'$in'}:
+                    # {field: {'$in': [...]}} is the union of one bucket per value
+                    bucket = {}
+                    for value in query[index.fields[0]]['$in']:
+                        bucket.update(index.lookup((value,)))
+                else:
+                    continue
+            except TypeError:
+                continue  # unhashable query value
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        return (list(best), None) if best is not None else (None, None)
+    
+    # ---- collection API ----
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'documents': len(self._documents),
+                'evicted': self.evicted,
+                'retention': self.retention.to_dict() if self.retention is not None else None
+            }
+    
+    def insert_one(self, document):
+        with self._lock:
+            self._add(document)
+        return _result(inserted_id=document.get('lot_id', document.get('spot_id', document.get('log_id'))))
+    
+    def insert_many(self, documents, ordered=True):
+        errors = []
+        with self._lock:
+            for index, document in enumerate(documents):
+                try:
+                    self._add(document)
+                except DuplicateKeyError as e:
+                    if ordered:
+                        raise
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': document})
+        if errors:
+            # Same shape as pymongo's unordered insert_many failure
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [],
+                                  'nInserted': len(documents) - len(errors)})
+        return _result(inserted_ids=[d.get('lot_id', d.get('spot_id', d.get('log_id'))) for d in documents])
+    
+    def find(self, query=None):
+        with self._lock:
+            doc_ids, ordered_by = self._find_ids(query)
+            documents = [self._documents[doc_id] for doc_id in doc_ids]
+        # Return an InMemoryQueryResult that supports sort()
+        return InMemoryQueryResult(documents, ordered_by)
+    
+    def sort(self, field, direction=-1):
+        """Chainable sort method"""
+        return self
+    
+    def find_one(self, query):
+        results = self.find(query)
+        return results[0] if results else None
+    
+    def count_documents(self, query):
+        with self._lock:
+            return len(self._find_ids(query)[0])
+    
+    def update_one(self, query, update, upsert=False):
+        with self._lock:
+            doc_ids, _ = self._find_ids(query)
+            if doc_ids:
+                updated = dict(self._documents[doc_ids[0]])
+                self._apply_update(updated, update)
+                self._replace(doc_ids[0], updated)
+                return _result(matched_count=1, modified_count=1, upserted_id=None)
+            if upsert:
+                # New document from the query's equality fields plus the update
+                doc = {key: value for key, value in query.items() if not isinstance(value, dict)}
+                self._apply_update(doc, update, inserting=True)
+                self._add(doc)
+                upserted_id = doc.get('lot_id', doc.get('spot_id', doc.get('log_id')))
+                return _result(matched_count=0, modified_count=0, upserted_id=upserted_id)
+        return _result(matched_count=0, modified_count=0, upserted_id=None)
+    
+    def update_many(self, query, update):
+        with self._lock:
+            doc_ids, _ = self._find_ids(query)
+            for doc_id in doc_ids:
+                updated = dict(self._documents[doc_id])
+                self._apply_update(updated, update)
+                self._replace(doc_id, updated)
+        return _result(matched_count=len(doc_ids), modified_count=len(doc_ids), upserted_id=None)
+    
+    def find_one_and_update(self, query, update, upsert=False, return_document=False):
+        """Atomic update-or-insert; returns the document before (default) or after the update"""
+        with self._lock:
+            doc_ids, _ = self._find_ids(query)
+            before = dict(self._documents[doc_ids[0]]) if doc_ids else None
+            result = self.update_one(query, update, upsert=upsert)
+            if not return_document:
+                return before
+            if doc_ids:
+                return self._documents[doc_ids[0]]
+            return self.find_one(query) if result.upserted_id is not None else None
+    
+    def _apply_update(self, doc, update, inserting=False):
+        if '$set' in update:
+            doc.update(update['$set'])
+        if inserting and '$setOnInsert' in update:
+            doc.update(update['$setOnInsert'])
+        for key, value in update.get('$inc', {}).items():
+            doc[key] = doc.get(key, 0) + value
+        for key, value in update.get('$min', {}).items():
+            doc[key] = value if key not in doc else min(doc[key], value)
+        for key, value in update.get('$max', {}).items():
+            doc[key] = value if key not in doc else max(doc[key], value)
+    
+    def delete_many(self, query):
+        with self._lock:
+            doc_ids, _ = self._find_ids(query)
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+        return _result(deleted_count=len(doc_ids))
+    
+    def bulk_write(self, requests, ordered=True):
+        """Apply pymongo InsertOne/UpdateOne operations in order"""
+        counts = {'inserted_count': 0, 'matched_count': 0, 'modified_count': 0, 'upserted_count': 0}
+        for operation in requests:
+            if isinstance(operation, InsertOne):
+                self.insert_one(operation._doc)
+                counts['inserted_count'] += 1
+            elif isinstance(operation, UpdateOne):
+                result = self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+                counts['matched_count'] += result.matched_count
+                counts['modified_count'] += result.modified_count
+                counts['upserted_count'] += 1 if result.upserted_id is not None else 0
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation: {type(operation).__name__}")
+        return _result(**counts)
+    
+    def _matches_query(self, doc, query):
+        for key, value in query.items():
+            if isinstance(value, dict):
+                # Handle operators like $gte
+                if '$gte' in value:
+                    if key not in doc or doc[key] < value['$gte']:
+                        return False
+                if '$gt' in value:
+                    if key not in doc or doc[key] <= value['$gt']:
+                        return False
+                if '$lte' in value:
+                    if key not in doc or doc[key] > value['$lte']:
+                        return False
+                if '$lt' in value:
+                    if key not in doc or doc[key] >= value['$lt']:
+                        return False
+                if '$ne' in value:
+                    if doc.get(key) == value['$ne']:
+                        return False
+                if '$in' in value:
+                    if doc.get(key) not in value['$in']:
+                        return False
+                continue
+            if doc.get(key) != value:
+                return False
+        return True
+    
+    def aggregate(self, pipeline):
+        """Evaluate $match/$group/$sort/$limit stages; a leading $match uses the indexes"""
+        stages = list(pipeline)
+        query = stages.pop(0)['$match'] if stages and '$match' in stages[0] else None
+        return run_pipeline(self.find(query).data, stages, self._matches_query)
+
+class InMemoryQueryResult:
+    """Query result wrapper that supports sort(), limit() and iteration"""
+    
+    def __init__(self, data, ordered_by: Optional[str] = None):
+        self.data = data
+        # (field, direction) the data is already in, so sort() can skip work
+        self._order = (ordered_by, 1) if ordered_by else None
+    
+    def sort(self, field, direction=-1):
+        """Sort the results; free when they already come from an index in that order"""
+        if self._order == (field, direction):
+            return self
+        if self._order == (field, -direction):
+            self.data.reverse()
+        else:
+            self.data = sorted(self.data, key=lambda x: x.get(field, ''), reverse=(direction == -1))
+        self._order = (field, direction)
+        return self
+    
+    def limit(self, count):
+        if count:
+            self.data = self.data[:count]
+        return self
+    
+    def __iter__(self):
+        return iter(self.data)
+    
+    def __getitem__(self, index):
+        return self.data[index]
+    
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,161 @@
+"""
+Lot Status View
+Materialized latest status of every parking lot, updated as availability logs
+are written and served from a versioned process-local cache
+"""
+import threading
+import time
+import logging
+from typing import Dict, Iterable, Optional
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = ('lot_id', 'total_spaces', 'occupied_spaces', 'available_spaces',
+                 'occupancy_rate', 'cars_detected', 'last_updated', 'log_id')
+
+def status_from_log(log: Dict) -> Dict:
+    """Latest-status document for the lot of an availability log"""
+    return {
+        'lot_id': log['lot_id'],
+        'total_spaces': log.get('total_spaces', 0),
+        'occupied_spaces': log.get('occupied_spaces', 0),
+        'available_spaces': log.get('available_spaces', 0),
+        'occupancy_rate': log.get('occupancy_rate', 0),
+        'cars_detected': (log.get('detection_data') or {}).get('car_count', 0),
+        'last_updated': log.get('timestamp'),
+        'log_id': log.get('log_id')
+    }
+
+def _is_newer(status: Dict, current: Optional[Dict]) -> bool:
+    if current is None:
+        return True
+    if status.get('log_id') == current.get('log_id'):
+        return False
+    if current.get('last_updated') is None:
+        return True
+    return status.get('last_updated') is not None and status['last_updated'] >= current['last_updated']
+
+class LotStatusView:
+    """
+    One ``lot_status`` document per lot holding its latest counts.
+    
+    ``record`` updates the process-local cache as each log is queued and bumps
+    ``version``; the write-behind flush hook persists the latest status of the
+    lots in each written batch with one bulk upsert. Reads come from the
+    cache, which is loaded with a single query when cold or older than
+    ``refresh_interval`` seconds, so statuses written by other processes
+    show up. Lots without a status document (logged before the view existed)
+    are backfilled once from their latest raw log.
+    """
+    
+    def __init__(self, collection, raw_logs, refresh_interval: float = 5.0):
+        self.collection = collection
+        self.raw_logs = raw_logs
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self._statuses = {}
+        self._dirty = set()
+        self._backfilled = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.loads = 0
+    
+    def _store(self, status: Dict) -> bool:
+        """Cache ``status`` if it is newer than what is cached; call with the lock held"""
+        if not _is_newer(status, self._statuses.get(status['lot_id'])):
+            return False
+        self.version += 1
+        self._statuses[status['lot_id']] = dict(status, version=self.version)
+        return True
+    
+    def record(self, log: Dict) -> Dict:
+        """Apply a newly written availability log"""
+        status = status_from_log(log)
+        with self._lock:
+            if self._store(status):
+                self._dirty.add(status['lot_id'])
+            return dict(self._statuses[status['lot_id']])
+    
+    def on_flush(self, logs):
+        """Write-behind hook: persist the latest status of each lot in the batch"""
+        lot_ids = {log['lot_id'] for log in logs}
+        with self._lock:
+            lot_ids &= self._dirty
+            self._dirty -= lot_ids
+            statuses = [self._statuses[lot_id] for lot_id in lot_ids]
+        
+        operations = [
+            UpdateOne({'lot_id': status['lot_id']},
+                      {'$set': {field: status[field] for field in STATUS_FIELDS}},
+                      upsert=True)
+            for status in statuses
+        ]
+        if not operations:
+            return
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            with self._lock:
+                self._dirty |= lot_ids
+            raise
+    
+    def _load(self):
+        documents = list(self.collection.find({}))
+        with self._lock:
+            for document in documents:
+                if document.get('lot_id') not in self._dirty:
+                    self._store({field: document.get(field) for field in STATUS_FIELDS})
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+    
+    def _backfill(self, lot_ids: Iterable[str]):
+        for lot_id in lot_ids:
+            latest = list(self.raw_logs.find({'lot_id': lot_id}).sort('timestamp', -1).limit(1))
+            with self._lock:
+                self._backfilled.add(lot_id)
+                if not latest or not self._store(status_from_log(latest[0])):
+                    continue
+                status = self._statuses[lot_id]
+            self.collection.update_one({'lot_id': lot_id},
+                                       {'$set': {field: status[field] for field in STATUS_FIELDS}},
+                                       upsert=True)
+    
+    def all(self, lot_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """Latest status per lot, keyed by lot_id"""
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval
+        if stale:
+            self._load()
+        
+        if lot_ids is not None:
+            with self._lock:
+                missing = [lot_id for lot_id in lot_ids
+                           if lot_id not in self._statuses and lot_id not in self._backfilled]
+            if missing:
+                self._backfill(missing)
+        
+        with self._lock:
+            return {lot_id: dict(status) for lot_id, status in self._statuses.items()}
+    
+    def get(self, lot_id: str) -> Optional[Dict]:
+        return self.all([lot_id]).get(lot_id)
+    
+    def invalidate(self):
+        """Drop cached statuses and reload from the collection on next read (e.g. after a backend switch)"""
+        with self._lock:
+            # Unpersisted statuses belong to logs still queued for the new backend
+            self._statuses = {lot_id: status for lot_id, status in self._statuses.items()
+                              if lot_id in self._dirty}
+            self.version += 1
+            self._loaded_at = None
+            self._backfilled.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'version': self.version,
+                'lots': len(self._statuses),
+                'dirty': len(self._dirty),
+                'loads': self.loads
+            }
@@ -3,96 +3,326 @@ MongoDB Configuration and Connection Management
 Handles database connections, collections, and schemas for Sheridan Spot Smart
 """
 import os
+import time
+import atexit
+import threading
 from pymongo import MongoClient
 from datetime import datetime
+from typing import Callable, Dict
 import logging
+from database.in_memory_store import InMemoryCollection, RetentionPolicy
+from database.in_memory_persistence import create_persistence
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Index declarations shared by MongoDB and the in-memory fallback:
+# collection -> [(keys, unique)]
+COLLECTION_INDEXES = {
+    'parking_lots': [
+        ([('lot_id', 1)], True),
+        ([('name', 1)], True),
+        ([('location', 1)], False)
+    ],
+    'parking_spots': [
+        ([('spot_id', 1)], True),
+        ([('lot_id', 1)], False),
+        ([('lot_id', 1), ('spot_number', 1)], True)
+    ],
+    'availability_logs': [
+        ([('log_id', 1)], True),
+        ([('timestamp', 1)], False),
+        ([('lot_id', 1)], False),
+        ([('lot_id', 1), ('timestamp', -1)], False)
+    ],
+    'spot_logs': [
+        ([('log_id', 1)], True),
+        ([('lot_id', 1), ('timestamp', -1)], False),
+        ([('spot_id', 1), ('timestamp', -1)], False)
+    ],
+    'lot_status': [
+        ([('lot_id', 1)], True)
+    ]
+}
+
+# Occupancy rollups keep one document per lot and bucket
+for _granularity in ('minute', 'hour', 'day'):
+    COLLECTION_INDEXES[f'occupancy_rollups_{_granularity}'] = [([('lot_id', 1), ('bucket', 1)], True)]
+
+# Retention for the in-memory fallback, which has no disk to spill to.
+# Raw logs are already folded into the rollups as they are written.
+_LOG_TTL = float(os.getenv('IN_MEMORY_LOG_TTL_DAYS', os.getenv('RAW_LOG_RETENTION_DAYS', 30))) * 86400
+_MAX_LOGS = int(os.getenv('IN_MEMORY_MAX_LOGS', 100000))
+IN_MEMORY_RETENTION = {
+    'availability_logs': RetentionPolicy(ttl=_LOG_TTL, max_documents=_MAX_LOGS),
+    'spot_logs': RetentionPolicy(ttl=_LOG_TTL, max_documents=_MAX_LOGS),
+    # Minute buckets only serve windows of a few hours
+    'occupancy_rollups_minute': RetentionPolicy(ttl=7 * 86400, field='bucket')
+}
+
+STATE_CONNECTING = 'connecting'
+STATE_CONNECTED = 'connected'
+STATE_UNAVAILABLE = 'unavailable'
+
+class CollectionProxy:
+    """
+    Stable collection handle that forwards to MongoDB while it is connected
+    and to the in-memory store otherwise, so long-lived components follow
+    the manager when it switches backends at runtime
+    """
+    
+    def __init__(self, manager, collection_name):
+        self._manager = manager
+        self.collection_name = collection_name
+    
+    @property
+    def target(self):
+        return self._manager.backend_collection(self.collection_name)
+    
+    def __getattr__(self, attribute):
+        return getattr(self.target, attribute)
+    
+    def __repr__(self):
+        return f"CollectionProxy({self.collection_name!r} -> {self._manager.backend})"
+
 class MongoDBManager:
+    """
+    Owns the MongoDB connection and the in-memory fallback.
+    
+    Nothing blocks at import: a background thread connects with a short
+    server-selection timeout, creates indexes, then pings every
+    ``health_interval`` seconds. While MongoDB is unreachable, collections
+    resolve to the in-memory store and the thread retries with exponential
+    backoff from ``retry_min`` up to ``retry_max`` seconds.
+    """
+    
     def __init__(self):
         # MongoDB connection string - uses environment variable or local MongoDB
         self.connection_string = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
         self.database_name = os.getenv('DATABASE_NAME', 'sheridan_spot_smart')
+        self.timeout_ms = int(os.getenv('MONGODB_TIMEOUT_MS', 2000))
+        self.health_interval = float(os.getenv('MONGODB_HEALTH_INTERVAL', 10))
+        self.retry_min = float(os.getenv('MONGODB_RETRY_MIN', 1))
+        self.retry_max = float(os.getenv('MONGODB_RETRY_MAX', 60))
         self.client = None
         self.db = None
-        # In-memory storage fallback
-        self.in_memory_storage = {
-            'parking_lots': [],
-            'parking_spots': [],
-            'availability_logs': []
-        }
-        self.connect()
+        self.state = STATE_CONNECTING
+        self.last_error = None
+        self.connect_attempts = 0
+        self.connected_since = None
+        self._next_retry_at = None
+        self._proxies = {}
+        self._mongo_collections = {}
+        self._switch_listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        # In-memory storage fallback: one indexed collection per name
+        self.in_memory_storage = {}
+        self.persistence = None
+        # The fallback serves requests until MongoDB is reachable, so recover it first
+        self.enable_persistence()
+        self.start()
     
-    def connect(self):
-        """Establish MongoDB connection"""
+    @property
+    def backend(self) -> str:
+        return 'mongodb' if self.db is not None else 'in_memory'
+    
+    def start(self):
+        """Start the background connect / health-check thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._connection_loop, daemon=True, name='mongodb-connection')
+        self._thread.start()
+    
+    def add_switch_listener(self, listener: Callable[[str], None]):
+        """Call ``listener(backend)`` whenever collections switch between MongoDB and memory"""
+        self._switch_listeners.append(listener)
+    
+    def _switched(self):
+        for listener in self._switch_listeners:
+            try:
+                listener(self.backend)
+            except Exception as e:
+                logger.error(f"Backend switch listener failed: {e}")
+    
+    def connect(self) -> bool:
+        """One bounded connection attempt; switches collections to MongoDB on success"""
+        self.connect_attempts += 1
         try:
-            self.client = MongoClient(self.connection_string)
-            self.db = self.client[self.database_name]
+            if self.client is None:
+                self.client = MongoClient(self.connection_string,
+                                          serverSelectionTimeoutMS=self.timeout_ms,
+                                          connectTimeoutMS=self.timeout_ms)
             
             # Test connection
             self.client.admin.command('ping')
-            logger.info(f"Connected to MongoDB: {self.database_name}")
+            db = self.client[self.database_name]
             
-            # Initialize collections
-            self.init_collections()
+            # Initialize collections before any request is routed to them
+            self.init_collections(db)
             
         except Exception as e:
-            logger.error(f"MongoDB connection failed: {e}")
-            # Fall back to in-memory storage for development
-            self.db = None
+            self._mark_unavailable(e)
+            return False
+        
+        self._mongo_collections = {}
+        self.db = db
+        self.state = STATE_CONNECTED
+        self.connected_since = datetime.utcnow()
+        self.last_error = None
+        logger.info(f"Connected to MongoDB: {self.database_name}")
+        self._switched()
+        return True
+    
+    def _mark_unavailable(self, error: Exception):
+        was_connected = self.db is not None
+        first_failure = self.state != STATE_UNAVAILABLE
+        # Fall back to in-memory storage
+        self.db = None
+        self.state = STATE_UNAVAILABLE
+        self.connected_since = None
+        self.last_error = str(error)
+        if first_failure:
+            logger.error(f"MongoDB connection failed, using in-memory storage: {error}")
+        else:
+            logger.debug(f"MongoDB still unavailable: {error}")
+        if was_connected:
+            self._switched()
+    
+    def _connection_loop(self):
+        delay = self.retry_min
+        while not self._stop.is_set():
+            if self.db is None:
+                if self.connect():
+                    delay = self.retry_min
+                    continue
+                self._next_retry_at = time.time() + delay
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.retry_max)
+            else:
+                self._next_retry_at = None
+                if self._stop.wait(self.health_interval):
+                    return
+                try:
+                    self.client.admin.command('ping')
+                except Exception as e:
+                    self._mark_unavailable(e)
+    
+    def wait_until_connected(self, timeout: float) -> bool:
+        """Block up to ``timeout`` seconds for MongoDB (scripts that must not use the fallback)"""
+        deadline = time.monotonic() + timeout
+        while self.db is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.db is not None
+    
+    def enable_persistence(self):
+        """Replay and journal the in-memory store when IN_MEMORY_DATA_DIR is set"""
+        if self.persistence is not None:
+            return
+        persistence = create_persistence()
+        if persistence is None:
+            return
+        try:
+            persistence.recover(self._in_memory_collection)
+        except Exception as e:
+            logger.error(f"In-memory store recovery failed: {e}")
+            return
+        for collection in list(self.in_memory_storage.values()):
+            persistence.attach(collection)
+        self.persistence = persistence
+        atexit.register(persistence.close)
     
-    def init_collections(self):
+    def init_collections(self, db=None):
         """Initialize MongoDB collections with indexes"""
-        if not self.db:
+        db = db if db is not None else self.db
+        if db is None:
             return
             
         # Create collections
-        collections = ['parking_lots', 'parking_spots', 'availability_logs']
-        for collection_name in collections:
-            if collection_name not in self.db.list_collection_names():
-                self.db.create_collection(collection_name)
+        existing = set(db.list_collection_names())
+        for collection_name in COLLECTION_INDEXES:
+            if collection_name not in existing:
+                db.create_collection(collection_name)
                 logger.info(f"Created collection: {collection_name}")
         
         # Create indexes for better performance
-        self.create_indexes()
+        self.create_indexes(db)
     
-    def create_indexes(self):
+    def create_indexes(self, db=None):
         """Create database indexes for optimal performance"""
-        try:
-            # ParkingLots indexes
-            self.db.parking_lots.create_index("lot_id", unique=True)
-            self.db.parking_lots.create_index("location")
-            
-            # ParkingSpots indexes  
-            self.db.parking_spots.create_index("spot_id", unique=True)
-            self.db.parking_spots.create_index("lot_id")
-            self.db.parking_spots.create_index([("lot_id", 1), ("spot_number", 1)], unique=True)
-            
-            # AvailabilityLogs indexes
-            self.db.availability_logs.create_index("timestamp")
-            self.db.availability_logs.create_index("lot_id")
-            self.db.availability_logs.create_index([("lot_id", 1), ("timestamp", -1)])
-            
+        db = db if db is not None else self.db
+        failed = 0
+        for collection_name, indexes in COLLECTION_INDEXES.items():
+            for keys, unique in indexes:
+                # One bad index (e.g. duplicates in existing data) should not skip the rest
+                try:
+                    db[collection_name].create_index(keys, unique=unique)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error creating index {keys} on {collection_name}: {e}")
+        
+        if not failed:
             logger.info("Database indexes created successfully")
-            
-        except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
     
     def get_collection(self, collection_name):
-        """Get a specific collection or in-memory storage"""
-        if self.db:
-            return self.db[collection_name]
-        # Return in-memory collection wrapper
-        return InMemoryCollection(self.in_memory_storage, collection_name)
+        """Get a handle that follows the current backend (MongoDB or in-memory storage)"""
+        proxy = self._proxies.get(collection_name)
+        if proxy is None:
+            proxy = self._proxies.setdefault(collection_name, CollectionProxy(self, collection_name))
+        return proxy
+    
+    def backend_collection(self, collection_name):
+        """The concrete collection for the current backend"""
+        db = self.db
+        if db is None:
+            return self._in_memory_collection(collection_name)
+        collection = self._mongo_collections.get(collection_name)
+        if collection is None:
+            collection = self._mongo_collections[collection_name] = db[collection_name]
+        return collection
+    
+    def _in_memory_collection(self, collection_name):
+        """In-memory collection, created with the same indexes on first use"""
+        collection = self.in_memory_storage.get(collection_name)
+        if collection is None:
+            collection = self.in_memory_storage.setdefault(collection_name, InMemoryCollection(
+                collection_name, COLLECTION_INDEXES.get(collection_name, ()), IN_MEMORY_RETENTION.get(collection_name)))
+            if self.persistence is not None:
+                self.persistence.attach(collection)
+        return collection
+    
+    def status(self) -> Dict:
+        """Connection state for health reporting"""
+        retry_at = self._next_retry_at
+        return {
+            'state': self.state,
+            'backend': self.backend,
+            'database': self.database_name,
+            'connect_attempts': self.connect_attempts,
+            'connected_since': self.connected_since.isoformat() if self.connected_since else None,
+            'last_error': self.last_error,
+            'next_retry_in': round(max(0.0, retry_at - time.time()), 1) if retry_at and self.db is None else None
+        }
+    
+    def in_memory_stats(self):
+        """Document counts, evictions and persistence state of the in-memory fallback"""
+        if self.db is not None:
+            return None
+        return {
+            'collections': {name: collection.stats() for name, collection in list(self.in_memory_storage.items())},
+            'persistence': self.persistence.stats() if self.persistence is not None else None
+        }
     
     def close_connection(self):
         """Close MongoDB connection"""
+        self._stop.set()
         if self.client:
             self.client.close()
             logger.info("MongoDB connection closed")
+        if self.persistence is not None:
+            self.persistence.close()
 
 # Global MongoDB manager instance
 mongodb_manager = MongoDBManager()
@@ -104,81 +334,3 @@ def get_db():
 def get_collection(collection_name):
     """Get specific collection"""
     return mongodb_manager.get_collection(collection_name)
-
-class InMemoryCollection:
-    """In-memory collection fallback for when MongoDB is unavailable"""
-    def __init__(self, storage, collection_name):
-        self.storage = storage
-        self.collection_name = collection_name
-        if collection_name not in self.storage:
-            self.storage[collection_name] = []
-    
-    def insert_one(self, document):
-        self.storage[self.collection_name].append(document)
-        return type('obj', (object,), {'inserted_id': document.get('lot_id', document.get('spot_id', document.get('log_id')))})()
-    
-    def insert_many(self, documents):
-        self.storage[self.collection_name].extend(documents)
-        return type('obj', (object,), {'inserted_ids': [d.get('lot_id', d.get('spot_id', d.get('log_id'))) for d in documents]})()
-    
-    def find(self, query=None):
-        data = self.storage[self.collection_name][:]  # Create a copy
-        if query:
-            filtered = []
-            for doc in data:
-                if self._matches_query(doc, query):
-                    filtered.append(doc)
-            data = filtered
-        # Return an InMemoryQueryResult that supports sort()
-        return InMemoryQueryResult(data)
-    
-    def sort(self, field, direction=-1):
-        """Chainable sort method"""
-        return self
-    
-    def find_one(self, query):
-        results = self.find(query)
-        return results[0] if results else None
-    
-    def update_one(self, query, update):
-        for i, doc in enumerate(self.storage[self.collection_name]):
-            if self._matches_query(doc, query):
-                if '$set' in update:
-                    doc.update(update['$set'])
-                return type('obj', (object,), {'modified_count': 1})()
-        return type('obj', (object,), {'modified_count': 0})()
-    
-    def _matches_query(self, doc, query):
-        for key, value in query.items():
-            if isinstance(value, dict):
-                # Handle operators like $gte
-                if '$gte' in value:
-                    if doc.get(key, '') < value['$gte']:
-                        return False
-                continue
-            if doc.get(key) != value:
-                return False
-        return True
-    
-    def aggregate(self, pipeline):
-        # Basic aggregation support
-        return []
-
-class InMemoryQueryResult:
-    """Query result wrapper that supports sort() and iteration"""
-    def __init__(self, data):
-        self.data = data
-    
-    def sort(self, field, direction=-1):
-        """Sort the results"""
-        self.data = sorted(self.data, key=lambda x: x.get(field, ''), reverse=(direction == -1))
-        return self
-    
-    def __iter__(self):
-        return iter(self.data)
-    
-    def __getitem__(self, index):
-        return self.data[index]
-    
-    def __len__(self):
-        return len(self.data)
\ No newline at end of file
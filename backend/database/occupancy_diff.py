@@ -0,0 +1,121 @@
+"""
+Occupancy Diff Engine
+Compares each analysis with the last persisted spot states and writes only the
+spots that changed, as one bulk upsert plus matching spot-change logs
+"""
+import threading
+import logging
+from typing import Dict
+from pymongo import UpdateOne
+from .models import ParkingSpotModel, AvailabilityLogModel
+
+logger = logging.getLogger(__name__)
+
+# Fields owned by the occupancy update; everything else from a new spot
+# document is only written when the upsert inserts
+OCCUPANCY_FIELDS = ('is_occupied', 'last_updated', 'detection_confidence', 'occupancy_state')
+
+class OccupancyDiffEngine:
+    """
+    Per-lot cache of persisted spot states keyed by spot number.
+    
+    The cache is seeded from the spots collection the first time a lot is
+    seen. ``apply`` turns the spots whose state differs into ``UpdateOne``
+    upserts on (lot_id, spot_number), sends them in a single ``bulk_write``
+    and inserts one spot log per change. Unchanged analyses cost no writes.
+    """
+    
+    def __init__(self, spots_collection, spot_logs_collection):
+        self.spots = spots_collection
+        self.spot_logs = spot_logs_collection
+        self._states = {}
+        self._lock = threading.Lock()
+        
+        self.analyses = 0
+        self.spots_written = 0
+        self.logs_written = 0
+    
+    def _known_states(self, lot_id: str) -> Dict:
+        known = self._states.get(lot_id)
+        if known is None:
+            known = {}
+            for spot in self.spots.find({'lot_id': lot_id}):
+                state = spot.get('occupancy_state') or ('occupied' if spot.get('is_occupied') else 'free')
+                known[spot.get('spot_number')] = (state, spot.get('spot_id'))
+            self._states[lot_id] = known
+        return known
+    
+    def apply(self, lot_id: str, space_states: Dict, confidence: float = 0.95) -> Dict:
+        """
+        Persist ``space_states`` ({spot_number: 'free' | 'occupied' | 'partially_free'});
+        returns counts of changed spots and written logs
+        """
+        with self._lock:
+            self.analyses += 1
+            known = self._known_states(lot_id)
+            operations = []
+            spot_logs = []
+            changes = {}
+            
+            for spot_number, state in space_states.items():
+                previous = known.get(spot_number)
+                if previous is not None and previous[0] == state:
+                    continue
+                
+                is_occupied = state == 'occupied'
+                if previous is not None and previous[1]:
+                    spot_id = previous[1]
+                    on_insert = {}
+                else:
+                    on_insert = ParkingSpotModel.create_spot(lot_id, spot_number)
+                    spot_id = on_insert['spot_id']
+                
+                update_data = ParkingSpotModel.update_occupancy(spot_id, is_occupied, confidence)
+                update_data['occupancy_state'] = state
+                update = {'$set': update_data}
+                on_insert = {key: value for key, value in on_insert.items() if key not in OCCUPANCY_FIELDS}
+                if on_insert:
+                    update['$setOnInsert'] = on_insert
+                operations.append(UpdateOne({'lot_id': lot_id, 'spot_number': spot_number}, update, upsert=True))
+                
+                spot_log = AvailabilityLogModel.create_spot_log(spot_id, lot_id, is_occupied, confidence)
+                spot_log.update({
+                    'spot_number': spot_number,
+                    'occupancy_state': state,
+                    'previous_state': previous[0] if previous else None
+                })
+                if previous is None:
+                    spot_log['change_type'] = 'initial_state'
+                spot_logs.append(spot_log)
+                changes[spot_number] = (state, spot_id)
+            
+            if not operations:
+                return {'changed_spots': 0, 'spot_logs': 0}
+            
+            # Only remember the new states once the write has succeeded, so a
+            # failed batch is retried on the next analysis
+            self.spots.bulk_write(operations, ordered=False)
+            self.spot_logs.insert_many(spot_logs, ordered=False)
+            known.update(changes)
+            
+            self.spots_written += len(operations)
+            self.logs_written += len(spot_logs)
+            logger.info(f"Persisted {len(operations)} spot changes for lot {lot_id}")
+            return {'changed_spots': len(operations), 'spot_logs': len(spot_logs)}
+    
+    def invalidate(self, lot_id: str = None):
+        """Forget cached states so they are re-read from the database"""
+        with self._lock:
+            if lot_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(lot_id, None)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'lots_tracked': len(self._states),
+                'analyses': self.analyses,
+                'spots_written': self.spots_written,
+                'spot_logs_written': self.logs_written
+            }
@@ -0,0 +1,170 @@
+"""
+Occupancy Rollups
+Pre-aggregated per-lot occupancy at minute, hour and day granularity, kept up
+to date incrementally as availability logs are written
+"""
+import os
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('minute', 'hour', 'day')
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_collection_name(granularity: str) -> str:
+    return f'occupancy_rollups_{granularity}'
+
+class OccupancyRollups:
+    """
+    One document per (lot_id, bucket) in each granularity holding count, sum,
+    min, max and last occupancy rate.
+    
+    Written with ``$inc``/``$min``/``$max`` upserts, one per lot and bucket per
+    batch, so stats queries read a handful of buckets instead of scanning raw
+    logs. Raw logs older than ``retention_days`` are compacted away; any not
+    flagged ``rolled_up`` (written before rollups existed, or whose rollup
+    failed) are folded in first.
+    """
+    
+    def __init__(self, collections: Dict, raw_logs, retention_days: int = 30,
+                 compaction_interval: float = 3600.0):
+        self.collections = collections
+        self.raw_logs = raw_logs
+        self.retention_days = retention_days
+        self.compaction_interval = compaction_interval
+        self._last_compaction = time.monotonic()
+        self._compaction_lock = threading.Lock()
+    
+    def apply_logs(self, logs: List[Dict]):
+        """Fold a batch of availability logs into every granularity"""
+        for granularity in GRANULARITIES:
+            groups = {}
+            for log in logs:
+                key = (log['lot_id'], bucket_start(log['timestamp'], granularity))
+                rate = log.get('occupancy_rate', 0)
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = {'count': 1, 'sum': rate, 'min': rate, 'max': rate,
+                                   'last': rate, 'last_timestamp': log['timestamp']}
+                    continue
+                group['count'] += 1
+                group['sum'] += rate
+                group['min'] = min(group['min'], rate)
+                group['max'] = max(group['max'], rate)
+                if log['timestamp'] >= group['last_timestamp']:
+                    group['last'] = rate
+                    group['last_timestamp'] = log['timestamp']
+            
+            operations = [
+                UpdateOne(
+                    {'lot_id': lot_id, 'bucket': bucket},
+                    {
+                        '$inc': {'count': group['count'], 'sum_occupancy_rate': group['sum']},
+                        '$min': {'min_occupancy_rate': group['min']},
+                        '$max': {'max_occupancy_rate': group['max']},
+                        '$set': {'last_occupancy_rate': group['last'], 'last_timestamp': group['last_timestamp']}
+                    },
+                    upsert=True
+                )
+                for (lot_id, bucket), group in groups.items()
+            ]
+            if operations:
+                self.collections[granularity].bulk_write(operations, ordered=False)
+    
+    def on_flush(self, logs: List[Dict]):
+        """Write-behind hook: roll up the batch, and compact raw logs when due"""
+        self.apply_logs(logs)
+        # Only now are these logs safe to delete at compaction without a backfill;
+        # if the rollup failed or never ran, compaction folds them in first
+        self.raw_logs.update_many({'log_id': {'$in': [log['log_id'] for log in logs]}},
+                                  {'$set': {'rolled_up': True}})
+        if time.monotonic() - self._last_compaction >= self.compaction_interval:
+            self.compact()
+    
+    def compact(self, retention_days: Optional[int] = None) -> Dict:
+        """Fold not-yet-rolled-up old raw logs into the rollups, then delete them"""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        
+        with self._compaction_lock:
+            self._last_compaction = time.monotonic()
+            backfill = list(self.raw_logs.find({'timestamp': {'$lt': cutoff}, 'rolled_up': {'$ne': True}}))
+            if backfill:
+                self.apply_logs(backfill)
+            result = self.raw_logs.delete_many({'timestamp': {'$lt': cutoff}})
+        
+        deleted = result.deleted_count
+        if deleted:
+            logger.info(f"Compacted {deleted} availability logs older than {retention_days} days "
+                        f"({len(backfill)} backfilled into rollups)")
+        return {'deleted_logs': deleted, 'backfilled_logs': len(backfill), 'cutoff': cutoff.isoformat()}
+    
+    @staticmethod
+    def choose_granularity(since: datetime) -> str:
+        """Coarsest granularity whose buckets still resolve the window"""
+        span = datetime.utcnow() - since
+        return 'minute' if span <= timedelta(hours=6) else 'hour' if span <= timedelta(days=31) else 'day'
+    
+    @staticmethod
+    def stats_pipeline(lot_id: str, since: datetime, granularity: str) -> List[Dict]:
+        return [
+            {
+                '$match': {
+                    'lot_id': lot_id,
+                    'bucket': {'$gte': bucket_start(since, granularity)}
+                }
+            },
+            {
+                '$group': {
+                    '_id': None,
+                    'count': {'$sum': '$count'},
+                    'total': {'$sum': '$sum_occupancy_rate'},
+                    'min': {'$min': '$min_occupancy_rate'},
+                    'max': {'$max': '$max_occupancy_rate'}
+                }
+            }
+        ]
+    
+    @staticmethod
+    def stats_from_result(result: List[Dict], granularity: str) -> Dict:
+        if not result or not result[0]['count']:
+            return {}
+        
+        totals = result[0]
+        return {
+            '_id': None,
+            'avg_occupancy_rate': totals['total'] / totals['count'],
+            'max_occupancy_rate': totals['max'],
+            'min_occupancy_rate': totals['min'],
+            'total_entries': totals['count'],
+            'granularity': granularity
+        }
+    
+    def stats(self, lot_id: str, since: datetime, granularity: Optional[str] = None) -> Dict:
+        """
+        Occupancy stats since ``since`` from the coarsest rollup that still fits
+        the window; the first bucket may start up to one bucket before ``since``
+        """
+        granularity = granularity or self.choose_granularity(since)
+        result = list(self.collections[granularity].aggregate(self.stats_pipeline(lot_id, since, granularity)))
+        return self.stats_from_result(result, granularity)
+
+def create_rollups(get_collection, raw_logs) -> OccupancyRollups:
+    return OccupancyRollups(
+        {granularity: get_collection(rollup_collection_name(granularity)) for granularity in GRANULARITIES},
+        raw_logs,
+        retention_days=int(os.getenv('RAW_LOG_RETENTION_DAYS', 30)),
+        compaction_interval=float(os.getenv('RAW_LOG_COMPACTION_INTERVAL', 3600))
+    )
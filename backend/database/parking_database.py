@@ -2,11 +2,20 @@
 Database Operations for Parking Management
 Handles all CRUD operations for parking lots, spots, and availability logs
 """
+import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import logging
-from .mongodb_config import get_collection, get_db
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .mongodb_config import get_collection, get_db, mongodb_manager
 from .models import ParkingLotModel, ParkingSpotModel, AvailabilityLogModel
+from .write_behind import WriteBehindBuffer, register_buffer
+from .occupancy_diff import OccupancyDiffEngine
+from .occupancy_rollups import create_rollups
+from .lot_status import LotStatusView
+from monitoring.metrics import timed_stage
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +23,49 @@ class ParkingDatabase:
     """Database operations for parking management"""
     
     def __init__(self):
-        self.db = get_db()
+        # Collection handles follow the manager between MongoDB and the in-memory store
         self.parking_lots = get_collection('parking_lots')
         self.parking_spots = get_collection('parking_spots')
         self.availability_logs = get_collection('availability_logs')
+        self.spot_logs = get_collection('spot_logs')
+        self.occupancy_diff = OccupancyDiffEngine(self.parking_spots, self.spot_logs)
+        
+        # Lot registry: lots are looked up on every analysis but almost never change
+        self._lots_by_id = {}
+        self._lots_by_name = {}
+        self._lot_lock = threading.Lock()
+        
+        # Availability logs are append-only, so they are batched off the request path
+        self.availability_log_writer = register_buffer(WriteBehindBuffer(
+            self.availability_logs, 'availability_logs',
+            batch_size=int(os.getenv('LOG_BATCH_SIZE', 100)),
+            flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', 1.0)),
+            max_pending=int(os.getenv('LOG_MAX_PENDING', 10000))
+        ))
+        
+        # Minute/hour/day rollups are updated from each written batch
+        self.rollups = create_rollups(get_collection, self.availability_logs)
+        self.availability_log_writer.add_flush_hook(self.rollups.on_flush)
+        
+        # Latest status per lot, so listing lots never reads raw logs
+        self.lot_status = LotStatusView(get_collection('lot_status'), self.availability_logs,
+                                        refresh_interval=float(os.getenv('LOT_STATUS_REFRESH', 5.0)))
+        self.availability_log_writer.add_flush_hook(self.lot_status.on_flush)
+        
+        mongodb_manager.add_switch_listener(self._on_backend_switch)
+    
+    @property
+    def db(self):
+        return get_db()
+    
+    def _on_backend_switch(self, backend: str):
+        """Cached lots and spot states belong to the previous backend"""
+        with self._lot_lock:
+            self._lots_by_id.clear()
+            self._lots_by_name.clear()
+        self.occupancy_diff.invalidate()
+        self.lot_status.invalidate()
+        logger.info(f"Parking database now using {backend} storage")
     
     # ============ PARKING LOTS OPERATIONS ============
     
@@ -27,9 +75,10 @@ class ParkingDatabase:
         try:
             lot_data = ParkingLotModel.create_lot(name, location, total_spaces, coordinates)
             
-            if self.parking_lots:
+            if self.parking_lots is not None:
                 result = self.parking_lots.insert_one(lot_data)
                 lot_data['_id'] = str(result.inserted_id)
+                self._cache_lot(lot_data)
                 logger.info(f"Created parking lot: {lot_data['lot_id']}")
             else:
                 # Fallback for development without MongoDB
@@ -41,11 +90,55 @@ class ParkingDatabase:
             logger.error(f"Error creating parking lot: {e}")
             raise
     
+    @timed_stage('database', 'lot_lookup')
+    def get_or_create_parking_lot(self, name: str, location: str, total_spaces: int,
+                                  coordinates: Dict = None) -> Dict:
+        """Resolve a lot by name from the registry, creating it atomically on first use"""
+        lot = self._lots_by_name.get(name)
+        if lot is not None:
+            return lot
+        
+        try:
+            lot_data = ParkingLotModel.create_lot(name, location, total_spaces, coordinates)
+            
+            if self.parking_lots is None:
+                return lot_data
+            
+            # Upsert on the unique name index so concurrent first requests agree on one lot
+            try:
+                lot = self.parking_lots.find_one_and_update(
+                    {'name': name},
+                    {'$setOnInsert': lot_data},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Lost the upsert race to another process; the winner's lot now exists
+                lot = self.parking_lots.find_one({'name': name})
+            
+            if lot['lot_id'] == lot_data['lot_id']:
+                logger.info(f"Created parking lot: {lot['lot_id']}")
+            return self._cache_lot(lot)
+        
+        except Exception as e:
+            logger.error(f"Error resolving parking lot: {e}")
+            raise
+    
+    def _cache_lot(self, lot: Dict) -> Dict:
+        with self._lot_lock:
+            self._lots_by_id[lot['lot_id']] = lot
+            self._lots_by_name[lot['name']] = lot
+        return lot
+    
     def get_parking_lot(self, lot_id: str) -> Optional[Dict]:
         """Get parking lot by ID"""
         try:
-            if self.parking_lots:
-                return self.parking_lots.find_one({'lot_id': lot_id})
+            lot = self._lots_by_id.get(lot_id)
+            if lot is not None:
+                return lot
+            if self.parking_lots is not None:
+                lot = self.parking_lots.find_one({'lot_id': lot_id})
+                return self._cache_lot(lot) if lot else None
             return None
         except Exception as e:
             logger.error(f"Error getting parking lot: {e}")
@@ -54,8 +147,11 @@ class ParkingDatabase:
     def get_all_parking_lots(self) -> List[Dict]:
         """Get all parking lots"""
         try:
-            if self.parking_lots:
-                return list(self.parking_lots.find({'status': 'active'}))
+            if self.parking_lots is not None:
+                lots = list(self.parking_lots.find({'status': 'active'}))
+                for lot in lots:
+                    self._cache_lot(lot)
+                return lots
             return []
         except Exception as e:
             logger.error(f"Error getting all parking lots: {e}")
@@ -76,7 +172,7 @@ class ParkingDatabase:
                 )
                 created_spots.append(spot)
             
-            if self.parking_spots and created_spots:
+            if self.parking_spots is not None and created_spots:
                 result = self.parking_spots.insert_many(created_spots)
                 logger.info(f"Created {len(created_spots)} parking spots for lot {lot_id}")
             
@@ -92,7 +188,7 @@ class ParkingDatabase:
         try:
             update_data = ParkingSpotModel.update_occupancy(spot_id, is_occupied, confidence)
             
-            if self.parking_spots:
+            if self.parking_spots is not None:
                 result = self.parking_spots.update_one(
                     {'spot_id': spot_id},
                     {'$set': update_data}
@@ -100,6 +196,8 @@ class ParkingDatabase:
                 
                 if result.modified_count > 0:
                     logger.info(f"Updated spot {spot_id} occupancy: {is_occupied}")
+                    # The diff engine's cached state for this spot is now stale
+                    self.occupancy_diff.invalidate()
                     return True
             
             return False
@@ -108,10 +206,22 @@ class ParkingDatabase:
             logger.error(f"Error updating spot occupancy: {e}")
             return False
     
+    @timed_stage('database', 'spot_sync')
+    def sync_spot_occupancy(self, lot_id: str, space_states: Dict,
+                            confidence: float = 0.95) -> Dict:
+        """Persist per-space states from an analysis, writing only spots that changed"""
+        try:
+            if self.parking_spots is None:
+                return {'changed_spots': 0, 'spot_logs': 0}
+            return self.occupancy_diff.apply(lot_id, space_states, confidence)
+        except Exception as e:
+            logger.error(f"Error syncing spot occupancy: {e}")
+            return {'changed_spots': 0, 'spot_logs': 0, 'error': str(e)}
+    
     def get_lot_spots(self, lot_id: str) -> List[Dict]:
         """Get all parking spots for a specific lot"""
         try:
-            if self.parking_spots:
+            if self.parking_spots is not None:
                 return list(self.parking_spots.find({'lot_id': lot_id, 'status': 'active'}))
             return []
         except Exception as e:
@@ -121,7 +231,7 @@ class ParkingDatabase:
     def get_available_spots(self, lot_id: str) -> List[Dict]:
         """Get available (unoccupied) spots for a lot"""
         try:
-            if self.parking_spots:
+            if self.parking_spots is not None:
                 return list(self.parking_spots.find({
                     'lot_id': lot_id, 
                     'is_occupied': False,
@@ -134,8 +244,9 @@ class ParkingDatabase:
     
     # ============ AVAILABILITY LOGS OPERATIONS ============
     
+    @timed_stage('database', 'log_write')
     def log_availability_analysis(self, lot_id: str, analysis_data: Dict) -> Dict:
-        """Log parking availability analysis results"""
+        """Log parking availability analysis results (queued; written in the background)"""
         try:
             log_data = AvailabilityLogModel.create_log(
                 lot_id=lot_id,
@@ -145,10 +256,11 @@ class ParkingDatabase:
                 detection_data=analysis_data.get('detection_data')
             )
             
-            if self.availability_logs:
-                result = self.availability_logs.insert_one(log_data)
-                log_data['_id'] = str(result.inserted_id)
-                logger.info(f"Logged availability analysis for lot {lot_id}")
+            if self.availability_logs is not None:
+                # The rollup hook flags it rolled_up once the batch is in the rollups
+                self.availability_log_writer.add(log_data)
+                self.lot_status.record(log_data)
+                logger.debug(f"Queued availability analysis log for lot {lot_id}")
             
             return log_data
             
@@ -159,7 +271,9 @@ class ParkingDatabase:
     def get_recent_availability(self, lot_id: str, hours: int = 24) -> List[Dict]:
         """Get recent availability logs for a lot"""
         try:
-            if self.availability_logs:
+            if self.availability_logs is not None:
+                # Read-your-writes: push queued logs out before querying
+                self.availability_log_writer.flush()
                 since = datetime.utcnow() - timedelta(hours=hours)
                 return list(self.availability_logs.find({
                     'lot_id': lot_id,
@@ -170,38 +284,55 @@ class ParkingDatabase:
             logger.error(f"Error getting recent availability: {e}")
             return []
     
+    @timed_stage('database', 'lot_status_read')
+    def get_lot_statuses(self, lot_ids: List[str]) -> Dict[str, Dict]:
+        """Latest status per lot from the lot_status view, keyed by lot_id"""
+        try:
+            if self.availability_logs is None:
+                return {}
+            return self.lot_status.all(lot_ids)
+        except Exception as e:
+            logger.error(f"Error getting lot statuses: {e}")
+            return {}
+    
+    def lot_status_version(self) -> int:
+        """Changes whenever a cached lot status changes, including refreshes from other processes"""
+        return self.lot_status.version
+    
+    def get_lot_status(self, lot_id: str) -> Optional[Dict]:
+        """Latest status of one lot, or None if it has never been analyzed"""
+        return self.get_lot_statuses([lot_id]).get(lot_id)
+    
     def get_occupancy_stats(self, lot_id: str, days: int = 7) -> Dict:
         """Get occupancy statistics for a lot over specified days"""
         try:
-            if not self.availability_logs:
+            if self.availability_logs is None:
                 return {}
-                
-            since = datetime.utcnow() - timedelta(days=days)
             
-            pipeline = [
-                {
-                    '$match': {
-                        'lot_id': lot_id,
-                        'timestamp': {'$gte': since}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'avg_occupancy_rate': {'$avg': '$occupancy_rate'},
-                        'max_occupancy_rate': {'$max': '$occupancy_rate'},
-                        'min_occupancy_rate': {'$min': '$occupancy_rate'},
-                        'total_entries': {'$sum': 1}
-                    }
-                }
-            ]
-            
-            result = list(self.availability_logs.aggregate(pipeline))
-            return result[0] if result else {}
+            self.availability_log_writer.flush()
+            
+            # Served from the pre-aggregated rollups instead of scanning raw logs
+            since = datetime.utcnow() - timedelta(days=days)
+            return self.rollups.stats(lot_id, since)
             
         except Exception as e:
             logger.error(f"Error getting occupancy stats: {e}")
             return {}
+    
+    def compact_availability_logs(self, retention_days: int = None) -> Dict:
+        """Fold raw logs older than the retention window into the rollups and delete them"""
+        try:
+            if self.availability_logs is None:
+                return {}
+            self.availability_log_writer.flush()
+            return self.rollups.compact(retention_days)
+        except Exception as e:
+            logger.error(f"Error compacting availability logs: {e}")
+            return {'error': str(e)}
+    
+    def write_behind_stats(self) -> Dict:
+        """Queue depth and throughput of the background log writer"""
+        return self.availability_log_writer.stats()
 
 # Global database instance
 parking_db = ParkingDatabase()
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+Write-Behind Buffer
+Collects documents off the request path and writes them to a collection in
+batches with insert_many, flushing on a size or time threshold
+"""
+import atexit
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from pymongo.errors import BulkWriteError
+from monitoring.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+class WriteBehindBuffer:
+    """
+    Background batch writer for append-only documents.
+    
+    ``add`` only queues the document; a daemon thread flushes when
+    ``batch_size`` documents are pending or ``flush_interval`` seconds have
+    passed since the first pending one. ``max_pending`` bounds memory if the
+    database is unreachable: beyond it the oldest documents are dropped.
+    Flush hooks run with each batch after it has been written.
+    """
+    
+    def __init__(self, collection, name: str, batch_size: int = 100,
+                 flush_interval: float = 1.0, max_pending: int = 10000):
+        self.collection = collection
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        
+        self._pending = deque()
+        self._oldest_pending_at = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._hooks = []
+        self._thread = None
+        self._running = False
+        self._closed = False
+        
+        self.documents_written = 0
+        self.batches_written = 0
+        self.documents_dropped = 0
+        self.failed_flushes = 0
+        self.failed_hooks = 0
+        self.max_depth = 0
+        self.last_flush_seconds = 0.0
+        self.last_error = None
+    
+    def add_flush_hook(self, hook: Callable[[List[Dict]], None]):
+        """Run ``hook(batch)`` after every successfully written batch"""
+        self._hooks.append(hook)
+    
+    def add(self, document: Dict):
+        """Queue a document for the next batch; never touches the database"""
+        with self._condition:
+            if not self._running and not self._closed:
+                self._start()
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.documents_dropped += 1
+            if not self._pending:
+                self._oldest_pending_at = time.monotonic()
+            # Copy, so the driver adding _id does not mutate the caller's dict later
+            self._pending.append(dict(document))
+            self.max_depth = max(self.max_depth, len(self._pending))
+            # Wake the flusher to start its timer, or to write a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify()
+            closed = self._closed
+        
+        if closed:
+            # After shutdown there is no flusher thread; write through
+            self.flush()
+    
+    def _start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True,
+                                        name=f'write-behind-{self.name}')
+        self._thread.start()
+    
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while self._running and not self._due():
+                    if self._pending:
+                        wait = self.flush_interval - (time.monotonic() - self._oldest_pending_at)
+                        self._condition.wait(max(wait, 0.001))
+                    else:
+                        self._condition.wait()
+                if not self._running:
+                    return
+            self.flush()
+    
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        return (len(self._pending) >= self.batch_size or
+                time.monotonic() - self._oldest_pending_at >= self.flush_interval)
+    
+    def flush(self) -> int:
+        """Write everything pending now; returns the number of documents written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    if not self._pending:
+                        self._oldest_pending_at = None
+                        return written
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                    self._oldest_pending_at = time.monotonic() if self._pending else None
+                
+                started = time.perf_counter()
+                failed = []
+                try:
+                    with stage_timer('write_behind', f'flush_{self.name}'):
+                        self.collection.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Documents carry their _id from the first attempt, so a duplicate key
+                    # means an earlier attempt stored it (e.g. its reply was lost): written
+                    failed_indexes = {error['index'] for error in e.details.get('writeErrors', [])
+                                      if error.get('code') != DUPLICATE_KEY_ERROR}
+                    failed = [document for i, document in enumerate(batch) if i in failed_indexes]
+                    batch = [document for i, document in enumerate(batch) if i not in failed_indexes]
+                    if failed:
+                        self._flush_failed(failed, e)
+                except Exception as e:
+                    self._flush_failed(batch, e)
+                    return written
+                
+                self.last_flush_seconds = round(time.perf_counter() - started, 6)
+                if batch:
+                    self.documents_written += len(batch)
+                    self.batches_written += 1
+                    written += len(batch)
+                    
+                    for hook in self._hooks:
+                        try:
+                            hook(batch)
+                        except Exception as e:
+                            # The batch is stored; hooks must recover from what is in the collection
+                            self.failed_hooks += 1
+                            self.last_error = f"{getattr(hook, '__qualname__', hook)}: {e}"
+                            logger.exception(f"Write-behind hook for {self.name} failed on "
+                                             f"{len(batch)} documents: {e}")
+                
+                if failed:
+                    return written
+    
+    def _flush_failed(self, documents: List[Dict], error: Exception):
+        self._requeue(documents)
+        self.failed_flushes += 1
+        self.last_error = str(error)
+        logger.error(f"Write-behind flush to {self.name} failed for {len(documents)} documents: {error}")
+    
+    def _requeue(self, batch: List[Dict]):
+        """Put a failed batch back at the front, still honouring max_pending"""
+        with self._condition:
+            room = self.max_pending - len(self._pending)
+            keep = batch[-room:] if room > 0 else []
+            self.documents_dropped += len(batch) - len(keep)
+            self._pending.extendleft(reversed(keep))
+            if self._pending:
+                self._oldest_pending_at = time.monotonic()
+    
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stop the flusher thread and write whatever is still pending"""
+        with self._condition:
+            self._running = False
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush()
+    
+    def stats(self) -> Dict:
+        with self._condition:
+            depth = len(self._pending)
+            oldest = round(time.monotonic() - self._oldest_pending_at, 3) if self._oldest_pending_at and depth else 0.0
+        return {
+            'collection': self.name,
+            'queue_depth': depth,
+            'max_queue_depth': self.max_depth,
+            'oldest_pending_seconds': oldest,
+            'documents_written': self.documents_written,
+            'batches_written': self.batches_written,
+            'documents_dropped': self.documents_dropped,
+            'failed_flushes': self.failed_flushes,
+            'failed_hooks': self.failed_hooks,
+            'last_flush_seconds': self.last_flush_seconds,
+            'last_error': self.last_error,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval
+        }
+
+_buffers = []
+
+def register_buffer(buffer: WriteBehindBuffer) -> WriteBehindBuffer:
+    """Track a buffer so it is flushed when the process exits"""
+    _buffers.append(buffer)
+    return buffer
+
+@atexit.register
+def flush_all_buffers():
+    for buffer in _buffers:
+        try:
+            buffer.close()
+        except Exception as e:
+            logger.error(f"Final flush of {buffer.name} failed: {e}")
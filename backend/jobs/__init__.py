@@ -0,0 +1 @@
+# Background jobs package for Sheridan Spot Smart
\ No newline at end of file
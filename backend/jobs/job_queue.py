@@ -0,0 +1,225 @@
+"""
+Background Job Queue
+Runs long analyses outside the request thread with bounded concurrency,
+progress reporting and cancellation, using only in-process resources
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job has been cancelled"""
+
+class QueueFullError(Exception):
+    """Raised when the pending job limit has been reached"""
+
+class AnalysisJob:
+    """A unit of background work and its observable state"""
+    
+    def __init__(self, job_type: str, params: Dict):
+        self.job_id = str(uuid.uuid4())
+        self.job_type = job_type
+        self.params = params
+        self.status = JOB_QUEUED
+        self.progress = 0.0
+        self.stage = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+    
+    def update_progress(self, progress: float, stage: Optional[str] = None):
+        """Report progress (0.0 - 1.0); also a cancellation checkpoint"""
+        with self._lock:
+            self.progress = round(max(0.0, min(1.0, progress)), 3)
+            if stage:
+                self.stage = stage
+        self.check_cancelled()
+    
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+    
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.job_id)
+    
+    def cancel(self) -> bool:
+        """Request cancellation; returns False if the job already finished"""
+        with self._lock:
+            if self.status in FINISHED_STATES:
+                return False
+            self._cancel_event.set()
+            if self.status == JOB_QUEUED:
+                self._finish(JOB_CANCELLED)
+            return True
+    
+    def _start(self) -> bool:
+        with self._lock:
+            if self.status != JOB_QUEUED:
+                return False
+            self.status = JOB_RUNNING
+            self.stage = 'running'
+            self.started_at = datetime.utcnow()
+            return True
+    
+    def _finish(self, status: str, result: Dict = None, error: str = None):
+        self.status = status
+        self.stage = status
+        self.result = result
+        self.error = error
+        if status == JOB_COMPLETED:
+            self.progress = 1.0
+        self.finished_at = datetime.utcnow()
+    
+    def to_dict(self, include_result: bool = False) -> Dict:
+        with self._lock:
+            data = {
+                'job_id': self.job_id,
+                'job_type': self.job_type,
+                'status': self.status,
+                'progress': self.progress,
+                'stage': self.stage,
+                'error': self.error,
+                'created_at': self.created_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None
+            }
+            if include_result and self.status == JOB_COMPLETED:
+                data['result'] = self.result
+            return data
+
+class JobQueue:
+    """
+    Local worker pool backed by a bounded queue.
+    
+    ``max_workers`` caps how many jobs run at once and ``max_pending`` caps how
+    many may wait; submissions beyond that are rejected instead of queued.
+    Finished jobs are kept for ``result_ttl`` seconds so clients can fetch results.
+    """
+    
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, result_ttl: int = 3600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._handlers = {}
+        self._jobs = {}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._workers = []
+        self._lock = threading.Lock()
+    
+    def register(self, job_type: str, handler: Callable[[AnalysisJob], Dict]):
+        """Register the callable that executes jobs of ``job_type``"""
+        self._handlers[job_type] = handler
+    
+    def submit(self, job_type: str, params: Dict = None) -> AnalysisJob:
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        
+        job = AnalysisJob(job_type, params or {})
+        
+        with self._lock:
+            self._prune_finished()
+            self._ensure_workers()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+            self._jobs[job.job_id] = job
+        
+        logger.info(f"Queued {job_type} job {job.job_id}")
+        return job
+    
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job.cancel() if job else False
+    
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'active_workers': len([w for w in self._workers if w.is_alive()]),
+                'queue_depth': self._queue.qsize(),
+                'jobs_by_status': counts
+            }
+    
+    def _ensure_workers(self):
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f'job-worker-{len(self._workers) + 1}')
+            worker.start()
+            self._workers.append(worker)
+    
+    def _prune_finished(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at and job.finished_at.timestamp() < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+    
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+    
+    def _run(self, job: AnalysisJob):
+        if not job._start():
+            return  # cancelled while queued
+        
+        handler = self._handlers[job.job_type]
+        try:
+            result = handler(job)
+            with job._lock:
+                if job.is_cancelled():
+                    job._finish(JOB_CANCELLED)
+                else:
+                    job._finish(JOB_COMPLETED, result=result)
+        except JobCancelled:
+            with job._lock:
+                job._finish(JOB_CANCELLED)
+            logger.info(f"Cancelled job {job.job_id}")
+        except Exception as e:
+            with job._lock:
+                job._finish(JOB_FAILED, error=str(e))
+            logger.error(f"Job {job.job_id} failed: {e}")
+
+# Global job queue instance
+job_queue = JobQueue(
+    max_workers=int(os.getenv('JOB_WORKERS', 2)),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', 32)),
+    result_ttl=int(os.getenv('JOB_RESULT_TTL', 3600))
+)
@@ -0,0 +1 @@
+# Monitoring package for Sheridan Spot Smart
\ No newline at end of file
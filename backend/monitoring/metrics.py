@@ -0,0 +1,216 @@
+"""
+Pipeline Metrics
+In-process counters and latency histograms for the detection pipeline and
+the database layer, exposed in the Prometheus text format
+"""
+import math
+import time
+import threading
+import functools
+from bisect import bisect_left
+from typing import Dict, List, Sequence
+
+# Prometheus client defaults, extended upwards for multi-second inference on CPU
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+                   1.0, 2.5, 5.0, 7.5, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in values]
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram with optional labels.
+    
+    Each label set keeps per-bucket counts plus the running sum and count,
+    which is all the Prometheus format needs; observing is one bisect.
+    """
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Bucket counts, then sum and count
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def summary(self, **labels) -> Dict:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = list(self._series.get(key) or [])
+        if not series:
+            return {'count': 0, 'sum': 0.0}
+        return {'count': series[-1], 'sum': round(series[-2], 6)}
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        
+        lines = []
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+class MetricsRegistry:
+    """Named metrics rendered together as one Prometheus text exposition"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Global metrics registry instance
+metrics_registry = MetricsRegistry()
+
+STAGE_SECONDS = metrics_registry.histogram(
+    'parking_stage_duration_seconds',
+    'Time spent in one stage of the detection pipeline or database layer',
+    ('component', 'stage')
+)
+STAGE_ERRORS = metrics_registry.counter(
+    'parking_stage_errors_total',
+    'Pipeline stages that raised an exception',
+    ('component', 'stage')
+)
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route',
+    ('method', 'endpoint')
+)
+HTTP_REQUESTS = metrics_registry.counter(
+    'http_requests_total',
+    'HTTP requests by route and status code',
+    ('method', 'endpoint', 'status')
+)
+
+class StageTimer:
+    """
+    Context manager timing one pipeline stage into ``STAGE_SECONDS``.
+    
+    ``seconds`` holds the measured duration after the block exits, so callers
+    can also record it elsewhere (e.g. in an analysis log).
+    """
+    
+    __slots__ = ('component', 'stage', 'started', 'seconds')
+    
+    def __init__(self, component: str, stage: str):
+        self.component = component
+        self.stage = stage
+        self.started = None
+        self.seconds = 0.0
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(self.seconds, component=self.component, stage=self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(component=self.component, stage=self.stage)
+        return False
+
+def stage_timer(component: str, stage: str) -> StageTimer:
+    """Time a block: ``with stage_timer('yolo', 'inference'): ...``"""
+    return StageTimer(component, stage)
+
+def timed_stage(component: str, stage: str):
+    """Decorator timing every call of a function as one pipeline stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with StageTimer(component, stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe_request(method: str, endpoint: str, status: int, seconds: float):
+    HTTP_REQUEST_SECONDS.observe(seconds, method=method, endpoint=endpoint)
+    HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status=status)
@@ -0,0 +1,138 @@
+"""
+On-Demand Request Profiling
+Profiles individual requests with cProfile when asked to via a header or query
+parameter, writing one pstats file per request id. Disabled by default; when the
+PROFILING_ENABLED switch is off nothing is installed, so there is no overhead
+"""
+import os
+import re
+import glob
+import time
+import uuid
+import cProfile
+import threading
+import logging
+from typing import Callable, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+TRUTHY = ('1', 'true', 'yes', 'on')
+
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+class ProfilingMiddleware:
+    """
+    WSGI middleware that runs flagged requests under cProfile.
+    
+    A request is profiled when it sends ``X-Profile: <flag>`` or
+    ``?profile=<flag>``; with a ``token`` configured the flag must equal it.
+    The profile is written to ``<profile_dir>/<request id>.pstats`` and the
+    response carries ``X-Profile`` with that path. Only one request is
+    profiled at a time; concurrent flagged requests run unprofiled and get
+    ``X-Profile: busy``. Only the oldest files beyond ``max_files`` are removed.
+    """
+    
+    def __init__(self, wsgi_app: Callable, profile_dir: str = 'profiles',
+                 token: Optional[str] = None, max_files: int = 200):
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+        self.token = token
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self.profiles_written = 0
+        
+        os.makedirs(profile_dir, exist_ok=True)
+    
+    def _requested(self, environ) -> bool:
+        flag = environ.get('HTTP_X_PROFILE')
+        if flag is None:
+            values = parse_qs(environ.get('QUERY_STRING', '')).get(PROFILE_QUERY_PARAM)
+            flag = values[0] if values else None
+        if flag is None:
+            return False
+        if self.token:
+            return flag == self.token
+        return flag.lower() in TRUTHY
+    
+    @staticmethod
+    def _request_id(environ) -> str:
+        request_id = environ.get('HTTP_X_REQUEST_ID', '')
+        # Client-supplied ids become file names, so only safe ones are kept
+        if _REQUEST_ID_PATTERN.match(request_id):
+            return request_id
+        return uuid.uuid4().hex
+    
+    def __call__(self, environ, start_response):
+        if not self._requested(environ):
+            return self.wsgi_app(environ, start_response)
+        
+        request_id = self._request_id(environ)
+        
+        # cProfile cannot run two profilers at once reliably; never queue behind one
+        if not self._lock.acquire(blocking=False):
+            return self.wsgi_app(environ, self._with_headers(start_response, request_id, 'busy'))
+        
+        try:
+            path = os.path.join(self.profile_dir, f'{request_id}.pstats')
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                # Covers the view function; streamed bodies (SSE) are not consumed here
+                return self.wsgi_app(environ, self._with_headers(start_response, request_id, path))
+            finally:
+                profiler.disable()
+                self._write(profiler, path, environ, time.perf_counter() - started)
+        finally:
+            self._lock.release()
+    
+    @staticmethod
+    def _with_headers(start_response, request_id: str, profile: str):
+        def profiled_start_response(status, headers, exc_info=None):
+            headers = [(name, value) for name, value in headers
+                       if name.lower() not in ('x-profile', 'x-request-id')]
+            headers.append((PROFILE_HEADER, profile))
+            headers.append((REQUEST_ID_HEADER, request_id))
+            return start_response(status, headers, exc_info)
+        return profiled_start_response
+    
+    def _write(self, profiler: cProfile.Profile, path: str, environ, seconds: float):
+        try:
+            profiler.dump_stats(path)
+            self.profiles_written += 1
+            logger.info(f"Profiled {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')} "
+                        f"in {seconds:.3f}s -> {path}")
+            self._prune()
+        except Exception as e:
+            logger.error(f"Could not write profile {path}: {e}")
+    
+    def _prune(self):
+        files = glob.glob(os.path.join(self.profile_dir, '*.pstats'))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for stale in files[:len(files) - self.max_files]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+def install_profiler(app) -> Optional[ProfilingMiddleware]:
+    """Wrap the app for on-demand profiling if PROFILING_ENABLED is set"""
+    if os.getenv('PROFILING_ENABLED', '').lower() not in TRUTHY:
+        return None
+    
+    middleware = ProfilingMiddleware(
+        app.wsgi_app,
+        profile_dir=os.getenv('PROFILE_DIR', 'profiles'),
+        token=os.getenv('PROFILING_TOKEN') or None,
+        max_files=int(os.getenv('PROFILE_MAX_FILES', 200))
+    )
+    app.wsgi_app = middleware
+    logger.info(f"Request profiling enabled; profiles are written to {middleware.profile_dir}")
+    return middleware
@@ -0,0 +1 @@
+# Realtime push package for Sheridan Spot Smart
\ No newline at end of file
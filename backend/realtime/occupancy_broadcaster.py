@@ -0,0 +1,106 @@
+"""
+Occupancy Event Broadcaster
+Fans out lot occupancy updates and per-space transitions to Server-Sent Events
+subscribers; each update is serialized once and shared by every client
+"""
+import json
+import queue
+import threading
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """A single SSE client; holds pre-encoded events waiting to be sent"""
+    
+    def __init__(self, lot_id: Optional[str] = None, max_queue: int = 100):
+        self.lot_id = lot_id
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+    
+    def wants(self, lot_id: Optional[str]) -> bool:
+        return self.lot_id is None or lot_id is None or self.lot_id == lot_id
+    
+    def deliver(self, payload: bytes):
+        """Enqueue without blocking the publisher; slow clients lose their oldest events"""
+        while True:
+            try:
+                self.queue.put_nowait(payload)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+class OccupancyBroadcaster:
+    """Publish/subscribe hub for occupancy events"""
+    
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._event_id = 0
+        # Latest lot_update payload per lot, replayed to new subscribers
+        self._latest_lot_events = {}
+    
+    def subscribe(self, lot_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(lot_id, self.max_queue)
+        with self._lock:
+            self._subscribers.append(subscription)
+            for event_lot_id, payload in self._latest_lot_events.items():
+                if subscription.wants(event_lot_id):
+                    subscription.deliver(payload)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+    
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+    
+    def _encode(self, event: str, data: Dict) -> bytes:
+        self._event_id += 1
+        body = json.dumps(data, default=str, separators=(',', ':'))
+        return f"id: {self._event_id}\nevent: {event}\ndata: {body}\n\n".encode('utf-8')
+    
+    def publish(self, event: str, data: Dict, lot_id: Optional[str] = None) -> int:
+        """Serialize once and hand the same bytes to every matching subscriber"""
+        with self._lock:
+            payload = self._encode(event, data)
+            if event == 'lot_update' and lot_id:
+                self._latest_lot_events[lot_id] = payload
+            subscribers = [s for s in self._subscribers if s.wants(lot_id)]
+        
+        for subscription in subscribers:
+            subscription.deliver(payload)
+        return len(subscribers)
+    
+    def publish_analysis(self, lot_id: str, lot_stats: Dict, transitions: List[Dict], version: int):
+        """Publish a lot update plus the spaces whose state changed in this version"""
+        self.publish('lot_update', {'lot_id': lot_id, 'version': version, 'stats': lot_stats}, lot_id)
+        if transitions:
+            self.publish('space_transitions', {
+                'lot_id': lot_id,
+                'version': version,
+                'transitions': transitions
+            }, lot_id)
+
+# Global broadcaster instance
+occupancy_broadcaster = OccupancyBroadcaster()
+
+def space_states_from_results(results: Dict) -> Dict:
+    """Map space id -> state from a YOLO analysis response"""
+    states = {}
+    for space_id in results.get('free_space_list', []):
+        states[space_id] = 'free'
+    for space_id in results.get('partially_free_space_list', []):
+        states[space_id] = 'partially_free'
+    for space_id in results.get('occupied_space_list', []):
+        states[space_id] = 'occupied'
+    return states
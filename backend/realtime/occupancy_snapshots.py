@@ -0,0 +1,118 @@
+"""
+Versioned Occupancy Snapshots
+Keeps the latest per-space state of every lot with monotonically increasing
+versions so clients can fetch deltas and revalidate cached responses
+"""
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+class LotSnapshot:
+    """Latest occupancy of one lot; each space remembers the version it last changed in"""
+    
+    def __init__(self, lot_id: str):
+        self.lot_id = lot_id
+        self.version = 0
+        self.stats = {}
+        self.spaces = {}  # space_id -> {'state': str, 'version': int}
+        self.updated_at = None
+    
+    def space_states(self) -> Dict:
+        return {space_id: entry['state'] for space_id, entry in self.spaces.items()}
+
+class OccupancySnapshotStore:
+    """
+    Process-local store of lot snapshots.
+    
+    ``global_version`` increases whenever any lot changes and, together with
+    the per-process ``epoch``, identifies the state behind an ETag.
+    """
+    
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.global_version = 0
+        self._lots = {}
+        self._lock = threading.Lock()
+    
+    def apply(self, lot_id: str, space_states: Dict, stats: Dict) -> Tuple[int, List[Dict]]:
+        """
+        Record a new analysis for a lot. Returns the lot version and the list of
+        space transitions; the version only moves when something changed.
+        """
+        with self._lock:
+            snapshot = self._lots.get(lot_id)
+            if snapshot is None:
+                snapshot = self._lots[lot_id] = LotSnapshot(lot_id)
+            
+            transitions = []
+            for space_id, state in space_states.items():
+                previous = snapshot.spaces.get(space_id)
+                if previous is None or previous['state'] != state:
+                    transitions.append({
+                        'space_id': space_id,
+                        'from': previous['state'] if previous else None,
+                        'to': state
+                    })
+            removed = [space_id for space_id in snapshot.spaces if space_id not in space_states]
+            
+            stats_changed = self._comparable(stats) != self._comparable(snapshot.stats)
+            
+            if transitions or removed or stats_changed or snapshot.version == 0:
+                snapshot.version += 1
+                self.global_version += 1
+                for transition in transitions:
+                    snapshot.spaces[transition['space_id']] = {
+                        'state': transition['to'],
+                        'version': snapshot.version
+                    }
+                for space_id in removed:
+                    del snapshot.spaces[space_id]
+            
+            snapshot.stats = dict(stats, version=snapshot.version)
+            snapshot.updated_at = datetime.utcnow()
+            return snapshot.version, transitions
+    
+    @staticmethod
+    def _comparable(stats: Dict) -> Dict:
+        # Timestamps change on every analysis; only the counts define a new version
+        return {k: v for k, v in stats.items() if k not in ('last_updated', 'version')}
+    
+    def get(self, lot_id: str) -> Optional[LotSnapshot]:
+        with self._lock:
+            return self._lots.get(lot_id)
+    
+    def version(self, lot_id: str) -> int:
+        with self._lock:
+            snapshot = self._lots.get(lot_id)
+            return snapshot.version if snapshot else 0
+    
+    def delta(self, lot_id: str, since: int) -> Dict:
+        """Spaces whose state changed after ``since``; a full listing if ``since`` is unusable"""
+        with self._lock:
+            snapshot = self._lots.get(lot_id)
+            if snapshot is None:
+                return {'lot_id': lot_id, 'version': 0, 'since': since, 'full': True, 'changed_spaces': []}
+            
+            # A version from the future (e.g. before a restart) cannot be diffed against
+            full = since < 0 or since > snapshot.version
+            changed = [
+                {'space_id': space_id, 'state': entry['state'], 'version': entry['version']}
+                for space_id, entry in snapshot.spaces.items()
+                if full or entry['version'] > since
+            ]
+            return {
+                'lot_id': lot_id,
+                'version': snapshot.version,
+                'since': since,
+                'full': full,
+                'stats': dict(snapshot.stats),
+                'changed_spaces': changed
+            }
+    
+    def etag(self, *parts) -> str:
+        """ETag for responses derived from the current snapshot state"""
+        return '-'.join([self.epoch, str(self.global_version)] + [str(p) for p in parts])
+
+# Global snapshot store instance
+occupancy_snapshots = OccupancySnapshotStore()
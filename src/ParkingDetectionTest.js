@@ -27,7 +27,8 @@ function ParkingDetectionTest() {
         },
         body: JSON.stringify({
           video_filename: 'parking_video.mp4',
-          frame_number: 0
+          frame_number: 0,
+          annotate: 'url'
         })
       });
       
@@ -39,8 +40,8 @@ function ParkingDetectionTest() {
       
       console.log('API Response:', {
         success: data.success,
-        hasImage: !!data.annotated_image_base64,
-        imageLength: data.annotated_image_base64 ? data.annotated_image_base64.length : 0
+        hasImage: !!data.annotated_image_url,
+        imageUrl: data.annotated_image_url
       });
       
       if (data.success) {
@@ -54,12 +55,11 @@ function ParkingDetectionTest() {
         });
         
         // Then set the image
-        if (data.annotated_image_base64) {
-          const imageDataUrl = `data:image/jpeg;base64,${data.annotated_image_base64}`;
-          console.log('Setting annotated image, length:', imageDataUrl.length);
-          setAnnotatedImage(imageDataUrl);
+        if (data.annotated_image_url) {
+          console.log('Setting annotated image:', data.annotated_image_url);
+          setAnnotatedImage(data.annotated_image_url);
         } else {
-          console.error('No annotated_image_base64 in response');
+          console.error('No annotated_image_url in response');
           setError('Backend did not return annotated image');
         }
         
@@ -11,6 +11,33 @@ function ParkingLotMarkers({ map, onStartNavigation }) {
     fetchParkingLots();
   }, []);
 
+  // Receive occupancy updates pushed by the backend instead of polling
+  useEffect(() => {
+    if (!window.EventSource) {
+      return undefined;
+    }
+
+    const events = new EventSource('/api/parking/events');
+
+    events.addEventListener('lot_update', (event) => {
+      const update = JSON.parse(event.data);
+      setParkingLots((lots) => {
+        if (!lots.some((lot) => lot.lot_id === update.lot_id)) {
+          // A lot we have not seen yet; fetch the full list once
+          fetchParkingLots();
+          return lots;
+        }
+        return lots.map((lot) =>
+          lot.lot_id === update.lot_id ? { ...lot, stats: { ...lot.stats, ...update.stats } } : lot
+        );
+      });
+    });
+
+    return () => {
+      events.close();
+    };
+  }, []);
+
   const fetchParkingLots = async () => {
     try {
       const response = await fetch('/api/parking/lots');